@@ -0,0 +1,242 @@
+"""
+Expense totals per category and month.
+
+One-time expenses are rolled up into the expense_category_rollup collection as
+they are written, so a query reads one document per category and month no
+matter how long the history is. Recurring expenses are expanded from the
+ledger for the requested months only.
+
+Rollups are kept per currency, and amounts in other currencies are converted
+to the base currency with the fx.RateTable of the requested months, like
+projections.
+"""
+from collections import defaultdict
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from cache import cached
+
+ROLLUP_COLLECTION = 'expense_category_rollup'
+
+UNCATEGORIZED = 'Uncategorized'
+
+GRANULARITIES = ('month', 'quarter', 'year')
+
+# Longest range a query may cover
+MAX_MONTHS = 240
+
+
+def _category(expense):
+    return expense.get('category') or UNCATEGORIZED
+
+
+def rollup_id(year, month, category='', currency=None):
+    """
+    Rollup document _id: "YYYY-MM:category", with "|currency" for items in another currency.
+
+    Ids sort by month first, so month ranges are range scans of the _id index.
+    A "|" (and "\\") in the category is escaped with a backslash, so a
+    category such as "A|USD" does not share an id with A in USD.
+    """
+    category = category.replace('\\', '\\\\').replace('|', '\\|')
+    key = f'{year:04d}-{month:02d}:{category}'
+    return f'{key}|{currency}' if currency else key
+
+
+def _apply(expense, sign):
+    from database import db
+
+    if expense.get('upcoming') is True:
+        return
+    year, month, category = expense['date'].year, expense['date'].month, _category(expense)
+    currency = expense.get('currency')
+    db[ROLLUP_COLLECTION].update_one(
+        {'_id': rollup_id(year, month, category, currency)},
+        {
+            '$inc': {'total': sign * expense['amount'], 'count': sign},
+            '$setOnInsert': {'category': category, 'year': year, 'month': month, 'currency': currency}
+        },
+        upsert=True
+    )
+
+
+def record_expense_change(before=None, after=None):
+    """Update the rollup for a one-time expense that was inserted (after), deleted (before) or changed (both)"""
+    if before:
+        _apply(before, -1)
+    if after:
+        _apply(after, 1)
+
+
+def record_expenses_inserted(expenses):
+    """Add many newly inserted one-time expenses to the rollup with one bulk write"""
+    from pymongo import UpdateOne
+    from database import db
+
+    deltas = defaultdict(lambda: [0, 0])
+    for expense in expenses:
+        if expense.get('upcoming') is not True:
+            delta = deltas[(expense['date'].year, expense['date'].month, _category(expense), expense.get('currency'))]
+            delta[0] += expense['amount']
+            delta[1] += 1
+    if not deltas:
+        return
+    db[ROLLUP_COLLECTION].bulk_write([
+        UpdateOne(
+            {'_id': rollup_id(year, month, category, currency)},
+            {
+                '$inc': {'total': total, 'count': count},
+                '$setOnInsert': {'category': category, 'year': year, 'month': month, 'currency': currency}
+            },
+            upsert=True
+        )
+        for (year, month, category, currency), (total, count) in deltas.items()
+    ], ordered=False)
+
+
+def rebuild_rollup():
+    """Recompute the whole rollup from the one-time expenses; returns the number of documents"""
+    from database import db
+
+    groups = db['one_time_expense'].aggregate([
+        {'$match': {'upcoming': {'$ne': True}}},
+        {'$group': {
+            '_id': {
+                # Missing and empty categories, like _category()
+                'category': {'$cond': [{'$eq': [{'$ifNull': ['$category', '']}, '']}, UNCATEGORIZED, '$category']},
+                'currency': '$currency',
+                'year': {'$year': '$date'},
+                'month': {'$month': '$date'}
+            },
+            'total': {'$sum': '$amount'},
+            'count': {'$sum': 1}
+        }}
+    ])
+    documents = [
+        {
+            '_id': rollup_id(group['_id']['year'], group['_id']['month'], group['_id']['category'],
+                             group['_id'].get('currency')),
+            'category': group['_id']['category'],
+            'currency': group['_id'].get('currency'),
+            'year': group['_id']['year'],
+            'month': group['_id']['month'],
+            'total': group['total'],
+            'count': group['count']
+        }
+        for group in groups
+    ]
+    rollup = db[ROLLUP_COLLECTION]
+    rollup.delete_many({})
+    if documents:
+        rollup.insert_many(documents)
+    return len(documents)
+
+
+def period_label(month_start, granularity):
+    if granularity == 'year':
+        return str(month_start.year)
+    if granularity == 'quarter':
+        return f'{month_start.year}-Q{(month_start.month - 1) // 3 + 1}'
+    return month_start.strftime('%Y-%m')
+
+
+def trend_slope(series):
+    """Least-squares slope of series per period (0 for fewer than two periods)"""
+    count = len(series)
+    if count < 2:
+        return 0.0
+    mean_x = (count - 1) / 2
+    mean_y = sum(series) / count
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(series))
+    variance = sum((x - mean_x) ** 2 for x in range(count))
+    return covariance / variance
+
+
+@cached('one_time_expense', 'recurring_expense', 'fx_rates', 'settings')
+def category_totals(first_month, last_month, granularity='month', top=None):
+    """
+    Expense totals per category and period between two month starts (inclusive), in the base currency.
+
+    Categories are sorted by total; with top, the remaining categories are
+    summed into others.
+    """
+    from database import db
+    from fx import rate_table
+    from ledger import get_ledger, month_grid
+
+    months = []
+    month_start = first_month
+    while month_start <= last_month:
+        months.append(month_start)
+        month_start += relativedelta(months=1)
+
+    periods = []
+    period_index = {}
+    for month_start in months:
+        label = period_label(month_start, granularity)
+        if label not in period_index:
+            period_index[label] = len(periods)
+            periods.append(label)
+
+    # category -> [one-time per period, recurring per period]
+    series = {}
+
+    def add(category, month_start, amount, column):
+        if category not in series:
+            series[category] = ([0.0] * len(periods), [0.0] * len(periods))
+        series[category][column][period_index[period_label(month_start, granularity)]] += amount
+
+    next_month = last_month + relativedelta(months=1)
+    rollups = list(db[ROLLUP_COLLECTION].find({'_id': {
+        '$gte': rollup_id(first_month.year, first_month.month),
+        '$lt': rollup_id(next_month.year, next_month.month)
+    }}))
+    recurring = get_ledger().projected_expenses
+    rates = rate_table(months, {rollup.get('currency') for rollup in rollups} | {item.currency for item in recurring})
+
+    for rollup in rollups:
+        total = rollup['total']
+        if rates is not None:
+            total *= rates.factor(rollup.get('currency'), (rollup['year'], rollup['month']))
+        add(rollup['category'], date(rollup['year'], rollup['month'], 1), total, 0)
+
+    grid = month_grid(months)
+    for item in recurring:
+        factors = rates.month_factors(item.currency) if rates is not None else None
+        for index, (month_start, occurrences) in enumerate(zip(months, item.occurrences_by_month(grid))):
+            if occurrences:
+                amount = item.amount * occurrences
+                if factors is not None:
+                    amount *= factors[index]
+                add(item.category or UNCATEGORIZED, month_start, amount, 1)
+
+    categories = []
+    for category, (one_time, recurring) in series.items():
+        totals = [a + b for a, b in zip(one_time, recurring)]
+        categories.append({
+            'category': category,
+            'total': round(sum(totals), 2),
+            'one_time': round(sum(one_time), 2),
+            'recurring': round(sum(recurring), 2),
+            'series': [round(total, 2) for total in totals],
+            'trend': round(trend_slope(totals), 2)
+        })
+    categories.sort(key=lambda category: category['total'], reverse=True)
+
+    others = None
+    if top is not None and len(categories) > top:
+        rest = categories[top:]
+        categories = categories[:top]
+        others = {
+            'categories': len(rest),
+            'total': round(sum(category['total'] for category in rest), 2),
+            'series': [round(sum(values), 2) for values in zip(*(category['series'] for category in rest))]
+        }
+
+    return {
+        'from': first_month.strftime('%Y-%m'),
+        'to': last_month.strftime('%Y-%m'),
+        'granularity': granularity,
+        'periods': periods,
+        'categories': categories,
+        'others': others
+    }
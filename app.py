@@ -1,11 +1,12 @@
-from flask import Flask
+from flask import Flask, jsonify
 from dotenv import load_dotenv
+import os
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 
 # Register blueprints
 from routes.main import main_bp
@@ -16,6 +17,8 @@ from routes.api_details import api_details_bp
 from routes.api_settings import api_settings_bp
 from routes.api_investments import api_investments_bp
 from routes.api_wishlist import api_wishlist_bp
+from routes.api_analytics import api_analytics_bp
+from routes.api_suggestions import api_suggestions_bp
 
 app.register_blueprint(main_bp)
 app.register_blueprint(api_income_bp)
@@ -25,6 +28,59 @@ app.register_blueprint(api_details_bp)
 app.register_blueprint(api_settings_bp)
 app.register_blueprint(api_investments_bp)
 app.register_blueprint(api_wishlist_bp)
+app.register_blueprint(api_analytics_bp)
+app.register_blueprint(api_suggestions_bp)
+
+# Invalid dates, currencies, frequencies, listing cursors, bulk uploads and statements in requests are client errors
+from utils import InvalidDate
+from import_errors import InvalidBulkRequest, InvalidStatement
+from pagination import InvalidCursor
+from fx import InvalidCurrency, MissingRates
+from ledger import InvalidFrequency
+
+@app.errorhandler(InvalidDate)
+@app.errorhandler(InvalidCursor)
+@app.errorhandler(InvalidBulkRequest)
+@app.errorhandler(InvalidStatement)
+@app.errorhandler(InvalidCurrency)
+@app.errorhandler(InvalidFrequency)
+def invalid_request_value(error):
+    return jsonify({'error': str(error)}), 400
+
+# Projections of currencies without FX rates wait for the rates to be loaded (flask load-fx-rates)
+@app.errorhandler(MissingRates)
+def missing_rates(error):
+    return jsonify({'error': str(error)}), 503
+
+# Fingerprinted static assets (flask build-assets) and response compression
+from assets import init_assets
+init_assets(app)
+
+if os.getenv('COMPRESSION', 'on').lower() not in ('0', 'off', 'false'):
+    from compression import init_compression
+    init_compression(app)
+
+# Keep in-process caches coherent with writes made by other workers.
+# Started on the first request so that each forked worker runs its own watcher.
+from cache import start_invalidation_watcher
+
+@app.before_request
+def ensure_invalidation_watcher():
+    start_invalidation_watcher()
+
+# Opt-in request profiling: Server-Timing headers and /debug/metrics
+if os.getenv('REQUEST_PROFILING'):
+    from profiling import init_profiling
+    init_profiling(app)
+
+# Opt-in Prometheus metrics at /metrics
+if os.getenv('METRICS'):
+    from metrics import init_metrics
+    init_metrics(app)
+
+# CLI commands (flask --app app <command>)
+from cli import register_commands
+register_commands(app)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,108 @@
+"""Cached access to the application settings document"""
+import threading
+from datetime import datetime
+from cache import data_version, touch
+
+DEFAULT_SETTINGS = {
+    'currency_code': 'USD',
+    'currency_symbol': '$',
+    'date_format': 'DD/MM/YYYY'
+}
+
+_lock = threading.Lock()
+_settings = None
+_settings_version = None
+
+
+def _load_settings():
+    """Load the settings document, filling in defaults once if they are missing"""
+    from database import settings_collection
+
+    settings = settings_collection.find_one()
+    if not settings:
+        settings = dict(DEFAULT_SETTINGS, created_at=datetime.utcnow())
+        settings_collection.insert_one(settings)
+        return settings
+
+    missing = {key: value for key, value in DEFAULT_SETTINGS.items() if key not in settings}
+    if missing:
+        settings_collection.update_one({'_id': settings['_id']}, {'$set': missing})
+        settings.update(missing)
+    return settings
+
+
+def get_settings():
+    """
+    Get the settings document.
+
+    The document is loaded once per process and reloaded only after a settings
+    write (from this or another worker). Treat the returned dict as read-only.
+    """
+    global _settings, _settings_version
+
+    version = data_version('settings')
+    with _lock:
+        if _settings is None or _settings_version != version:
+            _settings = _load_settings()
+            _settings_version = version
+        return _settings
+
+
+def update_settings(values=None, unset=None):
+    """Write settings through to MongoDB and the in-process cache"""
+    global _settings, _settings_version
+    from database import settings_collection
+
+    update = {}
+    if values:
+        values = dict(values, updated_at=datetime.utcnow())
+        update['$set'] = values
+    if unset:
+        update['$unset'] = {key: '' for key in unset}
+    if not update:
+        return
+
+    settings_collection.update_one({}, update, upsert=bool(values))
+    touch('settings')
+
+    with _lock:
+        if _settings is not None:
+            settings = dict(_settings)
+            settings.update(values or {})
+            for key in unset or ():
+                settings.pop(key, None)
+            _settings = settings
+            _settings_version = data_version('settings')
+
+
+def get_currency_settings():
+    settings = get_settings()
+    return {
+        'code': settings['currency_code'],
+        'symbol': settings['currency_symbol']
+    }
+
+
+def get_date_format():
+    return get_settings()['date_format']
+
+
+def get_starting_balance():
+    return get_settings().get('starting_balance', 0)
+
+
+def get_category_rules():
+    """Get the custom bank import keywords per expense category ({category: [keyword, ...]})"""
+    return get_settings().get('category_rules', {})
+
+
+def get_trading212_credentials():
+    """Get Trading212 API credentials, or None if not configured"""
+    settings = get_settings()
+    if 'trading212_api_key' not in settings:
+        return None
+    return {
+        'api_key': settings['trading212_api_key'],
+        'api_secret': settings['trading212_api_secret'],
+        'environment': settings.get('trading212_environment', 'live')
+    }
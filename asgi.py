@@ -0,0 +1,24 @@
+"""
+ASGI entry point: async read-heavy API on Quart + Motor, everything else on Flask.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:app --port 8000
+
+Projection, month-details and investment-projection requests run on the event
+loop and issue their MongoDB queries concurrently. All other routes are the
+regular Flask app, run in a thread pool via asgiref.
+"""
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart
+import wsgi
+from routes.api_async import api_async_bp, ASYNC_PATH_PREFIXES
+
+async_app = Quart(__name__)
+async_app.register_blueprint(api_async_bp)
+flask_app = WsgiToAsgi(wsgi.app)
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan' or scope.get('path', '').startswith(ASYNC_PATH_PREFIXES):
+        await async_app(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
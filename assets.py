@@ -0,0 +1,87 @@
+"""
+Fingerprinted static assets.
+
+`flask build-assets` copies the CSS and JS under static/ to static/dist/ with
+a content hash in the file name and writes static/dist/manifest.json.
+Templates link assets through asset_url(), which uses the hashed names when
+the manifest exists, so browsers can cache them for a year.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from flask import current_app, request, url_for
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Directories under static/ whose files are fingerprinted
+ASSET_DIRS = ('css', 'js')
+
+# Cache-Control of fingerprinted files (their name changes with their content)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def build():
+    """Write the fingerprinted copies and the manifest; returns the manifest"""
+    global _manifest
+
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        for root, _, filenames in os.walk(os.path.join(STATIC_DIR, asset_dir)):
+            for filename in sorted(filenames):
+                source = os.path.join(root, filename)
+                with open(source, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:12]
+                name = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+                stem, extension = os.path.splitext(name)
+                hashed = f'dist/{stem}.{digest}{extension}'
+                os.makedirs(os.path.dirname(os.path.join(STATIC_DIR, hashed)), exist_ok=True)
+                shutil.copyfile(source, os.path.join(STATIC_DIR, hashed))
+                manifest[name] = hashed
+
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    with _manifest_lock:
+        _manifest = manifest
+    return manifest
+
+
+def get_manifest():
+    """The manifest written by build() ({} if assets were not built)"""
+    global _manifest
+
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    with open(MANIFEST_PATH) as f:
+                        _manifest = json.load(f)
+                except FileNotFoundError:
+                    _manifest = {}
+    return _manifest
+
+
+def asset_url(filename):
+    """URL of a static asset, fingerprinted unless the app runs in debug mode or assets were not built"""
+    if not current_app.debug:
+        filename = get_manifest().get(filename, filename)
+    return url_for('static', filename=filename)
+
+
+def _cache_fingerprinted(response):
+    if request.endpoint == 'static' and (request.view_args or {}).get('filename', '').startswith('dist/'):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def init_assets(app):
+    """Make asset_url available to templates and serve fingerprinted files with far-future caching"""
+    app.add_template_global(asset_url)
+    app.after_request(_cache_fingerprinted)
@@ -0,0 +1,451 @@
+"""
+Bank statement importer (CSV and OFX) for one-time expenses.
+
+CSV layouts are recognized from their header: the date, description and
+amount (or debit/credit) columns are looked up by their usual names, and the
+date format is picked from the values themselves. Outgoing transactions are
+categorized with a single compiled regular expression built from the
+category rules and stored as one-time expenses. Each transaction gets an
+import_hash backed by a unique index, so importing overlapping statements
+never creates duplicates.
+"""
+import csv
+import hashlib
+import io
+import re
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from import_errors import InvalidStatement
+
+FORMATS = ('csv', 'ofx')
+
+# Header names per column (compared lowercased, punctuation stripped)
+COLUMN_ALIASES = {
+    'date': ('date', 'transaction date', 'booking date', 'posted date', 'posting date', 'value date',
+             'trans date', 'completed date', 'started date'),
+    'description': ('description', 'transaction description', 'details', 'payee', 'merchant', 'name',
+                    'narrative', 'memo', 'reference', 'counterparty', 'beneficiary'),
+    'amount': ('amount', 'transaction amount', 'value', 'amount eur', 'amount usd', 'amount gbp'),
+    'debit': ('debit', 'debit amount', 'money out', 'paid out', 'withdrawal', 'withdrawals', 'out'),
+    'credit': ('credit', 'credit amount', 'money in', 'paid in', 'deposit', 'deposits', 'in'),
+}
+
+# Tried in order; day-first formats move ahead of month-first ones when the
+# date format setting starts with the day
+DATE_FORMATS = (
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y/%m/%d', '%Y%m%d',
+    '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y',
+    '%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y', '%d.%m.%y',
+    '%d %b %Y', '%d %B %Y', '%b %d, %Y',
+)
+
+DELIMITERS = ',;\t|'
+
+# Rows used to detect the date format
+SAMPLE_ROWS = 100
+
+# Keywords per expense category (see the one-time expense form); the settings
+# document may extend them with category_rules
+DEFAULT_RULES = {
+    'groceries': ('tesco', 'sainsbury', 'lidl', 'aldi', 'asda', 'morrisons', 'carrefour', 'ab vassilopoulos',
+                  'sklavenitis', 'masoutis', 'whole foods', 'trader joe', 'kroger', 'safeway', 'walmart',
+                  'supermarket', 'grocery', 'market'),
+    'dining': ('uber eats', 'deliveroo', 'just eat', 'wolt', 'efood', 'doordash', 'grubhub', 'mcdonald',
+               'burger king', 'kfc', 'starbucks', 'costa', 'pret', 'restaurant', 'cafe', 'coffee',
+               'pizza', 'bar ', 'taverna'),
+    'transportation': ('uber', 'lyft', 'bolt', 'taxi', 'shell', 'bp ', 'esso', 'texaco', 'eko', 'fuel',
+                       'petrol', 'parking', 'tfl', 'metro', 'railway', 'trainline', 'bus ', 'toll'),
+    'travel': ('ryanair', 'easyjet', 'aegean', 'lufthansa', 'british airways', 'airbnb', 'booking.com',
+               'expedia', 'hotel', 'hostel', 'airline', 'airport'),
+    'shopping': ('amazon', 'ebay', 'ikea', 'zara', 'h&m', 'primark', 'apple store', 'public', 'skroutz',
+                 'aliexpress', 'etsy', 'decathlon'),
+    'entertainment': ('netflix', 'spotify', 'disney', 'hbo', 'prime video', 'youtube', 'steam',
+                      'playstation', 'xbox', 'nintendo', 'cinema', 'theatre', 'ticketmaster'),
+    'bills': ('electric', 'energy', 'water', 'gas ', 'broadband', 'vodafone', 'cosmote', 'nova', 'o2',
+              'ee ', 'verizon', 'at&t', 'insurance', 'council tax', 'rent'),
+    'healthcare': ('pharmacy', 'boots', 'cvs', 'walgreens', 'dentist', 'doctor', 'clinic', 'hospital',
+                   'optician'),
+    'education': ('udemy', 'coursera', 'school', 'university', 'tuition', 'books', 'bookshop'),
+    'gifts': ('gift', 'florist', 'flowers'),
+}
+
+UNMATCHED_CATEGORY = 'other'
+
+DUPLICATE_KEY = 11000
+
+# Longest description stored as the expense name (the full text goes to notes)
+NAME_LENGTH = 100
+
+# Whether this process created the import_hash index yet
+_hash_index_ready = False
+
+
+def _normalize_header(name):
+    return re.sub(r'[^a-z0-9]+', ' ', (name or '').lower()).strip()
+
+
+def _normalize_text(text):
+    return ' '.join((text or '').lower().split())
+
+
+def parse_amount(text):
+    """Parse an amount such as -1,234.56, 1.234,56, (12.00) or 12.00- into a float"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        pass
+    text = (text or '').strip()
+    negative = bool(re.match(r'^[^\d]*-', text)) or text.endswith('-') or (text.startswith('(') and text.endswith(')'))
+    digits = re.sub(r'[^\d,.]', '', text)
+    if not digits:
+        raise ValueError(f'invalid amount: {text!r}')
+    if ',' in digits and '.' in digits:
+        # The last separator is the decimal one
+        if digits.rfind(',') > digits.rfind('.'):
+            digits = digits.replace('.', '').replace(',', '.')
+        else:
+            digits = digits.replace(',', '')
+    elif ',' in digits:
+        digits = digits.replace(',', '.') if re.search(r',\d{1,2}$', digits) else digits.replace(',', '')
+    value = float(digits)
+    return -value if negative else value
+
+
+def date_formats(day_first=True):
+    if not day_first:
+        return DATE_FORMATS
+    return tuple(sorted(DATE_FORMATS, key=lambda fmt: 0 if fmt.startswith('%d') else 1))
+
+
+def _parses(value, fmt):
+    try:
+        datetime.strptime(value, fmt)
+        return True
+    except ValueError:
+        return False
+
+
+def detect_date_format(values, day_first=True):
+    """The format that parses the most sample values (the earliest one on ties)"""
+    values = [value.strip() for value in values if value and value.strip()]
+    best, best_count = None, 0
+    for fmt in date_formats(day_first):
+        count = sum(1 for value in values if _parses(value, fmt))
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(values):
+                break
+    if not best:
+        raise InvalidStatement('Unrecognized date format')
+    return best
+
+
+def map_columns(header):
+    """{column: index} for a header row, or None if it lacks a date or an amount"""
+    names = [_normalize_header(name) for name in header]
+    columns = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[column] = names.index(alias)
+                break
+        else:
+            # "Transaction Date (UTC)" and similar
+            for index, name in enumerate(names):
+                if index not in columns.values() and any(name.startswith(alias + ' ') for alias in aliases):
+                    columns[column] = index
+                    break
+    if 'date' not in columns or not ('amount' in columns or 'debit' in columns):
+        return None
+    return columns
+
+
+def parse_csv(text, day_first=True):
+    """
+    Transactions of a CSV statement as dicts with date, description, amount
+    (negative for money out) and id (None), plus the detected column mapping.
+
+    Lines above the header (account details in some exports) are skipped.
+    """
+    head = text.splitlines()[:20]
+    try:
+        delimiters = [csv.Sniffer().sniff('\n'.join(head), delimiters=DELIMITERS).delimiter]
+    except csv.Error:
+        delimiters = []
+    # The sniffer can be misled by the lines above the header
+    for delimiter in delimiters + [delimiter for delimiter in DELIMITERS if delimiter not in delimiters]:
+        columns = None
+        for header_index, header in enumerate(csv.reader(head, delimiter=delimiter)):
+            columns = map_columns(header)
+            if columns:
+                break
+        if columns:
+            break
+    else:
+        raise InvalidStatement('No header row with a date and an amount column was found')
+    rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+    # (line number, row) of the non-blank rows below the header
+    body = [(line, row) for line, row in enumerate(rows[header_index + 1:], header_index + 2)
+            if any(cell.strip() for cell in row)]
+    date_format = detect_date_format(
+        [row[columns['date']] for _, row in body[:SAMPLE_ROWS] if len(row) > columns['date']], day_first
+    )
+
+    def cell(row, column):
+        index = columns.get(column)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    # Statements have few distinct dates, so each one is parsed once
+    dates = {}
+
+    transactions = []
+    for line, row in body:
+        try:
+            value = cell(row, 'date')
+            date = dates.get(value)
+            if date is None:
+                parsed = datetime.strptime(value, date_format)
+                date = dates[value] = datetime(parsed.year, parsed.month, parsed.day)
+            if 'amount' in columns:
+                amount = parse_amount(cell(row, 'amount'))
+            else:
+                debit, credit = cell(row, 'debit'), cell(row, 'credit')
+                amount = -abs(parse_amount(debit)) if debit else abs(parse_amount(credit))
+        except ValueError as e:
+            transactions.append({'row': line, 'error': str(e)})
+            continue
+        transactions.append({
+            'row': line,
+            'date': date,
+            'description': cell(row, 'description'),
+            'amount': amount,
+            'id': None
+        })
+
+    mapping = {column: rows[header_index][index] for column, index in columns.items()}
+    return transactions, mapping
+
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+OFX_ACCOUNT = re.compile(r'<ACCTID>([^<\r\n]*)', re.IGNORECASE)
+
+
+def parse_ofx(text):
+    """Transactions of an OFX statement (SGML or XML), in the format of parse_csv"""
+    account = OFX_ACCOUNT.search(text)
+    account = account.group(1).strip() if account else ''
+
+    transactions = []
+    for number, match in enumerate(OFX_TRANSACTION.finditer(text), 1):
+        fields = {name.upper(): value.strip() for name, value in OFX_FIELD.findall(match.group(1))}
+        try:
+            date = datetime.strptime(fields.get('DTPOSTED', '')[:8], '%Y%m%d')
+            amount = parse_amount(fields.get('TRNAMT'))
+        except ValueError as e:
+            transactions.append({'row': number, 'error': str(e)})
+            continue
+        name, memo = fields.get('NAME', ''), fields.get('MEMO', '')
+        transactions.append({
+            'row': number,
+            'date': date,
+            'description': name if not memo or memo in name else f'{name} {memo}'.strip(),
+            'amount': amount,
+            'id': f"{account}:{fields['FITID']}" if fields.get('FITID') else None
+        })
+    if not transactions:
+        raise InvalidStatement('No transactions found in the OFX file')
+    return transactions, {'account': account}
+
+
+def detect_format(text, filename=None):
+    if filename and filename.lower().endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    head = text[:2048].lstrip().upper()
+    if head.startswith('OFXHEADER') or '<OFX>' in head or (head.startswith('<?XML') and '<OFX' in text[:8192].upper()):
+        return 'ofx'
+    return 'csv'
+
+
+def decode(data):
+    """Statement bytes as text (UTF-8, falling back to Windows-1252 used by many bank exports)"""
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+class Categorizer:
+    """Assigns categories to descriptions with one compiled alternation of all rule keywords"""
+
+    def __init__(self, rules):
+        self.categories = {}
+        for category, keywords in rules.items():
+            for keyword in keywords:
+                keyword = _normalize_text(keyword) + (' ' if keyword.endswith(' ') else '')
+                if keyword.strip():
+                    self.categories.setdefault(keyword, category)
+        # Longest keywords first, so "uber eats" wins over "uber"
+        keywords = sorted(self.categories, key=len, reverse=True)
+        self.pattern = re.compile(
+            '(?<![a-z0-9])(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + ')'
+        ) if keywords else None
+
+    def categorize(self, descriptions):
+        """Category of every description (statements repeat merchants, so each distinct text is matched once)"""
+        seen = {}
+        categories = []
+        for description in descriptions:
+            text = _normalize_text(description) + ' '
+            category = seen.get(text)
+            if category is None:
+                match = self.pattern.search(text) if self.pattern else None
+                category = seen[text] = self.categories[match.group(0)] if match else UNMATCHED_CATEGORY
+            categories.append(category)
+        return categories
+
+
+@lru_cache(maxsize=8)
+def _categorizer(rules):
+    return Categorizer({category: keywords for category, keywords in rules})
+
+
+def get_categorizer():
+    """Categorizer for the default rules merged with the category_rules setting (keywords checked first)"""
+    from app_settings import get_category_rules
+
+    custom = get_category_rules()
+    rules = {category: tuple(keywords) for category, keywords in custom.items()}
+    for category, keywords in DEFAULT_RULES.items():
+        rules[category] = rules.get(category, ()) + keywords
+    return _categorizer(tuple(rules.items()))
+
+
+def import_hash(transaction, text, occurrence):
+    """
+    Identity of a transaction across imports.
+
+    OFX transactions use the bank's FITID. Otherwise date, amount and
+    normalized description (text), plus the number of identical transactions before it in the
+    same statement (two equal coffees on one day are two expenses).
+    """
+    if transaction['id']:
+        key = f"id|{transaction['id']}"
+    else:
+        key = (f"{transaction['date']:%Y-%m-%d}|{transaction['amount']:.2f}|"
+               f"{text}|{occurrence}")
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def build_expenses(transactions, categorizer):
+    """One-time expense documents for the outgoing transactions; returns (expenses, incoming count)"""
+    outgoing = [transaction for transaction in transactions if 'error' not in transaction]
+    if outgoing and all(transaction['amount'] >= 0 for transaction in outgoing):
+        # Card statements list charges as positive amounts
+        incoming = 0
+    else:
+        incoming = sum(1 for transaction in outgoing if transaction['amount'] >= 0)
+        outgoing = [transaction for transaction in outgoing if transaction['amount'] < 0]
+
+    categories = categorizer.categorize(transaction['description'] for transaction in outgoing)
+    occurrences = Counter()
+    created_at = datetime.utcnow()
+    expenses = []
+    for transaction, category in zip(outgoing, categories):
+        text = _normalize_text(transaction['description'])
+        identity = (transaction['date'], transaction['amount'], text)
+        description = transaction['description'] or 'Bank transaction'
+        expenses.append({
+            'name': description[:NAME_LENGTH],
+            'amount': abs(transaction['amount']),
+            'date': transaction['date'],
+            'category': category,
+            'notes': description if len(description) > NAME_LENGTH else '',
+            'upcoming': False,
+            'created_at': created_at,
+            'import_hash': import_hash(transaction, text, occurrences[identity]),
+            'source': 'bank_import'
+        })
+        occurrences[identity] += 1
+    return expenses, incoming
+
+
+def _ensure_hash_index():
+    """Create the unique import_hash index that rejects re-imported transactions, once per process"""
+    global _hash_index_ready
+    from database import IMPORT_HASH_INDEX, one_time_expense_collection
+
+    if not _hash_index_ready:
+        keys, options = IMPORT_HASH_INDEX
+        one_time_expense_collection.create_index(keys, **options)
+        _hash_index_ready = True
+
+
+def import_statement(data, filename=None, dry_run=False, chunk_size=1000):
+    """
+    Parse, categorize and store the outgoing transactions of a statement.
+
+    Transactions already imported (same import_hash) are counted as
+    duplicates. With dry_run nothing is written.
+    """
+    from pymongo.errors import BulkWriteError
+    from analytics import record_expenses_inserted
+    from app_settings import get_date_format
+    from database import one_time_expense_collection
+
+    text = decode(data)
+    fmt = detect_format(text, filename)
+    if fmt == 'ofx':
+        transactions, mapping = parse_ofx(text)
+    else:
+        transactions, mapping = parse_csv(text, day_first=get_date_format().startswith('DD'))
+
+    expenses, incoming = build_expenses(transactions, get_categorizer())
+    errors = [{'row': transaction['row'], 'error': transaction['error']}
+              for transaction in transactions if 'error' in transaction]
+
+    existing = set()
+    for start in range(0, len(expenses), chunk_size):
+        hashes = [expense['import_hash'] for expense in expenses[start:start + chunk_size]]
+        existing.update(document['import_hash'] for document in one_time_expense_collection.find(
+            {'import_hash': {'$in': hashes}}, {'import_hash': 1}))
+    new = [expense for expense in expenses if expense['import_hash'] not in existing]
+
+    report = {
+        'format': fmt,
+        'columns': mapping,
+        'transactions': len(transactions),
+        'incoming': incoming,
+        'duplicates': len(expenses) - len(new),
+        'inserted': 0,
+        'failed': len(errors),
+        'errors': errors[:100],
+        'categories': dict(Counter(expense['category'] for expense in new))
+    }
+    if dry_run or not new:
+        return report
+
+    _ensure_hash_index()
+    for start in range(0, len(new), chunk_size):
+        chunk = new[start:start + chunk_size]
+        try:
+            one_time_expense_collection.insert_many(chunk, ordered=False)
+            written = chunk
+        except BulkWriteError as e:
+            failed = set()
+            for error in e.details.get('writeErrors', []):
+                failed.add(error['index'])
+                if error.get('code') == DUPLICATE_KEY:
+                    # A concurrent import of the same statement got there first
+                    report['duplicates'] += 1
+                else:
+                    report['failed'] += 1
+            written = [expense for index, expense in enumerate(chunk) if index not in failed]
+        report['inserted'] += len(written)
+        if written:
+            record_expenses_inserted(written)
+    return report
@@ -0,0 +1 @@
+"""Benchmarks for the projection engine and other hot endpoints (python -m bench.run)"""
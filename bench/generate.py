@@ -0,0 +1,172 @@
+"""Synthetic household data for benchmarks"""
+import random
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+
+# Dataset sizes: recurring items per kind, one-time entries per month, years of history, ...
+SCALES = {
+    'small': {
+        'recurring': 10, 'one_time_per_month': 20, 'years': 2,
+        'portfolios': 1, 'stocks': 10, 'wishlist': 5, 'trading212_rows': 1000, 'import_rows': 1000
+    },
+    'medium': {
+        'recurring': 40, 'one_time_per_month': 150, 'years': 10,
+        'portfolios': 3, 'stocks': 60, 'wishlist': 25, 'trading212_rows': 10000, 'import_rows': 10000
+    },
+    'large': {
+        'recurring': 120, 'one_time_per_month': 600, 'years': 40,
+        'portfolios': 6, 'stocks': 250, 'wishlist': 100, 'trading212_rows': 100000, 'import_rows': 100000
+    }
+}
+
+FREQUENCIES = ['monthly', 'monthly', 'monthly', 'weekly', 'biweekly', 'yearly']
+RECURRING_EXPENSE_CATEGORIES = ['rent', 'utilities', 'insurance', 'subscriptions', 'loan',
+                                'transportation', 'food', 'healthcare', 'entertainment', 'other']
+ONE_TIME_EXPENSE_CATEGORIES = ['groceries', 'shopping', 'dining', 'entertainment', 'healthcare',
+                               'transportation', 'bills', 'gifts', 'education', 'travel', 'other']
+ONE_TIME_INCOME_CATEGORIES = ['bonus', 'overtime', 'gift', 'refund', 'freelance', 'other']
+WISHLIST_CATEGORIES = ['Electronics', 'Furniture', 'Travel', 'Vehicle', 'Education', 'Other']
+
+
+def _recurring_item(rng, kind, index, history_start, today):
+    start_date = history_start + timedelta(days=rng.randint(0, max((today - history_start).days, 1)))
+    item = {
+        'name': f'{kind} {index}',
+        'amount': round(rng.uniform(20, 3000 if kind == 'income' else 800), 2),
+        'frequency': rng.choice(FREQUENCIES),
+        'start_date': start_date,
+        'end_date': start_date + relativedelta(years=rng.randint(1, 10)) if rng.random() < 0.3 else None,
+        'payday': rng.randint(1, 28) if rng.random() < 0.7 else None,
+        'active': rng.random() < 0.9,
+        'upcoming': rng.random() < 0.05,
+        'created_at': start_date
+    }
+    if kind == 'expense':
+        item['category'] = rng.choice(RECURRING_EXPENSE_CATEGORIES)
+    return item
+
+
+def _one_time_items(rng, kind, per_month, history_start, months):
+    categories = ONE_TIME_INCOME_CATEGORIES if kind == 'income' else ONE_TIME_EXPENSE_CATEGORIES
+    for month in range(months):
+        month_start = history_start + relativedelta(months=month)
+        for index in range(per_month):
+            date = month_start + timedelta(days=rng.randint(0, 27), hours=rng.randint(0, 23))
+            yield {
+                'name': f'{kind} {month}-{index}',
+                'amount': round(rng.uniform(1, 400), 2),
+                'date': date,
+                'category': rng.choice(categories),
+                'notes': '',
+                'upcoming': rng.random() < 0.01,
+                'created_at': date
+            }
+
+
+def generate_household(db, scale='small', seed=0, batch_size=5000):
+    """Fill db with a synthetic household of the given scale and return the row counts"""
+    rng = random.Random(seed)
+    size = SCALES[scale]
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    history_start = today.replace(day=1) - relativedelta(years=size['years'])
+    history_months = size['years'] * 12 + 1
+    counts = {}
+
+    def insert(collection, documents):
+        batch = []
+        counts[collection] = counts.get(collection, 0)
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                db[collection].insert_many(batch)
+                counts[collection] += len(batch)
+                batch = []
+        if batch:
+            db[collection].insert_many(batch)
+            counts[collection] += len(batch)
+
+    db['settings'].insert_one({
+        'currency_code': 'EUR', 'currency_symbol': '€', 'date_format': 'DD/MM/YYYY',
+        'starting_balance': 5000, 'created_at': history_start
+    })
+    insert('recurring_income', (_recurring_item(rng, 'income', i, history_start, today)
+                                for i in range(size['recurring'])))
+    insert('recurring_expense', (_recurring_item(rng, 'expense', i, history_start, today)
+                                 for i in range(size['recurring'])))
+    insert('one_time_income', _one_time_items(rng, 'income', max(size['one_time_per_month'] // 10, 1),
+                                              history_start, history_months))
+    insert('one_time_expense', _one_time_items(rng, 'expense', size['one_time_per_month'],
+                                               history_start, history_months))
+
+    portfolio_ids = []
+    for index in range(size['portfolios']):
+        result = db['investment_portfolio'].insert_one({
+            'name': f'Portfolio {index}',
+            'type': 'detailed',
+            'monthly_contribution': round(rng.uniform(50, 1000), 2),
+            'mean_return_percent': round(rng.uniform(2, 10), 2),
+            'current_value': round(rng.uniform(1000, 200000), 2),
+            'start_date': history_start,
+            'active': True,
+            'created_at': history_start
+        })
+        portfolio_ids.append(str(result.inserted_id))
+    counts['investment_portfolio'] = len(portfolio_ids)
+
+    insert('investment_stocks', ({
+        'portfolio_id': rng.choice(portfolio_ids),
+        'ticker': f'TCK{index}',
+        'name': f'Company {index}',
+        'shares': round(rng.uniform(1, 500), 4),
+        'avg_price': round(rng.uniform(5, 500), 2),
+        'current_price': round(rng.uniform(5, 500), 2),
+        'purchase_date': history_start,
+        'created_at': history_start
+    } for index in range(size['stocks'])))
+
+    insert('wishlist', ({
+        'name': f'Wish {index}',
+        'cost': round(rng.uniform(50, 30000), 2),
+        'category': rng.choice(WISHLIST_CATEGORIES),
+        'priority': rng.choice(['high', 'medium', 'low']),
+        'target_date': today + relativedelta(months=rng.randint(1, 36)) if rng.random() < 0.6 else None,
+        'notes': '',
+        'url': '',
+        'purchased': rng.random() < 0.2,
+        'purchased_date': None,
+        'created_at': today
+    } for index in range(size['wishlist'])))
+
+    return counts
+
+
+def generate_trading212_csv(rows, seed=0, tickers=200):
+    """Build a Trading212 CSV export with the given number of rows"""
+    rng = random.Random(seed)
+    lines = ['Action,Time,ISIN,Ticker,Name,No. of shares,Price / share,Currency (Price / share),Total']
+    time = datetime(2018, 1, 1)
+    for _ in range(rows):
+        time += timedelta(minutes=rng.randint(1, 600))
+        ticker = rng.randrange(tickers)
+        action = rng.choices(['Market buy', 'Market sell', 'Dividend (Ordinary)', 'Deposit'],
+                             weights=[70, 15, 10, 5])[0]
+        shares = round(rng.uniform(0.1, 20), 4)
+        price = round(rng.uniform(5, 500), 2)
+        if action == 'Deposit':
+            lines.append(f'Deposit,{time:%Y-%m-%d %H:%M:%S},,,,,,,{round(rng.uniform(100, 2000), 2)}')
+        else:
+            lines.append(f'{action},{time:%Y-%m-%d %H:%M:%S},US{ticker:010d},TCK{ticker},'
+                         f'Company {ticker},{shares},{price},USD,{round(shares * price, 2)}')
+    return '\n'.join(lines) + '\n'
+
+
+def generate_import_csv(rows, seed=0):
+    """Build a one-time expense CSV upload (see bulk.py) with the given number of rows"""
+    rng = random.Random(seed)
+    lines = ['date,name,amount,category,notes,upcoming']
+    day = datetime(2015, 1, 1)
+    for index in range(rows):
+        day += timedelta(days=rng.randint(0, 1))
+        lines.append(f'{day:%Y-%m-%d},import {index},{round(rng.uniform(1, 400), 2)},'
+                     f'{rng.choice(ONE_TIME_EXPENSE_CATEGORIES)},,')
+    return '\n'.join(lines) + '\n'
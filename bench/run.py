@@ -0,0 +1,185 @@
+"""
+Time the hot endpoints on a synthetic household and compare against a baseline.
+
+    python -m bench.run --scale medium                      # in-memory fake (pip install mongomock)
+    python -m bench.run --backend mongodb --url mongodb://localhost:27017/
+    python -m bench.run --output baseline.json              # store results
+    python -m bench.run --baseline baseline.json            # exit 1 on regressions
+
+Each run drops the in-process caches first, so timings are for cold computation.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+HORIZONS = (12, 120, 480)
+BENCH_DATABASE = 'budget_tracker_bench'
+
+
+def connect(backend, url):
+    if backend == 'mongomock':
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit('The mongomock backend needs mongomock (pip install mongomock)')
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+    return MongoClient(url)
+
+
+def timed(func, repeat):
+    """Run func repeat times with cold caches and summarize the wall times"""
+    from cache import invalidate
+
+    samples = []
+    for _ in range(repeat):
+        invalidate()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+        'runs': repeat
+    }
+
+
+def run_benchmarks(scale, repeat):
+    from app import app
+    from bench.generate import SCALES, generate_import_csv, generate_trading212_csv
+    from trading212 import parse_trading212_csv
+    from lots import METHODS, LotBook
+    from returns import transaction_documents
+
+    client = app.test_client()
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+        return response
+
+    results = {}
+    for months in HORIZONS:
+        results[f'projections[{months}]'] = timed(lambda: get(f'/api/projections?months={months}'), repeat)
+    for months in HORIZONS:
+        results[f'investment_projections[{months}]'] = timed(
+            lambda: get(f'/api/investment-projections?months={months}'), repeat)
+    results['projections_until_now'] = timed(lambda: get('/api/projections/until-now'), repeat)
+    results['timeline[120]'] = timed(lambda: get('/api/timeline?months=120'), repeat)
+
+    today = datetime.now()
+    oldest = today.year - SCALES[scale]['years']
+    for year, month in ((oldest, today.month), (today.year, today.month)):
+        results[f'month_details[{year}-{month:02d}]'] = timed(
+            lambda: get(f'/api/month-details/{year}/{month}'), repeat)
+
+    results['wishlist_analysis'] = timed(lambda: get('/api/wishlist-analysis'), repeat)
+
+    rows = SCALES[scale]['trading212_rows']
+    csv_data = generate_trading212_csv(rows)
+    results[f'parse_trading212_csv[{rows}]'] = timed(lambda: parse_trading212_csv(csv_data), repeat)
+    transactions = transaction_documents('bench', parse_trading212_csv(csv_data)['transactions'])
+    for method in METHODS:
+        results[f'lot_replay_{method}[{rows}]'] = timed(lambda: LotBook(method).apply(transactions), repeat)
+
+    # Last: every run adds the uploaded rows to the household
+    rows = SCALES[scale]['import_rows']
+    upload = generate_import_csv(rows).encode('utf-8')
+
+    def import_csv():
+        response = client.post('/api/one-time-expense/import', data=upload, content_type='text/csv')
+        if response.status_code != 200 or response.json['failed']:
+            raise RuntimeError(f'Import failed: {response.json}')
+
+    results[f'import_one_time_expenses[{rows}]'] = timed(import_csv, repeat)
+    results['export_one_time_expenses'] = timed(lambda: get('/api/one-time-expense/export').get_data(), repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Get (name, baseline ms, current ms) for every benchmark slower than baseline by more than tolerance"""
+    regressions = []
+    for name, previous in baseline.get('results', {}).items():
+        current = results.get(name)
+        if current and current['median_ms'] > previous['median_ms'] * (1 + tolerance):
+            regressions.append((name, previous['median_ms'], current['median_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark projections and other hot endpoints')
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small')
+    parser.add_argument('--backend', choices=['mongomock', 'mongodb'], default='mongomock')
+    parser.add_argument('--url', default=os.getenv('MONGODB_URL', 'mongodb://localhost:27017/'),
+                        help=f'MongoDB URL for --backend mongodb (data goes to the {BENCH_DATABASE} database)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against results stored with --output')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown vs. baseline (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    # Benchmarks run in a single process: no cross-worker invalidation needed
+    os.environ['CACHE_WATCH'] = 'off'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import database
+    from bench.generate import generate_household
+
+    mongo_client = connect(args.backend, args.url)
+    mongo_client.drop_database(BENCH_DATABASE)
+    database.use_client(mongo_client, BENCH_DATABASE)
+
+    started = time.perf_counter()
+    counts = generate_household(database.get_db(), args.scale, seed=args.seed)
+    generate_s = time.perf_counter() - started
+    print(f'Generated {args.scale} household in {generate_s:.1f}s: {counts}', file=sys.stderr)
+
+    try:
+        results = run_benchmarks(args.scale, args.repeat)
+    finally:
+        mongo_client.drop_database(BENCH_DATABASE)
+
+    report = {
+        'meta': {
+            'scale': args.scale,
+            'backend': args.backend,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'documents': counts,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.utcnow().isoformat()
+        },
+        'results': results
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, previous, current in regressions:
+            print(f'REGRESSION {name}: {previous:.1f} ms -> {current:.1f} ms', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'No regressions beyond {args.tolerance:.0%} against {args.baseline}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
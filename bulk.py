@@ -0,0 +1,227 @@
+"""
+Bulk import and export of one-time income and expenses.
+
+Uploads (CSV with a header row, or NDJSON with one object per line) are read
+as a stream, validated row by row and written in chunks with
+insert_many(ordered=False), so one bad row never blocks the others and memory
+stays flat however large the file is. Exports stream the same formats back.
+"""
+import csv
+import io
+import json
+import math
+from datetime import datetime
+from import_errors import InvalidBulkRequest
+
+FORMATS = ('csv', 'ndjson')
+
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Columns of exported files; imports need the first three
+FIELDS = ('date', 'name', 'amount', 'category', 'notes', 'upcoming', 'currency')
+REQUIRED_FIELDS = ('date', 'name', 'amount')
+
+DEFAULT_CATEGORY = 'other'
+
+# Rows validated and written per insert_many
+CHUNK_SIZE = 1000
+
+# Row errors listed in an import report (all of them are counted)
+MAX_ERRORS = 100
+
+# Rows per chunk of an export response
+EXPORT_BATCH = 500
+
+
+def detect_format(requested=None, mimetype=None, filename=None):
+    """Format of an upload from ?format=, its content type or its file name"""
+    if requested:
+        if requested not in FORMATS:
+            raise InvalidBulkRequest(f"format must be one of: {', '.join(FORMATS)}")
+        return requested
+    if mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json-lines'):
+        return 'ndjson'
+    if mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in ('ndjson', 'jsonl'):
+            return 'ndjson'
+        if extension == 'csv':
+            return 'csv'
+    raise InvalidBulkRequest('Unknown upload format: pass format=csv or format=ndjson')
+
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def parse_row(row, created_at=None):
+    """One-time entry from an imported row; raises ValueError naming the invalid field"""
+    from fx import parse_currency
+    from utils import parse_date
+
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    try:
+        amount = float(row.get('amount'))
+    except (TypeError, ValueError):
+        raise ValueError('amount must be a number')
+    if not math.isfinite(amount):
+        raise ValueError('amount must be a number')
+
+    return {
+        'name': name,
+        'amount': amount,
+        'date': parse_date(row, 'date'),
+        'category': str(row.get('category') or '').strip() or DEFAULT_CATEGORY,
+        'notes': str(row.get('notes') or ''),
+        'upcoming': _truthy(row.get('upcoming')),
+        'currency': parse_currency(row.get('currency')),
+        'created_at': created_at or datetime.utcnow()
+    }
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, raw row) from a binary stream; CSV rows are dicts, NDJSON rows decoded lazily"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or ())]
+        if missing:
+            raise InvalidBulkRequest(f"CSV header is missing: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(text, 1):
+            if line.strip():
+                yield number, line
+
+
+def _decode(raw, fmt):
+    if fmt == 'csv':
+        return raw
+    try:
+        return json.loads(raw)
+    except ValueError:
+        raise ValueError('invalid JSON')
+
+
+def import_rows(collection, stream, fmt, on_insert=None, chunk_size=CHUNK_SIZE):
+    """
+    Insert the valid rows of an upload into collection and report the others.
+
+    on_insert(documents) is called with the documents of each written chunk.
+    Returns {'inserted', 'failed', 'errors'}, errors being the first
+    MAX_ERRORS {'row', 'error'} pairs.
+    """
+    from pymongo.errors import BulkWriteError
+
+    report = {'inserted': 0, 'failed': 0, 'errors': []}
+
+    def fail(number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_ERRORS:
+            report['errors'].append({'row': number, 'error': message})
+
+    def flush(documents, numbers):
+        if not documents:
+            return
+        try:
+            collection.insert_many(documents, ordered=False)
+            failed = set()
+        except BulkWriteError as e:
+            failed = set()
+            for error in e.details.get('writeErrors', []):
+                failed.add(error['index'])
+                fail(numbers[error['index']], error.get('errmsg', 'write failed'))
+        written = [document for index, document in enumerate(documents) if index not in failed]
+        report['inserted'] += len(written)
+        if on_insert and written:
+            on_insert(written)
+
+    created_at = datetime.utcnow()
+    documents, numbers = [], []
+    number = 0
+    try:
+        for number, raw in read_rows(stream, fmt):
+            try:
+                documents.append(parse_row(_decode(raw, fmt), created_at))
+                numbers.append(number)
+            except ValueError as e:
+                fail(number, str(e))
+                continue
+            if len(documents) >= chunk_size:
+                flush(documents, numbers)
+                documents, numbers = [], []
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the file is unreadable; keep what was read before it
+        fail(number + 1, f'unreadable input: {e}')
+    flush(documents, numbers)
+    return report
+
+
+def _export_row(document):
+    return {
+        'date': document['date'].strftime('%Y-%m-%d'),
+        'name': document['name'],
+        'amount': document['amount'],
+        'category': document.get('category', ''),
+        'notes': document.get('notes', ''),
+        'upcoming': bool(document.get('upcoming', False)),
+        'currency': document.get('currency') or ''
+    }
+
+
+def export_rows(collection, query, fmt):
+    """Yield an export of the matching documents, oldest first, in chunks of EXPORT_BATCH rows"""
+    cursor = collection.find(query, {field: 1 for field in FIELDS}).sort([('date', 1), ('_id', 1)])
+    cursor = cursor.batch_size(CHUNK_SIZE)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS, lineterminator='\n') if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+
+    for count, document in enumerate(cursor, 1):
+        row = _export_row(document)
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row))
+            buffer.write('\n')
+        if count % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def upload():
+    """(binary stream, format) of the current request's upload: a multipart 'file' field or the raw body"""
+    from flask import request
+
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('file')
+        if not file:
+            raise InvalidBulkRequest('No file uploaded')
+        return file.stream, detect_format(request.args.get('format'), file.mimetype, file.filename)
+    return io.BufferedReader(request.stream), detect_format(request.args.get('format'), request.mimetype)
+
+
+def export_response(collection, query, fmt, name):
+    """Streaming download of the matching documents"""
+    from flask import Response
+
+    if fmt not in FORMATS:
+        raise InvalidBulkRequest(f"format must be one of: {', '.join(FORMATS)}")
+    return Response(
+        export_rows(collection, query, fmt), mimetype=MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+    )
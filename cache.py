@@ -0,0 +1,262 @@
+"""In-process caches and cross-worker invalidation"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, request
+
+from metrics import record_cache_lookup
+
+# Collections whose writes invalidate derived data (projections, materialized months)
+WATCHED_COLLECTIONS = (
+    'recurring_income',
+    'one_time_income',
+    'recurring_expense',
+    'one_time_expense',
+    'payday_adjustment',
+    'investment_portfolio',
+    'investment_stocks',
+    'investment_contributions',
+    'portfolio_snapshots',
+    'investment_transactions',
+    'dividend_forecast',
+    'wishlist',
+    'wishlist_categories',
+    'settings',
+    'fx_rates',
+)
+
+# Per-collection write counters shared by all workers (used by the polling fallback)
+VERSIONS_COLLECTION = 'cache_versions'
+
+# Error code returned by a standalone mongod for $changeStream
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+_callbacks = []
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def data_version(*collections):
+    """Get the local version of each collection, usable as part of a cache key"""
+    with _versions_lock:
+        return tuple(_versions[name] for name in collections)
+
+
+def on_invalidate(callback):
+    """Register callback(collections) to run whenever collections are invalidated"""
+    _callbacks.append(callback)
+    return callback
+
+
+def invalidate(*collections):
+    """Drop cached data derived from the given collections in this process"""
+    collections = collections or WATCHED_COLLECTIONS
+    with _versions_lock:
+        for name in collections:
+            _versions[name] += 1
+    for callback in _callbacks:
+        callback(collections)
+
+
+def touch(*collections):
+    """Record a write: invalidate locally and publish the change to other workers"""
+    from database import db
+
+    invalidate(*collections)
+    for name in collections:
+        db[VERSIONS_COLLECTION].update_one({'_id': name}, {'$inc': {'version': 1}}, upsert=True)
+
+
+def invalidate_on_write(blueprint, *collections):
+    """Publish a change of collections after every successful write handled by blueprint"""
+    @blueprint.after_request
+    def publish_write(response):
+        if request.method != 'GET' and response.status_code < 400:
+            touch(*collections)
+        return response
+    return blueprint
+
+
+def cached(*collections, maxsize=32):
+    """
+    Memoize a function whose result is derived from the given collections.
+
+    Entries are keyed by the call arguments, today's date and the collection
+    versions, so any invalidation (local or from another worker) makes them
+    unreachable. Callers get a deep copy and may mutate the result freely.
+    """
+    def decorator(func):
+        entries = OrderedDict()
+        entries_lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())), datetime.now().date(), data_version(*collections))
+            with entries_lock:
+                hit = key in entries
+                if hit:
+                    entries.move_to_end(key)
+                    result = entries[key]
+            record_cache_lookup(func.__name__, hit)
+            if hit:
+                return copy.deepcopy(result)
+
+            result = func(*args, **kwargs)
+
+            with entries_lock:
+                entries[key] = result
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return copy.deepcopy(result)
+
+        def clear(changed=None):
+            if changed is None or set(changed) & set(collections):
+                with entries_lock:
+                    entries.clear()
+
+        on_invalidate(clear)
+        wrapper.cache_clear = clear
+        return wrapper
+    return decorator
+
+
+def cache_partial(*collections, maxsize=32):
+    """
+    Cache the HTML a view renders for HTMX requests (its *_partial.html template).
+
+    Entries are keyed by the request path and query, the currency and date
+    format settings and the versions of the collections the page shows, and
+    are dropped when one of those collections is written. Full page loads
+    are always rendered.
+    """
+    def decorator(view):
+        entries = OrderedDict()
+        entries_lock = threading.Lock()
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.headers.get('HX-Request') != 'true':
+                return view(*args, **kwargs)
+
+            from app_settings import get_settings
+            settings = get_settings()
+            key = (
+                request.full_path, settings['currency_code'], settings['currency_symbol'],
+                settings['date_format'], datetime.now().date(), data_version(*collections)
+            )
+            with entries_lock:
+                hit = key in entries
+                if hit:
+                    entries.move_to_end(key)
+                    body = entries[key]
+            record_cache_lookup(view.__name__, hit)
+            if hit:
+                return Response(body, mimetype='text/html')
+
+            response = view(*args, **kwargs)
+            if isinstance(response, str):
+                with entries_lock:
+                    entries[key] = response
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+            return response
+
+        def clear(changed=None):
+            if changed is None or set(changed) & set(collections):
+                with entries_lock:
+                    entries.clear()
+
+        on_invalidate(clear)
+        wrapper.cache_clear = clear
+        return wrapper
+    return decorator
+
+
+class InvalidationWatcher(threading.Thread):
+    """
+    Background thread invalidating local caches when another process writes.
+
+    Uses a change stream when MongoDB runs as a replica set and falls back to
+    polling the cache_versions collection on a standalone mongod.
+    """
+
+    def __init__(self, poll_interval=2.0):
+        super().__init__(name='cache-invalidation-watcher', daemon=True)
+        self.poll_interval = poll_interval
+        self.mode = None
+
+    def run(self):
+        from pymongo.errors import OperationFailure
+
+        try:
+            self.mode = 'change_stream'
+            self._watch_change_stream()
+        except (OperationFailure, NotImplementedError):
+            self.mode = 'polling'
+            self._poll_versions()
+
+    def _watch_change_stream(self):
+        from pymongo.errors import OperationFailure, PyMongoError
+        from database import db
+
+        pipeline = [{'$match': {'ns.coll': {'$in': list(WATCHED_COLLECTIONS)}}}]
+        resume_token = None
+        while True:
+            try:
+                with db.watch(pipeline, resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        collection = change.get('ns', {}).get('coll')
+                        if collection:
+                            invalidate(collection)
+                        else:
+                            invalidate()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    raise
+                # History lost or stream invalidated: start over from scratch
+                resume_token = None
+                invalidate()
+                time.sleep(self.poll_interval)
+            except PyMongoError:
+                time.sleep(self.poll_interval)
+
+    def _poll_versions(self):
+        from pymongo.errors import PyMongoError
+        from database import db
+
+        seen = None
+        while True:
+            try:
+                current = {doc['_id']: doc.get('version', 0) for doc in db[VERSIONS_COLLECTION].find()}
+                if seen is not None:
+                    changed = [name for name, version in current.items() if seen.get(name) != version]
+                    if changed:
+                        invalidate(*changed)
+                seen = current
+            except PyMongoError:
+                pass
+            time.sleep(self.poll_interval)
+
+
+def start_invalidation_watcher():
+    """Start the invalidation watcher for this process (no-op if already running or disabled)"""
+    global _watcher
+
+    if _watcher is not None and _watcher.is_alive():
+        return _watcher
+    if os.getenv('CACHE_WATCH', 'auto').lower() in ('0', 'off', 'false'):
+        return None
+
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = InvalidationWatcher(poll_interval=float(os.getenv('CACHE_POLL_INTERVAL', '2')))
+            _watcher.start()
+    return _watcher
@@ -0,0 +1,209 @@
+"""Command line interface (flask --app app <command>)"""
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+import click
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def register_commands(app):
+    """Attach the project's commands to the Flask CLI"""
+    app.cli.add_command(serve)
+    app.cli.add_command(startup_report)
+    app.cli.add_command(migrate_dates)
+    app.cli.add_command(ensure_indexes_command)
+    app.cli.add_command(rebuild_analytics)
+    app.cli.add_command(build_assets)
+    app.cli.add_command(detect_recurring)
+    app.cli.add_command(load_fx_rates)
+    app.cli.add_command(downsample_snapshots)
+
+
+@click.command('serve')
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', default=8000, show_default=True, type=int)
+@click.option('--server', type=click.Choice(['auto', 'gunicorn', 'waitress']), default='auto', show_default=True,
+              help='auto picks gunicorn, or waitress on Windows')
+@click.option('--workers', type=int, help='Worker processes (gunicorn)')
+@click.option('--threads', type=int, help='Threads per worker')
+@click.option('--worker-class', help='Gunicorn worker class, e.g. gthread or gevent')
+def serve(host, port, server, workers, threads, worker_class):
+    """Run the app with a production WSGI server (debug off)."""
+    if server == 'auto':
+        server = 'waitress' if os.name == 'nt' else 'gunicorn'
+
+    if server == 'gunicorn':
+        args = [sys.executable, '-m', 'gunicorn',
+                '--config', os.path.join(PROJECT_DIR, 'gunicorn.conf.py'),
+                '--chdir', PROJECT_DIR,
+                '--bind', f'{host}:{port}']
+        if workers:
+            args += ['--workers', str(workers)]
+        if threads:
+            args += ['--threads', str(threads)]
+        if worker_class:
+            args += ['--worker-class', worker_class]
+        args.append('wsgi:app')
+        # Replace this process so gunicorn owns signals and worker management
+        os.execv(sys.executable, args)
+
+    from waitress import serve as waitress_serve
+    from wsgi import app
+
+    click.echo(f'Serving on http://{host}:{port} (waitress)')
+    waitress_serve(app, host=host, port=port, threads=threads or int(os.getenv('WAITRESS_THREADS', '8')))
+
+
+@click.command('startup-report')
+@click.option('--top', default=25, show_default=True, help='Number of imports to list')
+def startup_report(top):
+    """Show what importing the app costs (python -X importtime in a fresh interpreter)."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=PROJECT_DIR, capture_output=True, text=True,
+        env=dict(os.environ, CACHE_WATCH='off')
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise click.ClickException(result.stderr.strip().splitlines()[-1])
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    app_import = next((cumulative for cumulative, _, name in imports if name.strip() == 'app'), 0)
+    click.echo(f'Interpreter start + import app: {elapsed_ms:.0f} ms (import app: {app_import / 1000:.1f} ms)')
+    click.echo(f'{"cumulative ms":>14} {"self ms":>8}  module')
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:top]:
+        click.echo(f'{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {name}')
+
+    deferred = [module for module in ('pymongo', 'requests', 'trading212', 'motor', 'quart')
+                if not any(name.strip() == module for _, _, name in imports)]
+    if deferred:
+        click.echo(f'Loaded on first use: {", ".join(deferred)}')
+
+
+@click.command('migrate-dates')
+@click.option('--dry-run', is_flag=True, help='Only count the documents that would change')
+@click.option('--batch-size', default=1000, show_default=True)
+def migrate_dates(dry_run, batch_size):
+    """Convert dates stored as strings to BSON dates and create the indexes."""
+    from pymongo import UpdateOne
+    from cache import touch
+    from database import DATE_FIELDS, db, ensure_indexes
+
+    for name, fields in DATE_FIELDS.items():
+        collection = db[name]
+        string_dates = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+        converted, unparseable, updates = 0, 0, []
+        for document in collection.find(string_dates, {field: 1 for field in fields}):
+            values = {}
+            for field in fields:
+                value = document.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    values[field] = datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+                except ValueError:
+                    unparseable += 1
+            if not values:
+                continue
+            converted += 1
+            if dry_run:
+                continue
+            updates.append(UpdateOne({'_id': document['_id']}, {'$set': values}))
+            if len(updates) >= batch_size:
+                collection.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+
+        message = f'{name}: {converted} documents {"to convert" if dry_run else "converted"}'
+        if unparseable:
+            message += f', {unparseable} values left as they are (not ISO dates)'
+        click.echo(message)
+
+    if not dry_run:
+        touch(*DATE_FIELDS)
+        ensure_indexes()
+        click.echo('Indexes created')
+
+
+@click.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create the indexes the listings, history and rate queries rely on (run on each deploy)."""
+    from database import INDEXES, ensure_indexes
+
+    ensure_indexes()
+    click.echo(f'Indexes created for {len(INDEXES)} collections')
+
+
+@click.command('rebuild-analytics')
+def rebuild_analytics():
+    """Recompute the expense category rollup from all one-time expenses."""
+    from analytics import rebuild_rollup
+    from cache import touch
+
+    documents = rebuild_rollup()
+    touch('one_time_expense')
+    click.echo(f'Expense category rollup rebuilt: {documents} category months')
+
+
+@click.command('build-assets')
+def build_assets():
+    """Fingerprint the static CSS/JS into static/dist and write the manifest."""
+    from assets import build
+
+    manifest = build()
+    for name, hashed in sorted(manifest.items()):
+        click.echo(f'{name} -> {hashed}')
+
+
+@click.command('detect-recurring')
+@click.option('--full', is_flag=True, help='Rescan the whole history instead of the new entries only')
+def detect_recurring(full):
+    """Group one-time entries and detect the ones that recur."""
+    from recurrence import reset, scan_all, suggestions
+
+    if full:
+        reset()
+    for kind, read in scan_all().items():
+        click.echo(f'{kind}: {read} new entries scanned')
+    click.echo(f'{len(suggestions())} recurring items suggested')
+
+
+@click.command('load-fx-rates')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--base', default='EUR', show_default=True, help='Currency the rates are quoted against')
+def load_fx_rates(path, base):
+    """Load daily FX rates from a CSV (date,currency,rate or the ECB history file)."""
+    from cache import touch
+    from fx import load_rates, parse_currency, read_rates
+
+    with open(path, encoding='utf-8-sig') as file:
+        text = file.read()
+    try:
+        written = load_rates(read_rates(text), pivot=parse_currency(base))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    touch('fx_rates')
+    click.echo(f'{written} daily rates loaded (per 1 {base.upper()})')
+
+
+@click.command('downsample-snapshots')
+def downsample_snapshots():
+    """Thin old portfolio snapshots to one per week, and older ones to one per month."""
+    from cache import touch
+    from snapshots import downsample
+
+    deleted = downsample()
+    touch('portfolio_snapshots')
+    click.echo(f"Deleted {deleted['weekly']} snapshots thinned to weekly and {deleted['monthly']} to monthly")
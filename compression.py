@@ -0,0 +1,90 @@
+"""
+gzip/brotli compression of responses.
+
+HTML, JSON, CSS and JS responses above COMPRESS_MIN_SIZE bytes are compressed
+when the client accepts it. Brotli is used when the optional brotli package
+is installed (requirements-prod.txt). Fingerprinted static files never change,
+so they are compressed once per process at the highest level.
+"""
+import gzip
+import os
+import threading
+from flask import request
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml'
+)
+
+MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+
+# Levels for dynamic responses (speed matters) and fingerprinted files (compressed once)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_static_cache = {}
+_static_cache_lock = threading.Lock()
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def compress(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL)
+
+
+def _compress_response(response):
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if not encoding:
+        return response
+
+    if response.direct_passthrough:
+        # send_file() responses: only fingerprinted assets, whose content is fixed per path
+        filename = (request.view_args or {}).get('filename', '')
+        if request.endpoint != 'static' or not filename.startswith('dist/'):
+            return response
+        source = response.response
+        try:
+            key = (filename, encoding)
+            body = _static_cache.get(key)
+            if body is None:
+                response.direct_passthrough = False
+                body = compress(response.get_data(), encoding, best=True)
+                with _static_cache_lock:
+                    _static_cache[key] = body
+        finally:
+            if hasattr(source, 'close'):
+                source.close()
+    elif response.is_streamed:
+        return response
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        body = compress(data, encoding)
+
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def init_compression(app):
+    """Compress the responses of app"""
+    app.after_request(_compress_response)
@@ -1,16 +1,175 @@
 """Database connection and collections"""
-from pymongo import MongoClient
-from datetime import datetime
 import os
+import threading
 
 # Check for MONGODB_URL in environment variables
 mongodb_url = os.getenv('MONGODB_URL', 'mongodb://localhost:27017/')
-mongo_client = MongoClient(mongodb_url)
-db = mongo_client['budget_tracker']
+database_name = 'budget_tracker'
 
 # Detect if using online MongoDB (not localhost)
 is_online_db = not ('localhost' in mongodb_url.lower() or '127.0.0.1' in mongodb_url)
 
+# Connection pool settings: environment variable -> (MongoClient option, type)
+CLIENT_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGO_READ_PREFERENCE': ('readPreference', str),
+}
+
+# Fields stored as BSON dates (see `flask migrate-dates`)
+DATE_FIELDS = {
+    'recurring_income': ('start_date', 'end_date'),
+    'recurring_expense': ('start_date', 'end_date'),
+    'one_time_income': ('date',),
+    'one_time_expense': ('date',),
+    'wishlist': ('target_date', 'purchased_date'),
+    'investment_portfolio': ('start_date',),
+}
+
+# Indexes used by range queries, sorts and deduplication: collection -> list of
+# index keys, or of (keys, create_index options)
+# Bank statement imports (bank_import.py); manual entries have no import_hash
+IMPORT_HASH_INDEX = ([('import_hash', 1)], {'unique': True, 'partialFilterExpression': {'import_hash': {'$type': 'string'}}})
+
+INDEXES = {
+    'recurring_income': [[('start_date', 1)]],
+    'recurring_expense': [[('start_date', 1)]],
+    # Listings, and the incremental recurrence scan (created_at)
+    'one_time_income': [[('date', -1), ('_id', -1)], [('category', 1), ('date', -1), ('_id', -1)],
+                        [('created_at', 1), ('_id', 1)]],
+    'one_time_expense': [
+        [('date', -1), ('_id', -1)], [('category', 1), ('date', -1), ('_id', -1)], [('created_at', 1), ('_id', 1)],
+        IMPORT_HASH_INDEX,
+    ],
+    'payday_adjustment': [[('year', 1), ('month', 1)]],
+    'recurring_candidates': [[('kind', 1), ('entries.id', 1)]],
+    'fx_rates': [[('currency', 1), ('date', 1)]],
+    # History range queries, per portfolio or across all of them
+    'portfolio_snapshots': [[('portfolio_id', 1), ('date', 1)], [('date', 1)]],
+    # Per portfolio history, and dividends received across all portfolios (dividends.py)
+    'investment_transactions': [[('portfolio_id', 1), ('date', 1)], [('action', 1), ('date', 1)]],
+}
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_collections = {}
+_async_client = None
+_event_listeners = []
+
+
+def get_client_options():
+    """Get MongoClient keyword arguments from the environment (unset values keep PyMongo defaults)"""
+    options = {}
+    for env_name, (option, cast) in CLIENT_OPTIONS.items():
+        value = os.getenv(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+def add_event_listener(listener):
+    """Register a pymongo.monitoring listener for clients created from now on"""
+    _event_listeners.append(listener)
+
+
+def get_client():
+    """
+    Get the MongoClient for this process.
+
+    The client is created on first use, and created again in a forked worker,
+    since PyMongo clients must not be shared across fork(). PyMongo itself is
+    imported here so that starting the app does not pay for it.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                from pymongo import MongoClient
+                _collections.clear()
+                _client = MongoClient(mongodb_url, event_listeners=list(_event_listeners),
+                                      **get_client_options())
+                _client_pid = pid
+    return _client
+
+
+def use_client(client, name=None):
+    """Use an existing client, e.g. an in-memory fake, instead of connecting to mongodb_url"""
+    global _client, _client_pid, database_name
+
+    with _client_lock:
+        _collections.clear()
+        _client = client
+        _client_pid = os.getpid()
+        if name:
+            database_name = name
+
+
+def get_db():
+    return get_client()[database_name]
+
+
+def get_collection(name):
+    get_client()
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_db()[name]
+    return collection
+
+
+def get_async_db():
+    """
+    Get the Motor database used by the async API (see asgi.py).
+
+    Motor is only imported here, so the synchronous app does not need it.
+    """
+    global _async_client
+
+    if _async_client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _async_client = AsyncIOMotorClient(mongodb_url, event_listeners=list(_event_listeners),
+                                           **get_client_options())
+    return _async_client[database_name]
+
+
+def ensure_indexes():
+    """Create the indexes in INDEXES (existing indexes are left as they are)"""
+    for name, indexes in INDEXES.items():
+        for index in indexes:
+            keys, options = index if isinstance(index, tuple) else (index, {})
+            get_collection(name).create_index(keys, **options)
+
+
+class LazyDatabase:
+    """Stand-in for the Database object that resolves the client on first use"""
+
+    def __getitem__(self, name):
+        return LazyCollection(name)
+
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
+
+class LazyCollection:
+    """Stand-in for a Collection object that resolves the client on first use"""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_collection(self.name), attr)
+
+
+db = LazyDatabase()
+
 settings_collection = db['settings']
 recurring_income_collection = db['recurring_income']
 one_time_income_collection = db['one_time_income']
@@ -20,33 +179,6 @@ payday_adjustment_collection = db['payday_adjustment']
 wishlist_collection = db['wishlist']
 wishlist_categories_collection = db['wishlist_categories']
 
-def get_currency_settings():
-    settings = settings_collection.find_one()
-    if not settings:
-        settings = {
-            'currency_code': 'USD',
-            'currency_symbol': '$',
-            'date_format': 'DD/MM/YYYY',
-            'created_at': datetime.utcnow()
-        }
-        settings_collection.insert_one(settings)
-    return {
-        'code': settings['currency_code'],
-        'symbol': settings['currency_symbol']
-    }
-
-def get_date_format():
-    settings = settings_collection.find_one()
-    if not settings or 'date_format' not in settings:
-        # Default to DD/MM/YYYY if not set
-        settings_collection.update_one(
-            {},
-            {'$set': {'date_format': 'DD/MM/YYYY'}},
-            upsert=True
-        )
-        return 'DD/MM/YYYY'
-    return settings['date_format']
-
 def get_wishlist_categories():
     """Get all wishlist categories (preset + custom)"""
     # Default preset categories
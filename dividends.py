@@ -0,0 +1,219 @@
+"""
+Dividend income of investment portfolios.
+
+Dividend events are the 'dividend' rows of investment_transactions (stored
+by the Trading212 import). After each import or sync, refresh() sums every
+ticker's dividends per share over the trailing twelve months, by calendar
+month, and multiplies them by the shares held now. Cash amounts are the
+Total paid into the account, in total_currency; yields compare the
+per-share amount in the instrument currency with the current price. The
+result is saved per portfolio in dividend_forecast, with twelve monthly
+amounts per cash currency, so projections only read those and convert
+them with the fx.RateTable like the other amounts:
+
+- forward projections expect each calendar month to pay what it paid over
+  the last twelve months (at today's holdings);
+- projections of past months use the dividends actually received.
+
+mean_return_percent (and the realized TWR) is a total return that already
+includes dividends, so portfolios with a forecast grow by price_returns():
+the return less the trailing dividend yield.
+"""
+from datetime import datetime, timedelta
+
+FORECAST_COLLECTION = 'dividend_forecast'
+TTM_DAYS = 365
+
+
+def _cash(event):
+    """
+    (amount, currency) paid into the account: the Total column in
+    total_currency, or shares * price in the instrument currency for exports
+    without it. A None currency is the base currency.
+    """
+    total = event.get('total')
+    if total is not None:
+        return total, event.get('total_currency')
+    return event['amount'], event.get('currency')
+
+
+def ticker_forecasts(events, holdings):
+    """
+    Trailing-twelve-month dividends of each ticker and the projected amount per calendar month.
+
+    events are dividend transaction documents of the last TTM_DAYS; holdings
+    maps each ticker to its current (shares, price).
+    """
+    per_ticker = {}
+    for event in events:
+        ticker = per_ticker.setdefault(event['ticker'], {'per_share': 0.0, 'cash': {}})
+        amount, currency = _cash(event)
+        cash = ticker['cash'].setdefault(currency, {'received': 0.0, 'months': [0.0] * 12})
+        cash['received'] += amount
+        if event.get('shares'):
+            ticker['per_share'] += event['amount'] / event['shares']
+            cash['months'][event['date'].month - 1] += amount / event['shares']
+
+    tickers = []
+    for name, ticker in sorted(per_ticker.items()):
+        shares, price = holdings.get(name, (0.0, None))
+        tickers.append({
+            'ticker': name,
+            'ttm_per_share': round(ticker['per_share'], 4),
+            'yield_percent': round(ticker['per_share'] / price * 100, 2) if price else None,
+            'shares': shares,
+            # Per cash currency (a ticker's older events may lack the Total column)
+            'cash': [{
+                'currency': currency,
+                'ttm_received': round(cash['received'], 2),
+                'monthly': [round(per_share * shares, 2) for per_share in cash['months']]
+            } for currency, cash in _by_currency(ticker['cash'])]
+        })
+    return tickers
+
+
+def _by_currency(values):
+    """Items of a {currency: value} dict with the base currency (None) first, then by code"""
+    return sorted(values.items(), key=lambda item: (item[0] is not None, item[0] or ''))
+
+
+def _cash_totals(tickers):
+    """The tickers' cash per currency: [{currency, ttm_received, monthly}]"""
+    totals = {}
+    for ticker in tickers:
+        for cash in ticker['cash']:
+            total = totals.setdefault(cash['currency'], {'ttm_received': 0.0, 'monthly': [0.0] * 12})
+            total['ttm_received'] += cash['ttm_received']
+            total['monthly'] = [value + amount for value, amount in zip(total['monthly'], cash['monthly'])]
+    return [{
+        'currency': currency,
+        'ttm_received': round(total['ttm_received'], 2),
+        'monthly': [round(amount, 2) for amount in total['monthly']]
+    } for currency, total in _by_currency(totals)]
+
+
+def _forecast_cash(forecast):
+    """The cash entries of a forecast document (documents saved before cash currencies count in the base currency)"""
+    if 'cash' in forecast:
+        return forecast['cash']
+    return [{'currency': None, 'monthly': forecast.get('monthly', [0.0] * 12)}]
+
+
+def cash_currencies(forecasts):
+    """Cash currencies of forecast documents, for fx.rate_table()"""
+    return {cash['currency'] for forecast in forecasts for cash in _forecast_cash(forecast)}
+
+
+def forecast(portfolio_id, today=None):
+    """The dividend forecast document of a portfolio, computed from its transactions and holdings (not stored)"""
+    from database import db
+
+    portfolio_id = str(portfolio_id)
+    today = today or datetime.now()
+    events = db['investment_transactions'].find(
+        {'portfolio_id': portfolio_id, 'action': 'dividend', 'date': {'$gte': today - timedelta(days=TTM_DAYS)}},
+        {'ticker': 1, 'shares': 1, 'amount': 1, 'currency': 1, 'total': 1, 'total_currency': 1, 'date': 1}
+    )
+    holdings = {}
+    for stock in db['investment_stocks'].find({'portfolio_id': portfolio_id},
+                                              {'ticker': 1, 'shares': 1, 'current_price': 1, 'avg_price': 1}):
+        shares, _ = holdings.get(stock['ticker'], (0.0, None))
+        holdings[stock['ticker']] = (shares + stock.get('shares', 0),
+                                     stock.get('current_price', stock.get('avg_price')))
+
+    tickers = ticker_forecasts(events, holdings)
+    document = {
+        'portfolio_id': portfolio_id,
+        'tickers': tickers,
+        'cash': _cash_totals(tickers),
+        'updated_at': datetime.utcnow()
+    }
+    return document
+
+
+def refresh(portfolio_id, today=None):
+    """
+    Recompute and store the dividend forecast of a portfolio; returns the stored document.
+
+    Called by the import and sync routes, whose writes publish the
+    dividend_forecast change (cache.invalidate_on_write).
+    """
+    from database import db
+
+    document = forecast(portfolio_id, today)
+    db[FORECAST_COLLECTION].replace_one({'_id': document['portfolio_id']}, document, upsert=True)
+    return document
+
+
+def delete(portfolio_id):
+    from database import db
+
+    db[FORECAST_COLLECTION].delete_one({'_id': str(portfolio_id)})
+
+
+def forecast_totals(forecasts, portfolios, month_starts, rates=None):
+    """{(year, month): projected dividends} of the portfolios' forecast documents, converted with an fx.RateTable if given"""
+    portfolio_ids = {str(portfolio['_id']) for portfolio in portfolios}
+    totals = {}
+    for forecast in forecasts:
+        if forecast['_id'] not in portfolio_ids:
+            continue
+        for cash in _forecast_cash(forecast):
+            for month_start in month_starts:
+                key = (month_start.year, month_start.month)
+                amount = cash['monthly'][month_start.month - 1]
+                if rates is not None:
+                    amount *= rates.factor(cash['currency'], key)
+                totals[key] = totals.get(key, 0) + amount
+    if not any(totals.values()):
+        return {}
+    return totals
+
+
+def price_returns(portfolios, forecasts, rates=None):
+    """
+    The portfolios with the trailing dividend yield of their forecast taken out of mean_return_percent.
+
+    With an fx.RateTable the yearly dividends are converted at the current
+    month's rates, which the table must include.
+    """
+    month_key = (datetime.now().year, datetime.now().month)
+    yearly = {}
+    for forecast in forecasts:
+        yearly[forecast['_id']] = sum(
+            sum(cash['monthly']) * (rates.factor(cash['currency'], month_key) if rates is not None else 1.0)
+            for cash in _forecast_cash(forecast)
+        )
+    result = []
+    for portfolio in portfolios:
+        dividends = yearly.get(str(portfolio['_id']))
+        value = portfolio.get('current_value', 0)
+        if dividends and value > 0:
+            portfolio = dict(portfolio, mean_return_percent=portfolio.get('mean_return_percent', 7.0) - dividends / value * 100)
+        result.append(portfolio)
+    return result
+
+
+def received_totals_pipeline(range_start, range_end, portfolios):
+    """
+    Aggregation pipeline totalling the portfolios' dividends received per month and cash currency
+    within [range_start, range_end] (dates).
+
+    Groups like utils.monthly_totals_pipeline(), so utils.totals_by_month()
+    maps and converts the results.
+    """
+    # The Total in total_currency when the export had one, else the amount in the instrument currency
+    has_total = {'$gt': ['$total', None]}
+    return [
+        {'$match': {'action': 'dividend', 'portfolio_id': {'$in': [str(portfolio['_id']) for portfolio in portfolios]}, 'date': {
+            '$gte': datetime.combine(range_start, datetime.min.time()),
+            '$lte': datetime.combine(range_end, datetime.max.time())
+        }}},
+        {'$group': {
+            '_id': {
+                'year': {'$year': '$date'}, 'month': {'$month': '$date'},
+                'currency': {'$cond': [has_total, '$total_currency', '$currency']}
+            },
+            'total': {'$sum': {'$cond': [has_total, '$total', '$amount']}}
+        }}
+    ]
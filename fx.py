@@ -0,0 +1,216 @@
+"""
+Foreign exchange rates for income and expenses kept in another currency.
+
+Daily rates are stored in the fx_rates collection as units of a currency per
+one unit of the pivot currency they were published against (EUR for the ECB
+reference rates). Items without a currency are in the base currency (the
+currency setting).
+
+Projections convert in bulk: MongoDB averages the daily rates per month, and
+a RateTable holds one factor per projected month for each currency in use.
+Engines total the amounts per currency and multiply by those factors, so no
+rate is looked up per item or occurrence.
+"""
+import csv
+import io
+import re
+from bisect import bisect_right
+from datetime import datetime
+from cache import cached
+
+FX_COLLECTION = 'fx_rates'
+
+# Pivot of loaded rates when the file does not say (the ECB publishes rates per EUR)
+DEFAULT_PIVOT = 'EUR'
+
+LOAD_BATCH = 1000
+
+CURRENCY_PATTERN = re.compile(r'^[A-Z]{3}$')
+
+
+class InvalidCurrency(ValueError):
+    """A currency code that is not three letters (answered with 400)"""
+
+
+class MissingRates(LookupError):
+    """No FX rates are loaded for a currency in use: missing server data, answered with 503"""
+
+
+def parse_currency(value):
+    """Uppercase ISO 4217 code from a request value; empty values give None (the base currency)"""
+    if value is None or not str(value).strip():
+        return None
+    code = str(value).strip().upper()
+    if not CURRENCY_PATTERN.match(code):
+        raise InvalidCurrency('currency must be a three-letter code such as USD')
+    return code
+
+
+def _parse_rate(value):
+    try:
+        rate = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return rate if rate > 0 else None
+
+
+def read_rates(text):
+    """
+    Yield (date, currency, rate) from a CSV of daily rates.
+
+    Either the long format (date, currency and rate columns) or the wide
+    format of the ECB history file (a Date column and one column per
+    currency). Missing values such as N/A are skipped.
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = [column.strip().lower() for column in next(reader, [])]
+    if {'date', 'currency', 'rate'} <= set(header):
+        date_index, currency_index, rate_index = (header.index(name) for name in ('date', 'currency', 'rate'))
+        for row in reader:
+            if len(row) <= max(date_index, currency_index, rate_index):
+                continue
+            rate = _parse_rate(row[rate_index])
+            if rate is not None:
+                yield datetime.strptime(row[date_index].strip(), '%Y-%m-%d'), parse_currency(row[currency_index]), rate
+        return
+
+    if not header or header[0] != 'date':
+        raise ValueError('Expected a date,currency,rate header or a Date column followed by currency columns')
+    currencies = [(index, parse_currency(code)) for index, code in enumerate(header) if index and code.strip()]
+    for row in reader:
+        if not row or not row[0].strip():
+            continue
+        day = datetime.strptime(row[0].strip(), '%Y-%m-%d')
+        for index, currency in currencies:
+            rate = _parse_rate(row[index]) if index < len(row) else None
+            if rate is not None:
+                yield day, currency, rate
+
+
+def stored_pivot():
+    """Pivot currency of the loaded rates, or None when none are loaded"""
+    from database import db
+
+    document = db[FX_COLLECTION].find_one({}, {'base': 1})
+    return document['base'] if document else None
+
+
+def load_rates(rates, pivot=DEFAULT_PIVOT):
+    """Upsert (date, currency, rate) tuples quoted against pivot; returns how many were written"""
+    from pymongo import UpdateOne
+    from database import db
+
+    existing = stored_pivot()
+    if existing and existing != pivot:
+        raise ValueError(f'The loaded rates are quoted against {existing}, not {pivot}')
+
+    written = 0
+    batch = []
+    for day, currency, rate in rates:
+        if currency == pivot:
+            continue
+        batch.append(UpdateOne(
+            {'_id': f'{day:%Y-%m-%d}:{currency}'},
+            {'$set': {'date': day, 'currency': currency, 'rate': rate, 'base': pivot}},
+            upsert=True
+        ))
+        if len(batch) == LOAD_BATCH:
+            db[FX_COLLECTION].bulk_write(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        db[FX_COLLECTION].bulk_write(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+def monthly_rates_pipeline(currencies):
+    """Aggregation pipeline averaging the daily rates of the currencies per month"""
+    return [
+        {'$match': {'currency': {'$in': list(currencies)}}},
+        {'$group': {
+            '_id': {'currency': '$currency', 'year': {'$year': '$date'}, 'month': {'$month': '$date'}},
+            'rate': {'$avg': '$rate'}
+        }}
+    ]
+
+
+@cached(FX_COLLECTION)
+def monthly_rates(currencies):
+    """{currency: {(year, month): average rate per pivot unit}} of the given currencies"""
+    from database import db
+
+    rates = {currency: {} for currency in currencies}
+    for group in db[FX_COLLECTION].aggregate(monthly_rates_pipeline(currencies)):
+        key = group['_id']
+        rates[key['currency']][(key['year'], key['month'])] = group['rate']
+    return rates
+
+
+def _monthly_series(rates, keys):
+    """Rate of each month; months without rates use the latest earlier month (or the first known one)"""
+    known = sorted(rates)
+    series = []
+    for key in keys:
+        index = bisect_right(known, key)
+        series.append(rates[known[index - 1] if index else known[0]])
+    return series
+
+
+class RateTable:
+    """Factors converting amounts in each currency to the base currency, one per month"""
+    __slots__ = ('base', 'months', 'factors')
+
+    def __init__(self, base, month_keys, factors):
+        self.base = base
+        self.months = {key: index for index, key in enumerate(month_keys)}
+        self.factors = factors
+
+    def month_factors(self, currency):
+        """Factor of each month for amounts in currency, or None when no conversion is needed"""
+        if currency is None or currency == self.base:
+            return None
+        return self.factors[currency]
+
+    def factor(self, currency, month_key):
+        """Factor for an amount in currency dated in month_key ((year, month) of the table)"""
+        if currency is None or currency == self.base:
+            return 1.0
+        return self.factors[currency][self.months[month_key]]
+
+
+def rate_table(month_starts, currencies):
+    """
+    RateTable of the months for the item currencies (None entries are the base currency).
+
+    Returns None when no item has a currency, so ledgers in one currency
+    never touch the rates or settings.
+    """
+    from app_settings import get_currency_settings
+
+    if not any(currencies):
+        return None
+    base = get_currency_settings()['code']
+    foreign = sorted({currency for currency in currencies if currency and currency != base})
+    keys = [(month_start.year, month_start.month) for month_start in month_starts]
+    if not foreign:
+        return RateTable(base, keys, {})
+
+    pivot = stored_pivot()
+    if pivot is None:
+        raise MissingRates(f'No FX rates loaded for {", ".join(foreign)}; load them with flask load-fx-rates')
+    quoted = tuple(sorted({currency for currency in foreign + [base] if currency != pivot}))
+    rates = monthly_rates(quoted)
+    missing = [currency for currency in quoted if not rates[currency]]
+    if missing:
+        raise MissingRates(f'No FX rates loaded for {", ".join(missing)}; load them with flask load-fx-rates')
+
+    # Units per pivot unit: an amount in C is worth amount / rate_C pivot units, times rate_base in the base
+    series = {currency: _monthly_series(rates[currency], keys) for currency in quoted}
+    ones = [1.0] * len(keys)
+    base_series = series.get(base, ones)
+    factors = {
+        currency: [base_rate / rate for base_rate, rate in zip(base_series, series.get(currency, ones))]
+        for currency in foreign
+    }
+    return RateTable(base, keys, factors)
@@ -0,0 +1,22 @@
+"""Gunicorn settings (gunicorn -c gunicorn.conf.py wsgi:app)"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# gthread serves several requests per worker with threads; use gevent for
+# many slow clients (pip install gevent, GUNICORN_WORKER_CLASS=gevent)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = 5
+
+# Import the app once in the master. Each worker opens its own MongoClient
+# lazily after fork (see database.get_client).
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
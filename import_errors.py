@@ -0,0 +1,14 @@
+"""
+Errors of the bulk and bank statement importers.
+
+Kept out of bulk.py and bank_import.py so that app.py can register their
+400 handlers without loading the importers at startup.
+"""
+
+
+class InvalidBulkRequest(ValueError):
+    """An upload that cannot be read at all, or an unknown format (answered with 400)"""
+
+
+class InvalidStatement(ValueError):
+    """A statement whose layout cannot be recognized (answered with 400)"""
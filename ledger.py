@@ -0,0 +1,264 @@
+"""
+Compact in-memory copy of the ledger used by projections and month details.
+
+Recurring items become __slots__ records with dates as ordinals, and projected
+one-time items are reduced to monthly totals by MongoDB. The ledger is loaded
+once and reloaded only after a write to one of its collections.
+"""
+import calendar
+import threading
+from datetime import date
+from cache import data_version
+from utils import monthly_totals_pipeline, one_time_query, to_date, totals_by_month_and_currency
+
+LEDGER_COLLECTIONS = ('recurring_income', 'one_time_income', 'recurring_expense', 'one_time_expense')
+
+FREQUENCIES = ('monthly', 'weekly', 'biweekly', 'yearly')
+MONTHLY, WEEKLY, BIWEEKLY, YEARLY = range(len(FREQUENCIES))
+
+
+class InvalidFrequency(ValueError):
+    """A recurring item frequency that is not one of FREQUENCIES (answered with 400)"""
+
+
+def parse_frequency(value):
+    """A frequency from a request value"""
+    if value not in FREQUENCIES:
+        raise InvalidFrequency(f'frequency must be one of: {", ".join(FREQUENCIES)}')
+    return value
+
+
+# end_ordinal of items without an end date
+NO_END = date.max.toordinal()
+
+RECURRING_FIELDS = {
+    'name': 1, 'amount': 1, 'frequency': 1, 'start_date': 1, 'end_date': 1,
+    'category': 1, 'payday': 1, 'upcoming': 1, 'currency': 1
+}
+
+_lock = threading.Lock()
+_ledger = None
+_ledger_version = None
+
+
+class Labels:
+    """Interning table mapping labels (e.g. category names) to small integer ids"""
+
+    def __init__(self):
+        self._ids = {}
+        self._labels = []
+        self._lock = threading.Lock()
+
+    def id(self, label):
+        label_id = self._ids.get(label)
+        if label_id is None:
+            with self._lock:
+                label_id = self._ids.get(label)
+                if label_id is None:
+                    label_id = self._ids[label] = len(self._labels)
+                    self._labels.append(label)
+        return label_id
+
+    def __getitem__(self, label_id):
+        return self._labels[label_id]
+
+
+categories = Labels()
+
+
+class RecurringItem:
+    """A recurring income or expense"""
+    __slots__ = ('item_id', 'name', 'start_ordinal', 'end_ordinal', 'freq_code',
+                 'amount', 'currency', 'category_id', 'payday', 'upcoming')
+
+    def __init__(self, document):
+        end_date = document.get('end_date')
+        self.item_id = str(document['_id'])
+        self.name = document['name']
+        self.start_ordinal = to_date(document['start_date']).toordinal()
+        self.end_ordinal = to_date(end_date).toordinal() if end_date else NO_END
+        self.freq_code = FREQUENCIES.index(document['frequency'])
+        self.amount = document['amount']
+        self.currency = document.get('currency')
+        self.category_id = categories.id(document.get('category'))
+        self.payday = document.get('payday')
+        self.upcoming = document.get('upcoming') is True
+
+    @property
+    def frequency(self):
+        return FREQUENCIES[self.freq_code]
+
+    @property
+    def category(self):
+        return categories[self.category_id]
+
+    def occurrences(self, range_start, range_end):
+        """How many times the item occurs in [range_start, range_end] (ordinals), see calculate_occurrences_in_range()"""
+        actual_start = max(self.start_ordinal, range_start)
+        actual_end = min(self.end_ordinal, range_end)
+        if actual_start > actual_end:
+            return 0
+
+        freq_code = self.freq_code
+        if freq_code == MONTHLY:
+            return 1
+        if freq_code == WEEKLY or freq_code == BIWEEKLY:
+            step = 7 if freq_code == WEEKLY else 14
+            # First day on or after actual_start in phase with the start date
+            first = actual_start + (self.start_ordinal - actual_start) % step
+            return (actual_end - first) // step + 1 if first <= actual_end else 0
+        if freq_code == YEARLY:
+            year = date.fromordinal(range_start).year
+            if year < date.fromordinal(self.start_ordinal).year:
+                return 0
+            return 1 if range_start <= self.anniversary(year) <= range_end else 0
+        return 0
+
+    def anniversary(self, year):
+        """Ordinal of the start date's anniversary in year (February 28 for a February 29 start)"""
+        start_date = date.fromordinal(self.start_ordinal)
+        if start_date.month == 2 and start_date.day == 29 and not calendar.isleap(year):
+            return date(year, 2, 28).toordinal()
+        return start_date.replace(year=year).toordinal()
+
+    def occurrences_by_month(self, grid):
+        """
+        Occurrences in each month of a month_grid(), in O(1) per month.
+
+        Weekly and biweekly items count the days in phase with the start date
+        up to each month's end and take the difference.
+        """
+        start, end = self.start_ordinal, self.end_ordinal
+        freq_code = self.freq_code
+        if freq_code == WEEKLY or freq_code == BIWEEKLY:
+            step = 7 if freq_code == WEEKLY else 14
+
+            def up_to(ordinal):
+                ordinal = min(ordinal, end)
+                return (ordinal - start) // step + 1 if ordinal >= start else 0
+
+            return [up_to(month_end) - up_to(month_start - 1) for month_start, month_end in grid]
+        if freq_code == MONTHLY:
+            return [1 if start <= month_end and end >= month_start else 0 for month_start, month_end in grid]
+        return [self.occurrences(month_start, month_end) for month_start, month_end in grid]
+
+
+def month_grid(month_starts):
+    """(first day, last day) ordinals of each month, the input of RecurringItem.occurrences_by_month()"""
+    return [
+        (month_start.toordinal(),
+         month_start.toordinal() + calendar.monthrange(month_start.year, month_start.month)[1] - 1)
+        for month_start in month_starts
+    ]
+
+
+def recurring_totals(items, grid, rates=None):
+    """
+    Total amount of the items in each month of a month_grid().
+
+    With an fx.RateTable the items are totalled per currency, and each
+    currency's totals are converted with its monthly factors.
+    """
+    by_currency = {}
+    for item in items:
+        totals = by_currency.get(item.currency)
+        if totals is None:
+            totals = by_currency[item.currency] = [0.0] * len(grid)
+        amount = item.amount
+        for index, count in enumerate(item.occurrences_by_month(grid)):
+            if count:
+                totals[index] += amount * count
+
+    totals = [0.0] * len(grid)
+    for currency, currency_totals in by_currency.items():
+        factors = rates.month_factors(currency) if rates is not None else None
+        if factors is None:
+            totals = [total + amount for total, amount in zip(totals, currency_totals)]
+        else:
+            totals = [total + amount * factor for total, amount, factor in zip(totals, currency_totals, factors)]
+    return totals
+
+
+class MonthlyTotals:
+    """Totals of projected one-time items per (year, month) and currency, computed by MongoDB"""
+    __slots__ = ('totals',)
+
+    def __init__(self, totals):
+        self.totals = totals
+
+    @property
+    def currencies(self):
+        return {currency for month_totals in self.totals.values() for currency in month_totals}
+
+    def totals_by_month(self, month_starts, rates=None):
+        """The totals of the given months, converted with an fx.RateTable if given (months without items are left out)"""
+        totals = self.totals
+        keys = [(month_start.year, month_start.month) for month_start in month_starts]
+        result = {}
+        for key in keys:
+            month_totals = totals.get(key)
+            if month_totals is None:
+                continue
+            if rates is None:
+                result[key] = sum(month_totals.values())
+            else:
+                result[key] = sum(total * rates.factor(currency, key) for currency, total in month_totals.items())
+        return result
+
+
+class Ledger:
+    """
+    Active recurring items (including upcoming ones) and the monthly totals of
+    projected one-time items.
+
+    projected_income and projected_expenses are the recurring items that count
+    towards projections, and currencies the item currencies in use (None for
+    the base currency).
+    """
+    __slots__ = ('recurring_income', 'recurring_expenses', 'projected_income',
+                 'projected_expenses', 'one_time_income', 'one_time_expenses', 'currencies')
+
+    def __init__(self, recurring_incomes, recurring_expenses, one_time_income_totals, one_time_expense_totals):
+        self.recurring_income = recurring_items(recurring_incomes)
+        self.recurring_expenses = recurring_items(recurring_expenses)
+        self.projected_income = [item for item in self.recurring_income if not item.upcoming]
+        self.projected_expenses = [item for item in self.recurring_expenses if not item.upcoming]
+        self.one_time_income = MonthlyTotals(one_time_income_totals)
+        self.one_time_expenses = MonthlyTotals(one_time_expense_totals)
+        self.currencies = (
+            {item.currency for item in self.recurring_income + self.recurring_expenses}
+            | self.one_time_income.currencies | self.one_time_expenses.currencies
+        )
+
+
+def recurring_items(documents):
+    """RecurringItems of the documents, skipping items with an unknown frequency (they never occur)"""
+    return [RecurringItem(document) for document in documents if document.get('frequency') in FREQUENCIES]
+
+
+def load_ledger():
+    """Read the ledger from MongoDB"""
+    from database import (
+        recurring_income_collection, one_time_income_collection,
+        recurring_expense_collection, one_time_expense_collection
+    )
+
+    pipeline = monthly_totals_pipeline(one_time_query())
+    return Ledger(
+        recurring_income_collection.find({'active': True}, RECURRING_FIELDS),
+        recurring_expense_collection.find({'active': True}, RECURRING_FIELDS),
+        totals_by_month_and_currency(one_time_income_collection.aggregate(pipeline)),
+        totals_by_month_and_currency(one_time_expense_collection.aggregate(pipeline))
+    )
+
+
+def get_ledger():
+    """Get the ledger, loading it only after a write to one of its collections. Treat it as read-only."""
+    global _ledger, _ledger_version
+
+    version = data_version(*LEDGER_COLLECTIONS)
+    with _lock:
+        if _ledger is None or _ledger_version != version:
+            _ledger = load_ledger()
+            _ledger_version = version
+        return _ledger
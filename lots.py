@@ -0,0 +1,239 @@
+"""
+Cost basis lots of imported investment transactions.
+
+The transactions stored by the Trading212 import (investment_transactions)
+are replayed per ticker, oldest first, in one streaming pass:
+
+- under FIFO each buy appends a lot (shares, unit cost) to the ticker's
+  deque and sells consume lots from the left;
+- under average cost a ticker holds a single pooled lot, and sells leave
+  at the pool's average cost.
+
+Each sell adds its proceeds minus the cost of the consumed shares to the
+realized P&L (shares sold beyond the held ones are counted as unmatched and
+left out of it), and dividends are summed. Amounts are shares * price in the
+instrument's currency, the currency of the holdings' current prices, so
+positions are reported per ticker and totalled per currency. The resulting book is stored in
+investment_lots with the position of the last applied transaction, so
+later imports only apply the new transactions. Out-of-order imports (older
+than the stored position) replay the whole history.
+"""
+from collections import deque
+from datetime import datetime
+
+LOTS_COLLECTION = 'investment_lots'
+METHODS = ('fifo', 'average')
+
+# Stored books of an older version are replayed from the transactions
+BOOK_VERSION = 2
+
+# Shares below this are float noise of fully sold positions
+EPSILON = 1e-9
+
+
+class TickerBook:
+    """Open lots, realized P&L and dividend income of one ticker"""
+    __slots__ = ('lots', 'realized', 'dividends', 'unmatched', 'currency')
+
+    def __init__(self, lots=(), realized=0.0, dividends=0.0, unmatched=0.0, currency=None):
+        self.lots = deque([list(lot) for lot in lots])
+        self.realized = realized
+        self.dividends = dividends
+        self.currency = currency
+        # Shares sold beyond the bought ones (history before the first import)
+        self.unmatched = unmatched
+
+    @property
+    def shares(self):
+        return sum(shares for shares, _ in self.lots)
+
+    @property
+    def cost(self):
+        return sum(shares * unit_cost for shares, unit_cost in self.lots)
+
+    def buy(self, shares, amount, method):
+        if shares <= 0:
+            return
+        lots = self.lots
+        if method == 'average' and lots:
+            held, unit_cost = lots[0]
+            lots[0] = [held + shares, (held * unit_cost + amount) / (held + shares)]
+        else:
+            lots.append([shares, amount / shares])
+
+    def sell(self, shares, amount):
+        lots = self.lots
+        remaining = shares
+        cost = 0.0
+        while remaining > EPSILON and lots:
+            lot = lots[0]
+            used = min(lot[0], remaining)
+            cost += used * lot[1]
+            remaining -= used
+            lot[0] -= used
+            if lot[0] <= EPSILON:
+                lots.popleft()
+        if remaining > EPSILON:
+            # Proceeds of shares bought before the history starts have no cost to match
+            self.unmatched += remaining
+            amount *= (shares - remaining) / shares
+        self.realized += amount - cost
+
+    def state(self):
+        return {
+            'lots': [list(lot) for lot in self.lots],
+            'realized': self.realized,
+            'dividends': self.dividends,
+            'unmatched': self.unmatched,
+            'currency': self.currency
+        }
+
+
+class LotBook:
+    """The ticker books of one portfolio under one method"""
+
+    def __init__(self, method, tickers=()):
+        if method not in METHODS:
+            raise ValueError(f'method must be one of: {", ".join(METHODS)}')
+        self.method = method
+        self.tickers = {state.pop('ticker'): TickerBook(**state) for state in map(dict, tickers)}
+
+    def apply(self, transactions):
+        """Apply transaction documents in date order; returns how many were applied"""
+        tickers = self.tickers
+        method = self.method
+        applied = 0
+        for transaction in transactions:
+            book = tickers.get(transaction['ticker'])
+            if book is None:
+                book = tickers[transaction['ticker']] = TickerBook()
+            if transaction.get('currency'):
+                book.currency = transaction['currency']
+            action = transaction['action']
+            if action == 'buy':
+                book.buy(transaction['shares'], transaction['amount'], method)
+            elif action == 'sell':
+                book.sell(transaction['shares'], transaction['amount'])
+            elif action == 'dividend':
+                book.dividends += transaction['amount']
+            applied += 1
+        return applied
+
+    def state(self):
+        # A list rather than a dict keyed by ticker: tickers such as BRK.B are not valid field names
+        return [dict(book.state(), ticker=ticker) for ticker, book in self.tickers.items()]
+
+    def report(self, prices):
+        """
+        Per-ticker position and P&L, valuing open shares at prices ({ticker: price}).
+
+        Totals are keyed by the instrument currency ('unknown' for exports
+        without a price currency column).
+        """
+        positions = {}
+        totals_by_currency = {}
+        for ticker, book in sorted(self.tickers.items()):
+            shares = book.shares
+            cost = book.cost
+            price = prices.get(ticker)
+            market_value = shares * price if price is not None else None
+            position = {
+                'shares': round(shares, 6),
+                'cost_basis': round(cost, 2),
+                'avg_cost': round(cost / shares, 4) if shares > EPSILON else None,
+                'realized_pnl': round(book.realized, 2),
+                'dividends': round(book.dividends, 2),
+                'market_value': round(market_value, 2) if market_value is not None else None,
+                'unrealized_pnl': round(market_value - cost, 2) if market_value is not None else None,
+                'unmatched_shares': round(book.unmatched, 6),
+                'currency': book.currency
+            }
+            if self.method == 'fifo':
+                position['lots'] = [{'shares': round(shares, 6), 'unit_cost': round(unit_cost, 4)}
+                                    for shares, unit_cost in book.lots]
+            positions[ticker] = position
+
+            totals = totals_by_currency.setdefault(book.currency or 'unknown', {
+                'cost_basis': 0.0, 'market_value': 0.0, 'realized_pnl': 0.0, 'unrealized_pnl': 0.0, 'dividends': 0.0
+            })
+            totals['cost_basis'] += cost
+            totals['realized_pnl'] += book.realized
+            totals['dividends'] += book.dividends
+            if market_value is not None:
+                totals['market_value'] += market_value
+                totals['unrealized_pnl'] += market_value - cost
+        return {
+            'method': self.method,
+            'positions': positions,
+            'totals': {
+                currency: {key: round(value, 2) for key, value in totals.items()}
+                for currency, totals in totals_by_currency.items()
+            }
+        }
+
+
+TRANSACTION_FIELDS = {'ticker': 1, 'action': 1, 'shares': 1, 'amount': 1, 'currency': 1, 'date': 1}
+
+
+def update(portfolio_id, method):
+    """
+    Bring the stored book of a portfolio up to date and return it as a LotBook.
+
+    Only transactions after the stored position are read, unless an import
+    added older ones, in which case the history is replayed.
+    """
+    from database import db
+
+    transactions = db['investment_transactions']
+    query = {'portfolio_id': portfolio_id}
+    stored = db[LOTS_COLLECTION].find_one({'_id': f'{portfolio_id}:{method}'})
+    total = transactions.count_documents(query)
+
+    if stored and stored.get('version') == BOOK_VERSION and stored.get('applied') and stored['applied'] <= total:
+        last_date, last_id = stored['last_date'], stored['last_id']
+        newer = list(transactions.find(
+            dict(query, date={'$gte': last_date}), TRANSACTION_FIELDS
+        ).sort([('date', 1), ('_id', 1)]))
+        newer = [transaction for transaction in newer if (transaction['date'], transaction['_id']) > (last_date, last_id)]
+        if stored['applied'] + len(newer) == total:
+            book = LotBook(method, stored['tickers'])
+            if newer:
+                book.apply(newer)
+                _save(portfolio_id, book, total, newer[-1])
+            return book
+
+    # Nothing stored yet, a book of an older version, or older transactions were imported: replay everything
+    book = LotBook(method)
+    history = list(transactions.find(query, TRANSACTION_FIELDS).sort([('date', 1), ('_id', 1)]))
+    if history:
+        book.apply(history)
+        _save(portfolio_id, book, len(history), history[-1])
+    elif stored:
+        db[LOTS_COLLECTION].delete_one({'_id': stored['_id']})
+    return book
+
+
+def _save(portfolio_id, book, applied, last):
+    from database import db
+
+    db[LOTS_COLLECTION].replace_one({'_id': f'{portfolio_id}:{book.method}'}, {
+        'portfolio_id': portfolio_id,
+        'method': book.method,
+        'version': BOOK_VERSION,
+        'tickers': book.state(),
+        'applied': applied,
+        'last_date': last['date'],
+        'last_id': last['_id'],
+        'updated_at': datetime.utcnow()
+    }, upsert=True)
+
+
+def update_all(portfolio_id):
+    """Update the books of every method, e.g. after an import"""
+    return {method: update(portfolio_id, method) for method in METHODS}
+
+
+def delete(portfolio_id):
+    from database import db
+
+    db[LOTS_COLLECTION].delete_many({'portfolio_id': portfolio_id})
@@ -0,0 +1,282 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are recorded in process memory with a lock
+per metric. The request hooks and the /metrics route are installed with
+METRICS=1 (see init_metrics). Each worker process reports its own numbers.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+from flask import g, request
+
+# Request latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        super().__init__(name, description, labelnames)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def track_in_progress(self, **labels):
+        """Decorator counting the calls of a function that are currently running"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                self.inc(**labels)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.dec(**labels)
+            return wrapper
+        return decorator
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last), sum]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def horizon_label(months):
+    """Bucket a projection horizon (in months) into a low-cardinality label"""
+    for bound in (12, 120, 480):
+        if months <= bound:
+            return str(bound)
+    return '480+'
+
+
+REQUEST_SECONDS = Histogram(
+    'finprojections_http_request_duration_seconds', 'Request latency by route',
+    ('method', 'route'))
+REQUESTS = Counter(
+    'finprojections_http_requests_total', 'Requests by route and status',
+    ('method', 'route', 'status'))
+PROJECTION_SECONDS = Histogram(
+    'finprojections_projection_compute_seconds', 'Projection engine compute time by horizon (months)',
+    ('engine', 'horizon'))
+CACHE_LOOKUPS = Counter(
+    'finprojections_cache_lookups_total', 'Cache lookups by cache and result (hit/miss)',
+    ('cache', 'result'))
+CACHE_HIT_RATIO = Gauge(
+    'finprojections_cache_hit_ratio', 'Share of cache lookups served from the cache',
+    ('cache',))
+TRADING212_SECONDS = Histogram(
+    'finprojections_trading212_request_duration_seconds', 'Trading212 API call latency',
+    ('endpoint',))
+TRADING212_ERRORS = Counter(
+    'finprojections_trading212_errors_total', 'Failed Trading212 API calls',
+    ('endpoint',))
+TRADING212_SYNCS = Gauge(
+    'finprojections_trading212_syncs_in_progress', 'Trading212 syncs currently running (sync queue depth)',
+    ('kind',))
+MONGO_POOL_CONNECTIONS = Gauge(
+    'finprojections_mongodb_pool_connections', 'MongoDB pool connections by state (open/in_use)',
+    ('state',))
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    'finprojections_mongodb_pool_checkout_failures_total', 'Failed MongoDB connection checkouts',
+    ('reason',))
+
+
+def timed_projection(engine, months):
+    """Decorator observing PROJECTION_SECONDS; months(*args, **kwargs) gives the horizon"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with PROJECTION_SECONDS.time(engine=engine, horizon=horizon_label(months(*args, **kwargs))):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+    hits = CACHE_LOOKUPS.value(cache=cache, result='hit')
+    misses = CACHE_LOOKUPS.value(cache=cache, result='miss')
+    CACHE_HIT_RATIO.set(round(hits / (hits + misses), 4), cache=cache)
+
+
+def _pool_listener():
+    from pymongo import monitoring
+
+    class PoolMetrics(monitoring.ConnectionPoolListener):
+        """Tracks open and checked-out connections of every MongoDB pool"""
+
+        def connection_created(self, event):
+            MONGO_POOL_CONNECTIONS.inc(state='open')
+
+        def connection_closed(self, event):
+            MONGO_POOL_CONNECTIONS.dec(state='open')
+
+        def connection_checked_out(self, event):
+            MONGO_POOL_CONNECTIONS.inc(state='in_use')
+
+        def connection_checked_in(self, event):
+            MONGO_POOL_CONNECTIONS.dec(state='in_use')
+
+        def connection_check_out_failed(self, event):
+            MONGO_POOL_CHECKOUT_FAILURES.inc(reason=str(event.reason))
+
+        def pool_created(self, event):
+            pass
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            pass
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_check_out_started(self, event):
+            pass
+
+    return PoolMetrics()
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+        REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    return response
+
+
+def init_metrics(app):
+    """Install the request hooks, the MongoDB pool listener and /metrics on app"""
+    from database import add_event_listener
+    from routes.monitoring import monitoring_bp
+
+    add_event_listener(_pool_listener())
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.register_blueprint(monitoring_bp)
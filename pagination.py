@@ -0,0 +1,87 @@
+"""Cursor (keyset) pagination for the one-time income and expense listings"""
+import base64
+import re
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """A cursor that was not produced by encode_cursor (answered with 400)"""
+
+
+def encode_cursor(document, field='date'):
+    """Opaque cursor pointing just after document in (field, _id) descending order"""
+    raw = f"{document[field].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        value, document_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(value), ObjectId(document_id)
+    except (ValueError, InvalidId, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+# Query parameters read by listing_filters()
+FILTER_ARGS = ('from', 'to', 'category', 'q')
+
+
+def filter_args(args):
+    """The listing filters among args, to carry over to the next page's URL"""
+    return {name: args[name] for name in FILTER_ARGS if args.get(name)}
+
+
+def listing_filters(args, field='date'):
+    """
+    MongoDB filter from the listing query parameters.
+
+    from/to (YYYY-MM-DD, inclusive) and category use the (category, date, _id)
+    and (date, _id) indexes; q matches name or notes case-insensitively within
+    the rows those select.
+    """
+    from utils import parse_date
+
+    query = {}
+    date_from = parse_date(args, 'from', required=False)
+    date_to = parse_date(args, 'to', required=False)
+    if date_from or date_to:
+        query[field] = {}
+        if date_from:
+            query[field]['$gte'] = date_from
+        if date_to:
+            query[field]['$lte'] = datetime.combine(date_to.date(), datetime.max.time())
+    if args.get('category'):
+        query['category'] = args['category']
+    if args.get('q'):
+        pattern = re.compile(re.escape(args['q']), re.IGNORECASE)
+        query['$or'] = [{'name': pattern}, {'notes': pattern}]
+    return query
+
+
+def fetch_page(collection, query=None, cursor=None, limit=PAGE_SIZE, field='date'):
+    """
+    Get one page of documents, newest first, and the cursor of the next page (None on the last page).
+
+    Pages are selected by (field, _id) rather than skip(), so every page costs
+    the same however deep it is.
+    """
+    query = dict(query or {})
+    if cursor:
+        value, document_id = decode_cursor(cursor)
+        after = {'$or': [
+            {field: {'$lt': value}},
+            {field: value, '_id': {'$lt': document_id}}
+        ]}
+        query = {'$and': [query, after]} if query else after
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    documents = list(collection.find(query).sort([(field, -1), ('_id', -1)]).limit(limit + 1))
+    if len(documents) > limit:
+        documents = documents[:limit]
+        return documents, encode_cursor(documents[-1], field)
+    return documents, None
@@ -0,0 +1,193 @@
+"""
+Opt-in per-request profiling (REQUEST_PROFILING=1).
+
+Records wall time, MongoDB commands and JSON serialization time for every
+request. The numbers are sent in a Server-Timing header and aggregated per
+endpoint at /debug/metrics. With PROFILE_SLOW_MS set, requests are run under
+cProfile and those slower than the threshold are dumped to PROFILE_DIR.
+"""
+import cProfile
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+from pymongo import monitoring
+
+# Slowest requests kept for /debug/metrics
+SLOW_REQUESTS_KEPT = 20
+
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_endpoint_metrics = {}
+_slow_requests = []
+
+
+class RequestStats:
+    """Counters for the request being handled on this thread"""
+    __slots__ = ('db_count', 'db_ms', 'commands', 'serialize_ms')
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_ms = 0.0
+        self.commands = defaultdict(int)
+        self.serialize_ms = 0.0
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Counts MongoDB commands and their duration for the current request"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        stats = current_stats()
+        if stats is not None:
+            stats.db_count += 1
+            stats.db_ms += event.duration_micros / 1000
+            stats.commands[event.command_name] += 1
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that adds its serialization time to the current request"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.serialize_ms += (time.perf_counter() - started) * 1000
+
+
+def _start_request():
+    _local.stats = RequestStats()
+    g.profile_started = time.perf_counter()
+    g.profiler = None
+    if os.getenv('PROFILE_SLOW_MS'):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _finish_request(response):
+    stats = current_stats()
+    started = g.pop('profile_started', None)
+    if stats is None or started is None:
+        return response
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    wall_ms = (time.perf_counter() - started) * 1000
+    _local.stats = None
+
+    response.headers['Server-Timing'] = ', '.join([
+        f'app;dur={wall_ms:.1f}',
+        f'db;dur={stats.db_ms:.1f};desc="{stats.db_count} queries"',
+        f'serialize;dur={stats.serialize_ms:.1f}'
+    ])
+
+    endpoint = request.endpoint or request.path
+    profile_file = None
+    slow_ms = os.getenv('PROFILE_SLOW_MS')
+    if profiler is not None and wall_ms >= float(slow_ms):
+        profile_file = _dump_profile(profiler, endpoint, wall_ms)
+
+    _record(endpoint, wall_ms, stats, profile_file)
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped when a view raises: don't leave the profiler running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    _local.stats = None
+
+
+def _dump_profile(profiler, endpoint, wall_ms):
+    profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint.replace('.', '_')}-{wall_ms:.0f}ms.prof"
+    path = os.path.join(profile_dir, name)
+    profiler.dump_stats(path)
+    return path
+
+
+def _record(endpoint, wall_ms, stats, profile_file):
+    with _metrics_lock:
+        metrics = _endpoint_metrics.get(endpoint)
+        if metrics is None:
+            metrics = _endpoint_metrics[endpoint] = {
+                'requests': 0, 'wall_ms': 0.0, 'max_wall_ms': 0.0,
+                'db_commands': 0, 'db_ms': 0.0, 'serialize_ms': 0.0
+            }
+        metrics['requests'] += 1
+        metrics['wall_ms'] += wall_ms
+        metrics['max_wall_ms'] = max(metrics['max_wall_ms'], wall_ms)
+        metrics['db_commands'] += stats.db_count
+        metrics['db_ms'] += stats.db_ms
+        metrics['serialize_ms'] += stats.serialize_ms
+
+        _slow_requests.append({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'wall_ms': round(wall_ms, 2),
+            'db_commands': dict(stats.commands),
+            'db_ms': round(stats.db_ms, 2),
+            'serialize_ms': round(stats.serialize_ms, 2),
+            'profile': profile_file,
+            'at': datetime.utcnow().isoformat()
+        })
+        _slow_requests.sort(key=lambda entry: entry['wall_ms'], reverse=True)
+        del _slow_requests[SLOW_REQUESTS_KEPT:]
+
+
+def get_metrics():
+    """Per-endpoint averages and the slowest requests seen so far"""
+    with _metrics_lock:
+        endpoints = {}
+        for endpoint, metrics in _endpoint_metrics.items():
+            count = metrics['requests']
+            endpoints[endpoint] = {
+                'requests': count,
+                'avg_wall_ms': round(metrics['wall_ms'] / count, 2),
+                'max_wall_ms': round(metrics['max_wall_ms'], 2),
+                'avg_db_commands': round(metrics['db_commands'] / count, 2),
+                'avg_db_ms': round(metrics['db_ms'] / count, 2),
+                'avg_serialize_ms': round(metrics['serialize_ms'] / count, 2)
+            }
+        return {'endpoints': endpoints, 'slowest_requests': list(_slow_requests)}
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _endpoint_metrics.clear()
+        _slow_requests.clear()
+
+
+def init_profiling(app):
+    """Install the profiling hooks, the MongoDB listener and /debug/metrics on app"""
+    from database import add_event_listener
+    from routes.debug import debug_bp
+
+    add_event_listener(CommandTimer())
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(debug_bp)
@@ -0,0 +1,313 @@
+"""
+Recurring items hidden in the one-time history.
+
+One-time entries are grouped by normalized name and amount (rounded to whole
+units) in the recurring_candidates collection. Each group keeps its most
+recent dates, and its period (weekly, biweekly, monthly or yearly) is
+detected by sorting the dates and checking the gaps between them.
+
+Scans are incremental: a watermark per collection (the latest created_at
+seen, in recurring_scan) limits each scan to entries added since. Inserts
+from other workers may commit after later ones, so each scan re-reads a
+SCAN_OVERLAP window before the watermark; entries already in a group are
+skipped. Only the groups the new entries fall into are re-evaluated.
+
+Scans run on writes, not reads: the one-time routes and importers call
+record_entries_inserted() after inserting, and record_entry_change() takes
+edited and deleted entries out of their group (adding edited ones to their
+new group). `flask detect-recurring` scans entries written by other means.
+"""
+import re
+import statistics
+import threading
+from datetime import datetime, timedelta
+
+CANDIDATES_COLLECTION = 'recurring_candidates'
+SCAN_COLLECTION = 'recurring_scan'
+
+# kind -> (one-time collection, recurring collection)
+SOURCES = {
+    'expense': ('one_time_expense', 'recurring_expense'),
+    'income': ('one_time_income', 'recurring_income'),
+}
+
+# frequency -> (period in days, smallest and largest accepted gap, occurrences needed)
+PERIODS = {
+    'weekly': (7, 6, 8, 4),
+    'biweekly': (14, 12, 16, 3),
+    'monthly': (30, 25, 35, 3),
+    'yearly': (365, 355, 375, 3),
+}
+
+# Entries kept per group and gaps looked at when detecting the period
+MAX_ENTRIES = 36
+RECENT_GAPS = 12
+
+# Share of recent gaps that must match the period
+MIN_CONFIDENCE = 0.75
+
+# A group is no longer suggested once this many periods passed without an entry
+STALE_PERIODS = 2
+
+SCAN_BATCH = 1000
+
+# Inserts committed this long after a later one are still picked up by the next scan
+SCAN_OVERLAP = timedelta(minutes=10)
+
+ENTRY_FIELDS = {'name': 1, 'amount': 1, 'date': 1, 'category': 1, 'upcoming': 1, 'created_at': 1}
+
+# Fields that decide an entry's group and place in it
+GROUPED_FIELDS = ('name', 'amount', 'date', 'category', 'upcoming')
+
+_scan_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """Lowercase name without digits and punctuation ("Netflix.com 12/03" -> "netflix com")"""
+    return ' '.join(re.sub(r'[^a-z]+', ' ', (name or '').lower()).split())
+
+
+def candidate_id(kind, name, amount):
+    return f'{kind}:{normalize_name(name)}:{round(amount)}'
+
+
+def detect_frequency(dates):
+    """
+    (frequency, confidence) of a group from its sorted, distinct dates.
+
+    Confidence is the share of the most recent gaps within the frequency's
+    range; (None, 0.0) when no frequency has enough occurrences and matches.
+    """
+    gaps = [(later - earlier).days for earlier, later in zip(dates, dates[1:])][-RECENT_GAPS:]
+    best, best_confidence = None, 0.0
+    for frequency, (_, shortest, longest, needed) in PERIODS.items():
+        if len(dates) < needed:
+            continue
+        confidence = sum(1 for gap in gaps if shortest <= gap <= longest) / len(gaps)
+        if confidence >= MIN_CONFIDENCE and confidence > best_confidence:
+            best, best_confidence = frequency, confidence
+    return best, round(best_confidence, 3)
+
+
+def _evaluate(candidate):
+    dates = sorted({entry['date'] for entry in candidate['entries']})
+    frequency, confidence = detect_frequency(dates)
+    amounts = [entry['amount'] for entry in candidate['entries'][-RECENT_GAPS:]]
+    candidate.update(
+        frequency=frequency,
+        confidence=confidence,
+        amount=round(statistics.median(amounts), 2),
+        first_date=dates[0],
+        last_date=dates[-1]
+    )
+    return candidate
+
+
+def _merge(candidates, kind, entry):
+    """Add an entry to its group; returns False when the group already has it"""
+    key = candidate_id(kind, entry['name'], entry['amount'])
+    candidate = candidates[key]
+    entries = candidate['entries']
+    if any(existing['id'] == entry['_id'] for existing in entries):
+        return False
+    if not entries or entry['date'] >= entries[-1]['date']:
+        # Suggestions are named after the latest entry
+        candidate['name'] = entry['name']
+        candidate['category'] = entry.get('category')
+    entries.append({'id': entry['_id'], 'date': entry['date'], 'amount': entry['amount']})
+    entries.sort(key=lambda existing: existing['date'])
+    del entries[:-MAX_ENTRIES]
+    candidate['count'] = candidate.get('count', 0) + 1
+    return True
+
+
+def _fold(kind, batch):
+    """Merge one-time entries into their stored groups; returns how many were new"""
+    from pymongo import UpdateOne
+    from database import db
+
+    keys = {candidate_id(kind, entry['name'], entry['amount']) for entry in batch}
+    candidates = {key: {'_id': key, 'kind': kind, 'entries': []} for key in keys}
+    for candidate in db[CANDIDATES_COLLECTION].find({'_id': {'$in': list(keys)}}):
+        candidates[candidate['_id']] = candidate
+    merged = [entry for entry in batch if _merge(candidates, kind, entry)]
+    if not merged:
+        return 0
+
+    now = datetime.utcnow()
+    changed = {candidate_id(kind, entry['name'], entry['amount']) for entry in merged}
+    db[CANDIDATES_COLLECTION].bulk_write([
+        UpdateOne({'_id': key}, {'$set': dict(
+            {field: value for field, value in _evaluate(candidates[key]).items() if field != '_id'},
+            updated_at=now
+        )}, upsert=True)
+        for key in changed
+    ], ordered=False)
+    return len(merged)
+
+
+def _save_watermark(collection, batch, watermark):
+    """Move the watermark to the latest created_at of a scanned batch (sorted by created_at)"""
+    from database import db
+
+    latest = batch[-1].get('created_at')
+    if latest and (watermark is None or latest > watermark):
+        watermark = latest
+        db[SCAN_COLLECTION].update_one({'_id': collection}, {'$set': {'last_created_at': watermark}}, upsert=True)
+    return watermark
+
+
+def scan(kind):
+    """Fold the entries added since the last scan into their groups; returns how many were new"""
+    from database import db
+
+    collection, _ = SOURCES[kind]
+    state = db[SCAN_COLLECTION].find_one({'_id': collection}) or {}
+    if state and 'last_created_at' not in state:
+        # Watermark of an older version (the last _id): rebuild the groups of this kind
+        _reset(kind)
+    watermark = state.get('last_created_at')
+    query = {'upcoming': {'$ne': True}}
+    if watermark:
+        query['created_at'] = {'$gte': watermark - SCAN_OVERLAP}
+
+    added = 0
+    batch = []
+    for entry in db[collection].find(query, ENTRY_FIELDS).sort([('created_at', 1), ('_id', 1)]):
+        batch.append(entry)
+        if len(batch) == SCAN_BATCH:
+            added += _fold(kind, batch)
+            watermark = _save_watermark(collection, batch, watermark)
+            batch = []
+    if batch:
+        added += _fold(kind, batch)
+        _save_watermark(collection, batch, watermark)
+    return added
+
+
+def scan_all():
+    """Incremental scan of both one-time collections (one scan at a time per process)"""
+    with _scan_lock:
+        return {kind: scan(kind) for kind in SOURCES}
+
+
+def record_entries_inserted(kind):
+    """Fold the one-time entries inserted since the last scan into their groups; returns how many were new"""
+    with _scan_lock:
+        return scan(kind)
+
+
+def _reset(kind):
+    from database import db
+
+    db[SCAN_COLLECTION].delete_one({'_id': SOURCES[kind][0]})
+    db[CANDIDATES_COLLECTION].delete_many({'kind': kind, 'status': {'$exists': False}})
+    db[CANDIDATES_COLLECTION].update_many({'kind': kind}, {'$set': {'entries': [], 'count': 0, 'frequency': None}})
+
+
+def reset():
+    """Forget the scanned entries so the next scan reads the whole history (dismissals are kept)"""
+    for kind in SOURCES:
+        _reset(kind)
+
+
+def _remove(kind, entry_id):
+    """Take an entry out of the group holding it"""
+    from database import db
+
+    for candidate in db[CANDIDATES_COLLECTION].find({'kind': kind, 'entries.id': entry_id}):
+        candidate['entries'] = [entry for entry in candidate['entries'] if entry['id'] != entry_id]
+        candidate['count'] = max(candidate.get('count', 1) - 1, 0)
+        if candidate['entries']:
+            update = {field: value for field, value in _evaluate(candidate).items() if field != '_id'}
+        elif 'status' in candidate:
+            update = {'entries': [], 'count': 0, 'frequency': None}
+        else:
+            db[CANDIDATES_COLLECTION].delete_one({'_id': candidate['_id']})
+            continue
+        db[CANDIDATES_COLLECTION].update_one({'_id': candidate['_id']},
+                                             {'$set': dict(update, updated_at=datetime.utcnow())})
+
+
+def record_entry_change(kind, before=None, after=None):
+    """
+    Keep the groups in step with an edited or deleted one-time entry.
+
+    before is the stored document before the change (None for inserts,
+    which scans pick up), after the document afterwards (None when deleted).
+    """
+    if before and after and all(before.get(field) == after.get(field) for field in GROUPED_FIELDS):
+        return
+    with _scan_lock:
+        if before:
+            _remove(kind, before['_id'])
+        if after and not after.get('upcoming'):
+            _fold(kind, [after])
+
+
+def _is_stale(candidate, today):
+    period_days = PERIODS[candidate['frequency']][0]
+    return candidate['last_date'] + timedelta(days=period_days * STALE_PERIODS) < today
+
+
+def proposal(candidate):
+    """The recurring item a candidate suggests, in the format of the recurring-income/expense APIs"""
+    item = {
+        'name': candidate['name'],
+        'amount': candidate['amount'],
+        'frequency': candidate['frequency'],
+        'start_date': candidate['first_date'].strftime('%Y-%m-%d'),
+        'payday': candidate['last_date'].day if candidate['frequency'] == 'monthly' else None,
+    }
+    if candidate['kind'] == 'expense':
+        item['category'] = candidate.get('category') or 'other'
+    return item
+
+
+def suggestions(kind=None):
+    """
+    Periodic groups worth turning into recurring items, most confident first.
+
+    Groups that were dismissed or accepted, stopped recurring, or match the
+    name of an existing recurring item are left out. Reads the stored
+    groups only; writes keep them up to date.
+    """
+    from database import db
+
+    today = datetime.now()
+    kinds = [kind] if kind else list(SOURCES)
+
+    results = []
+    for kind in kinds:
+        existing = {normalize_name(item['name']) for item in db[SOURCES[kind][1]].find({}, {'name': 1})}
+        query = {'kind': kind, 'frequency': {'$ne': None}, 'status': {'$exists': False}}
+        for candidate in db[CANDIDATES_COLLECTION].find(query, {'entries': 0}):
+            if _is_stale(candidate, today) or normalize_name(candidate['name']) in existing:
+                continue
+            results.append({
+                'id': candidate['_id'],
+                'kind': kind,
+                'occurrences': candidate['count'],
+                'confidence': candidate['confidence'],
+                'last_date': candidate['last_date'].isoformat(),
+                'item': proposal(candidate)
+            })
+    results.sort(key=lambda result: (-result['confidence'], -result['occurrences']))
+    return results
+
+
+def get_candidate(candidate_id):
+    from database import db
+
+    return db[CANDIDATES_COLLECTION].find_one({'_id': candidate_id}, {'entries': 0})
+
+
+def set_status(candidate_id, status):
+    """Mark a candidate accepted or dismissed; returns the candidate (None if unknown)"""
+    from pymongo import ReturnDocument
+    from database import db
+
+    return db[CANDIDATES_COLLECTION].find_one_and_update(
+        {'_id': candidate_id}, {'$set': {'status': status, 'updated_at': datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
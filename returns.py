@@ -0,0 +1,311 @@
+"""
+Realized returns of investment portfolios.
+
+Estimates come from two sources:
+
+- the valuation history in portfolio_snapshots gives the time-weighted
+  return (TWR) and the annualized volatility, with the cash flows of each
+  period taken out of that period's return;
+- the transactions imported from Trading212 CSV exports (stored in
+  investment_transactions) and the current value give the money-weighted
+  return (XIRR).
+
+Both value the flows at their account currency total, the currency of the
+snapshots and current_value, rather than the amount in the instrument's
+currency (which only stands in for exports without a Total column).
+
+Flows are summed per day before solving, so the cost of an estimate grows
+with the number of distinct days rather than transactions, and the XIRR
+solver stops after MAX_ITERATIONS Newton steps. Results are cached until
+the portfolio, its snapshots or its transactions change.
+
+Portfolios with return_mode 'realized' are projected with the estimated
+return instead of the hand-entered mean_return_percent, once
+MIN_HISTORY_DAYS of history exist.
+"""
+import hashlib
+import math
+from datetime import datetime
+from cache import cached
+
+TRANSACTIONS_COLLECTION = 'investment_transactions'
+RETURNS_COLLECTIONS = ('investment_portfolio', 'portfolio_snapshots', TRANSACTIONS_COLLECTION)
+
+RETURN_MODES = ('manual', 'realized')
+
+# History needed before a realized return replaces mean_return_percent
+MIN_HISTORY_DAYS = 90
+
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-9
+
+DAYS_PER_YEAR = 365.25
+
+# Trading212 actions -> stored action
+ACTIONS = (('buy', 'buy'), ('sell', 'sell'), ('dividend', 'dividend'))
+
+
+def transaction_action(action):
+    """'buy', 'sell' or 'dividend' for a Trading212 action such as "Limit buy" (None for others)"""
+    action = action.lower()
+    for keyword, stored in ACTIONS:
+        if keyword in action:
+            return stored
+    return None
+
+
+def transaction_documents(portfolio_id, transactions):
+    """
+    investment_transactions documents from parse_trading212_csv() transactions (re-imports map to the same _id).
+
+    amount is shares * price in the instrument's currency (currency), like
+    the holdings' current prices; total is the Total column in the account
+    currency (total_currency, including fees and conversion), when the
+    export has it.
+    """
+    documents = []
+    for transaction in transactions:
+        action = transaction_action(transaction['action'])
+        if action is None:
+            continue
+        total = transaction.get('total')
+        key = f"{portfolio_id}|{transaction['ticker']}|{transaction['date']:%Y-%m-%dT%H:%M:%S}|{action}|" \
+              f"{transaction['shares']}|{transaction['price']}"
+        documents.append({
+            '_id': hashlib.sha1(key.encode()).hexdigest(),
+            'portfolio_id': portfolio_id,
+            'ticker': transaction['ticker'],
+            'action': action,
+            'shares': transaction['shares'],
+            'price': transaction['price'],
+            'amount': round(abs(transaction['shares'] * transaction['price']), 2),
+            'currency': transaction.get('currency'),
+            'total': round(abs(total), 2) if total is not None else None,
+            'total_currency': transaction.get('total_currency') if total is not None else None,
+            'date': transaction['date']
+        })
+    return documents
+
+
+# Re-imports overwrite these, so transactions stored by older versions are corrected
+AMOUNT_FIELDS = ('amount', 'currency', 'total', 'total_currency')
+
+
+def store_transactions(portfolio_id, transactions):
+    """Save imported transactions once each; returns (how many were new, how many stored ones changed)"""
+    from pymongo import UpdateOne
+    from database import db
+
+    documents = transaction_documents(portfolio_id, transactions)
+    if not documents:
+        return 0, 0
+    result = db[TRANSACTIONS_COLLECTION].bulk_write([
+        UpdateOne({'_id': document['_id']}, {
+            '$set': {field: document[field] for field in AMOUNT_FIELDS},
+            '$setOnInsert': {field: value for field, value in document.items() if field not in AMOUNT_FIELDS}
+        }, upsert=True)
+        for document in documents
+    ], ordered=False)
+    return result.upserted_count, result.modified_count
+
+
+def daily_flows(transactions):
+    """
+    {date: net amount invested} from transaction documents.
+
+    Buys add money to the portfolio; sells and dividends take it out. Each
+    flow is the account currency total, or the amount when it is missing.
+    """
+    flows = {}
+    for transaction in transactions:
+        day = transaction['date'].date()
+        amount = transaction.get('total')
+        if amount is None:
+            amount = transaction['amount']
+        if transaction['action'] != 'buy':
+            amount = -amount
+        flows[day] = flows.get(day, 0.0) + amount
+    return flows
+
+
+def time_weighted(values, flows):
+    """
+    (total TWR, annualized volatility, period log returns) of a valuation series.
+
+    values are (date, value) pairs in date order; the flows dated after a
+    valuation and up to the next are removed from that period's gain.
+    Volatility scales each period's log return by its length, so daily,
+    weekly and monthly snapshots can be mixed.
+    """
+    flow_days = sorted(flows)
+    flow_index = 0
+    growth = 1.0
+    returns = []
+    for (previous_day, previous_value), (day, value) in zip(values, values[1:]):
+        flow = 0.0
+        while flow_index < len(flow_days) and flow_days[flow_index] <= previous_day:
+            flow_index += 1
+        while flow_index < len(flow_days) and flow_days[flow_index] <= day:
+            flow += flows[flow_days[flow_index]]
+            flow_index += 1
+        if previous_value <= 0:
+            continue
+        period_growth = (value - flow) / previous_value
+        if period_growth <= 0:
+            continue
+        growth *= period_growth
+        returns.append((math.log(period_growth), (day - previous_day).days / DAYS_PER_YEAR))
+
+    volatility = None
+    years = sum(length for _, length in returns)
+    if len(returns) >= 2 and years > 0:
+        drift = sum(log_return for log_return, _ in returns) / years
+        variance = sum((log_return - drift * length) ** 2 / length for log_return, length in returns if length > 0)
+        volatility = math.sqrt(variance / (len(returns) - 1))
+    return growth - 1, volatility, returns
+
+
+def xirr(flows):
+    """
+    Annual money-weighted return of dated cash flows [(date, amount)], or None.
+
+    Amounts are from the investor's side: money put in is negative, money
+    taken out (including the final value) positive. Newton's method from a
+    10% guess, falling back to bisection when it leaves the valid range.
+    """
+    if not flows or all(amount >= 0 for _, amount in flows) or all(amount <= 0 for _, amount in flows):
+        return None
+    first = min(day for day, _ in flows)
+    times = [(day - first).days / DAYS_PER_YEAR for day, _ in flows]
+    amounts = [amount for _, amount in flows]
+
+    def npv(rate):
+        return sum(amount * (1 + rate) ** -time for amount, time in zip(amounts, times))
+
+    rate = 0.1
+    for _ in range(MAX_ITERATIONS):
+        value = 0.0
+        derivative = 0.0
+        for amount, time in zip(amounts, times):
+            discounted = amount * (1 + rate) ** -time
+            value += discounted
+            derivative -= time * discounted / (1 + rate)
+        if derivative == 0:
+            break
+        step = value / derivative
+        rate -= step
+        if rate <= -0.999 or not math.isfinite(rate):
+            break
+        if abs(step) < TOLERANCE:
+            return rate
+
+    # Bisection on [-99.9%, 1000%] when Newton did not converge
+    low, high = -0.999, 10.0
+    low_value, high_value = npv(low), npv(high)
+    if low_value * high_value > 0:
+        return None
+    for _ in range(200):
+        middle = (low + high) / 2
+        middle_value = npv(middle)
+        if abs(middle_value) < TOLERANCE or high - low < TOLERANCE:
+            return middle
+        if (middle_value > 0) == (low_value > 0):
+            low, low_value = middle, middle_value
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def estimate(portfolio, snapshots, transactions, today=None):
+    """Realized return estimates of a portfolio from its snapshots and transactions (see portfolio_returns())"""
+    today = today or datetime.now().date()
+    flows = daily_flows(transactions)
+    values = [(snapshot['date'].date(), snapshot['value']) for snapshot in snapshots]
+
+    twr = twr_annualized = volatility = None
+    snapshot_days = 0
+    if len(values) >= 2:
+        snapshot_days = (values[-1][0] - values[0][0]).days
+        twr, volatility, _ = time_weighted(values, flows)
+        if snapshot_days > 0 and twr > -1:
+            twr_annualized = (1 + twr) ** (DAYS_PER_YEAR / snapshot_days) - 1
+    history_days = snapshot_days
+
+    # Money-weighted: every transaction (or the first valuation when there are none) and the value today
+    if flows:
+        cash_flows = [(day, -amount) for day, amount in sorted(flows.items())]
+        history_days = max(history_days, (today - cash_flows[0][0]).days)
+    elif values:
+        cash_flows = [(values[0][0], -values[0][1])]
+    else:
+        cash_flows = []
+    if cash_flows:
+        cash_flows.append((today, portfolio.get('current_value', 0)))
+    money_weighted = xirr(cash_flows) if cash_flows else None
+
+    def percent(value):
+        return round(value * 100, 2) if value is not None else None
+
+    return {
+        'twr_percent': percent(twr),
+        'twr_annualized_percent': percent(twr_annualized),
+        'xirr_percent': percent(money_weighted),
+        'volatility_percent': percent(volatility),
+        'history_days': history_days,
+        'snapshot_days': snapshot_days,
+        'snapshots': len(values),
+        'transactions': len(transactions)
+    }
+
+
+@cached(*RETURNS_COLLECTIONS, maxsize=128)
+def portfolio_returns(portfolio_id):
+    """Realized return estimates of a portfolio, or None if it does not exist"""
+    from bson import ObjectId
+    from database import db
+
+    portfolio = db['investment_portfolio'].find_one({'_id': ObjectId(portfolio_id)})
+    if not portfolio:
+        return None
+    snapshots = db['portfolio_snapshots'].find(
+        {'portfolio_id': portfolio_id}, {'date': 1, 'value': 1}
+    ).sort('date', 1)
+    transactions = db[TRANSACTIONS_COLLECTION].find(
+        {'portfolio_id': portfolio_id}, {'date': 1, 'action': 1, 'amount': 1, 'total': 1}
+    )
+    return estimate(portfolio, list(snapshots), list(transactions))
+
+
+def realized_return_percent(estimates):
+    """
+    Annual return to project with, or None without enough history.
+
+    The annualized TWR needs MIN_HISTORY_DAYS of snapshots (a short window
+    annualizes to extreme rates); otherwise the XIRR is used once the
+    transactions span MIN_HISTORY_DAYS.
+    """
+    if not estimates:
+        return None
+    if estimates['twr_annualized_percent'] is not None and estimates.get('snapshot_days', 0) >= MIN_HISTORY_DAYS:
+        return estimates['twr_annualized_percent']
+    if estimates['history_days'] < MIN_HISTORY_DAYS:
+        return None
+    return estimates['xirr_percent']
+
+
+def with_realized_returns(portfolios):
+    """
+    The portfolios with mean_return_percent replaced by the realized return where return_mode is 'realized'.
+
+    Other portfolios (and realized ones without enough history) are returned unchanged.
+    """
+    if not any(portfolio.get('return_mode') == 'realized' for portfolio in portfolios):
+        return portfolios
+    result = []
+    for portfolio in portfolios:
+        if portfolio.get('return_mode') == 'realized':
+            realized = realized_return_percent(portfolio_returns(str(portfolio['_id'])))
+            if realized is not None:
+                portfolio = dict(portfolio, mean_return_percent=realized)
+        result.append(portfolio)
+    return result
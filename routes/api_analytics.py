@@ -0,0 +1,36 @@
+"""API routes for expense analytics"""
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from analytics import GRANULARITIES, MAX_MONTHS, category_totals
+
+api_analytics_bp = Blueprint('api_analytics', __name__, url_prefix='/api/analytics')
+
+def parse_month(value):
+    """Parse YYYY-MM into the first day of that month"""
+    return datetime.strptime(value, '%Y-%m').date()
+
+@api_analytics_bp.route('/categories')
+def get_category_totals():
+    """Expense totals per category over time (from/to: YYYY-MM, default the last 12 months)"""
+    current_month = datetime.now().date().replace(day=1)
+    granularity = request.args.get('granularity', 'month')
+    top = request.args.get('top', type=int)
+    try:
+        last_month = parse_month(request.args['to']) if request.args.get('to') else current_month
+        first_month = (parse_month(request.args['from']) if request.args.get('from')
+                       else last_month - relativedelta(months=11))
+    except ValueError:
+        return jsonify({'error': 'from and to must be months in YYYY-MM format'}), 400
+    
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of: {", ".join(GRANULARITIES)}'}), 400
+    if top is not None and top < 1:
+        return jsonify({'error': 'top must be a positive number'}), 400
+    months = (last_month.year - first_month.year) * 12 + last_month.month - first_month.month + 1
+    if months < 1:
+        return jsonify({'error': 'from must not be after to'}), 400
+    if months > MAX_MONTHS:
+        return jsonify({'error': f'at most {MAX_MONTHS} months can be requested at once'}), 400
+    
+    return jsonify(category_totals(first_month, last_month, granularity, top))
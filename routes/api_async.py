@@ -0,0 +1,138 @@
+"""Async (Quart + Motor) versions of the read-heavy API routes, served by asgi.py"""
+import asyncio
+from datetime import datetime
+from quart import Blueprint, request, jsonify
+from database import get_async_db
+from dividends import FORECAST_COLLECTION, cash_currencies, forecast_totals, price_returns, received_totals_pipeline
+from fx import MissingRates, rate_table
+from returns import with_realized_returns
+from ledger import RECURRING_FIELDS, recurring_items
+from utils import (
+    PROJECTED_RECURRING_QUERY, add_cumulative_balance, build_month_details, get_month_end,
+    get_month_starts, get_months_until_now, monthly_totals_pipeline, one_time_query,
+    project_investments, project_months, totals_by_month
+)
+
+api_async_bp = Blueprint('api_async', __name__, url_prefix='/api')
+
+# Paths handled by this blueprint; asgi.py routes everything else to Flask
+ASYNC_PATH_PREFIXES = (
+    '/api/projections',
+    '/api/month-details/',
+    '/api/investment-projections'
+)
+
+async def realized_returns(portfolios):
+    """with_realized_returns() off the event loop, only when a portfolio projects its realized return"""
+    if not any(portfolio.get('return_mode') == 'realized' for portfolio in portfolios):
+        return portfolios
+    return await asyncio.get_running_loop().run_in_executor(None, with_realized_returns, portfolios)
+
+async def fetch_projection_inputs(db, month_starts, received_dividends=False):
+    """
+    Fetch everything project_months() needs, issuing the queries concurrently.
+
+    Returns (inputs, keyword arguments). Dividends are the forecast, or the
+    dividends actually received with received_dividends.
+    """
+    month_end = get_month_end(month_starts[-1])
+    pipeline = monthly_totals_pipeline(one_time_query(month_starts[0], month_end))
+    (recurring_incomes, recurring_expenses, one_time_income_totals,
+     one_time_expense_totals, portfolios, forecasts) = await asyncio.gather(
+        db['recurring_income'].find(PROJECTED_RECURRING_QUERY, RECURRING_FIELDS).to_list(None),
+        db['recurring_expense'].find(PROJECTED_RECURRING_QUERY, RECURRING_FIELDS).to_list(None),
+        db['one_time_income'].aggregate(pipeline).to_list(None),
+        db['one_time_expense'].aggregate(pipeline).to_list(None),
+        db['investment_portfolio'].find({'active': True}).to_list(None),
+        db[FORECAST_COLLECTION].find().to_list(None)
+    )
+    received = None
+    if received_dividends:
+        received = await db['investment_transactions'].aggregate(
+            received_totals_pipeline(month_starts[0], month_end, portfolios)
+        ).to_list(None)
+    recurring_incomes, recurring_expenses = recurring_items(recurring_incomes), recurring_items(recurring_expenses)
+    currencies = {item.currency for item in recurring_incomes + recurring_expenses}
+    currencies |= {group['_id'].get('currency') for group in one_time_income_totals + one_time_expense_totals}
+    currencies |= cash_currencies(forecasts)
+    currencies |= {group['_id'].get('currency') for group in received or ()}
+    # Only ledgers with foreign-currency items read the (cached) rate table, off the event loop
+    rates = None
+    if any(currencies):
+        rates = await asyncio.get_running_loop().run_in_executor(None, rate_table, month_starts, currencies)
+    if received is not None:
+        dividend_totals = totals_by_month(received, rates)
+    else:
+        dividend_totals = forecast_totals(forecasts, portfolios, month_starts, rates)
+    portfolios = price_returns(await realized_returns(portfolios), forecasts, rates)
+    return (
+        recurring_incomes, recurring_expenses,
+        totals_by_month(one_time_income_totals, rates), totals_by_month(one_time_expense_totals, rates),
+        portfolios
+    ), {'rates': rates, 'dividend_totals': dividend_totals}
+
+@api_async_bp.errorhandler(MissingRates)
+async def missing_rates(error):
+    return jsonify({'error': str(error)}), 503
+
+@api_async_bp.route('/projections')
+async def get_projections():
+    months = request.args.get('months', 12, type=int)
+    month_starts = get_month_starts(datetime.now().date().replace(day=1), months)
+    if not month_starts:
+        return jsonify([])
+    
+    inputs, options = await fetch_projection_inputs(get_async_db(), month_starts)
+    return jsonify(add_cumulative_balance(project_months(month_starts, *inputs, **options)))
+
+@api_async_bp.route('/projections/until-now')
+async def get_projections_until_now():
+    """Calculate projections from earliest transaction until current month"""
+    db = get_async_db()
+    earliest_items = await asyncio.gather(
+        db['recurring_income'].find_one(sort=[('start_date', 1)]),
+        db['one_time_income'].find_one(sort=[('date', 1)]),
+        db['recurring_expense'].find_one(sort=[('start_date', 1)]),
+        db['one_time_expense'].find_one(sort=[('date', 1)])
+    )
+    month_starts = get_months_until_now(earliest_items)
+    if not month_starts:
+        return jsonify([])
+    
+    inputs, options = await fetch_projection_inputs(db, month_starts, received_dividends=True)
+    return jsonify(add_cumulative_balance(project_months(month_starts, *inputs, **options)))
+
+@api_async_bp.route('/month-details/<year>/<month>')
+async def get_month_details(year, month):
+    """Get detailed breakdown of a specific month"""
+    year = int(year)
+    month = int(month)
+    month_start = datetime(year, month, 1).date()
+    month_end = get_month_end(month_start)
+    month_query = {'date': {
+        '$gte': datetime.combine(month_start, datetime.min.time()),
+        '$lte': datetime.combine(month_end, datetime.max.time())
+    }}
+    
+    db = get_async_db()
+    documents = await asyncio.gather(
+        db['recurring_income'].find({'active': True}, RECURRING_FIELDS).to_list(None),
+        db['one_time_income'].find(month_query).to_list(None),
+        db['recurring_expense'].find({'active': True}, RECURRING_FIELDS).to_list(None),
+        db['one_time_expense'].find(month_query).to_list(None),
+        db['payday_adjustment'].find({'year': year, 'month': month}).to_list(None)
+    )
+    recurring_incomes, one_time_incomes, recurring_expenses, one_time_expenses, adjustments = documents
+    return jsonify(build_month_details(
+        year, month,
+        recurring_items(recurring_incomes), one_time_incomes,
+        recurring_items(recurring_expenses), one_time_expenses,
+        adjustments
+    ))
+
+@api_async_bp.route('/investment-projections')
+async def get_investment_projections():
+    """Calculate investment growth projections"""
+    months = request.args.get('months', 12, type=int)
+    portfolios = await get_async_db()['investment_portfolio'].find({'active': True}).to_list(None)
+    return jsonify(project_investments(await realized_returns(portfolios), months))
@@ -3,8 +3,16 @@ from flask import Blueprint, request, jsonify
 from bson.objectid import ObjectId
 from datetime import datetime
 from database import recurring_expense_collection, one_time_expense_collection
+from cache import invalidate_on_write
+from utils import parse_date
+from fx import parse_currency
+from ledger import parse_frequency
+from pagination import PAGE_SIZE, fetch_page, listing_filters
+from analytics import record_expense_change, record_expenses_inserted
+from recurrence import record_entries_inserted, record_entry_change
 
 api_expenses_bp = Blueprint('api_expenses', __name__, url_prefix='/api')
+invalidate_on_write(api_expenses_bp, 'recurring_expense', 'one_time_expense')
 
 @api_expenses_bp.route('/recurring-expense/<id>', methods=['GET'])
 def get_recurring_expense(id):
@@ -16,9 +24,10 @@ def get_recurring_expense(id):
         'id': str(expense['_id']),
         'name': expense['name'],
         'amount': expense['amount'],
+        'currency': expense.get('currency'),
         'frequency': expense['frequency'],
-        'start_date': expense['start_date'].isoformat() if isinstance(expense['start_date'], datetime) else expense['start_date'],
-        'end_date': expense['end_date'].isoformat() if expense.get('end_date') and isinstance(expense['end_date'], datetime) else expense.get('end_date'),
+        'start_date': expense['start_date'].isoformat(),
+        'end_date': expense['end_date'].isoformat() if expense.get('end_date') else None,
         'category': expense['category'],
         'payday': expense.get('payday'),
         'active': expense['active'],
@@ -31,9 +40,10 @@ def add_recurring_expense():
     expense = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'frequency': data['frequency'],
-        'start_date': datetime.strptime(data['start_date'], '%Y-%m-%d'),
-        'end_date': datetime.strptime(data['end_date'], '%Y-%m-%d') if data.get('end_date') else None,
+        'currency': parse_currency(data.get('currency')),
+        'frequency': parse_frequency(data.get('frequency')),
+        'start_date': parse_date(data, 'start_date'),
+        'end_date': parse_date(data, 'end_date', required=False),
         'category': data['category'],
         'payday': int(data['payday']) if data.get('payday') else None,
         'active': True,
@@ -49,14 +59,16 @@ def update_recurring_expense(id):
     update_data = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'frequency': data['frequency'],
-        'start_date': datetime.strptime(data['start_date'], '%Y-%m-%d'),
-        'end_date': datetime.strptime(data['end_date'], '%Y-%m-%d') if data.get('end_date') else None,
+        'frequency': parse_frequency(data.get('frequency')),
+        'start_date': parse_date(data, 'start_date'),
+        'end_date': parse_date(data, 'end_date', required=False),
         'category': data['category'],
         'payday': int(data['payday']) if data.get('payday') else None,
         'active': data.get('active', True),
         'upcoming': data.get('upcoming', False)
     }
+    if 'currency' in data:
+        update_data['currency'] = parse_currency(data['currency'])
     recurring_expense_collection.update_one({'_id': ObjectId(id)}, {'$set': update_data})
     return jsonify({'success': True})
 
@@ -65,35 +77,94 @@ def delete_recurring_expense(id):
     recurring_expense_collection.delete_one({'_id': ObjectId(id)})
     return jsonify({'success': True})
 
-@api_expenses_bp.route('/one-time-expense/<id>', methods=['GET'])
-def get_one_time_expense(id):
-    expense = one_time_expense_collection.find_one({'_id': ObjectId(id)})
-    if not expense:
-        return jsonify({'error': 'Not found'}), 404
-    
-    return jsonify({
+def serialize_one_time_expense(expense):
+    return {
         'id': str(expense['_id']),
         'name': expense['name'],
         'amount': expense['amount'],
-        'date': expense['date'].isoformat() if isinstance(expense['date'], datetime) else expense['date'],
+        'currency': expense.get('currency'),
+        'date': expense['date'].isoformat(),
         'category': expense['category'],
         'notes': expense.get('notes', ''),
         'upcoming': expense.get('upcoming', False)
+    }
+
+@api_expenses_bp.route('/one-time-expense', methods=['GET'])
+def list_one_time_expenses():
+    """One-time expenses, newest first (from, to, category, q filters; cursor/limit paging)"""
+    expenses, next_cursor = fetch_page(
+        one_time_expense_collection, listing_filters(request.args),
+        cursor=request.args.get('cursor'), limit=request.args.get('limit', PAGE_SIZE, type=int)
+    )
+    return jsonify({
+        'items': [serialize_one_time_expense(expense) for expense in expenses],
+        'next_cursor': next_cursor
     })
 
+@api_expenses_bp.route('/one-time-expense/import', methods=['POST'])
+def import_one_time_expenses():
+    """Import one-time expenses from a CSV or NDJSON upload (body or multipart 'file')"""
+    import bulk
+
+    stream, fmt = bulk.upload()
+    report = bulk.import_rows(one_time_expense_collection, stream, fmt, on_insert=record_expenses_inserted)
+    if report['inserted']:
+        record_entries_inserted('expense')
+    return jsonify(dict(report, success=True))
+
+@api_expenses_bp.route('/one-time-expense/import-statement', methods=['POST'])
+def import_bank_statement():
+    """Import the outgoing transactions of a bank statement (CSV or OFX; dry_run=1 to preview)"""
+    from bank_import import import_statement
+
+    file = request.files.get('file')
+    if file:
+        data, filename = file.read(), file.filename
+    else:
+        data, filename = request.get_data(), None
+    if not data:
+        return jsonify({'error': 'No statement uploaded'}), 400
+
+    report = import_statement(data, filename, dry_run=request.args.get('dry_run', '').lower() in ('1', 'true'))
+    if report['inserted']:
+        record_entries_inserted('expense')
+    return jsonify(dict(report, success=True))
+
+@api_expenses_bp.route('/one-time-expense/export', methods=['GET'])
+def export_one_time_expenses():
+    """Stream one-time expenses as CSV or NDJSON (format; from, to, category, q filters)"""
+    import bulk
+
+    return bulk.export_response(
+        one_time_expense_collection, listing_filters(request.args),
+        request.args.get('format', 'csv'), 'one_time_expense'
+    )
+
+@api_expenses_bp.route('/one-time-expense/<id>', methods=['GET'])
+def get_one_time_expense(id):
+    expense = one_time_expense_collection.find_one({'_id': ObjectId(id)})
+    if not expense:
+        return jsonify({'error': 'Not found'}), 404
+    
+    return jsonify(serialize_one_time_expense(expense))
+
 @api_expenses_bp.route('/one-time-expense', methods=['POST'])
 def add_one_time_expense():
     data = request.json
     expense = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'date': datetime.strptime(data['date'], '%Y-%m-%d'),
+        'currency': parse_currency(data.get('currency')),
+        'date': parse_date(data, 'date'),
         'category': data['category'],
         'notes': data.get('notes', ''),
         'upcoming': data.get('upcoming', False),
         'created_at': datetime.utcnow()
     }
     result = one_time_expense_collection.insert_one(expense)
+    record_expense_change(after=expense)
+    if not expense['upcoming']:
+        record_entries_inserted('expense')
     return jsonify({'success': True, 'id': str(result.inserted_id)})
 
 @api_expenses_bp.route('/one-time-expense/<id>', methods=['PUT'])
@@ -102,16 +173,24 @@ def update_one_time_expense(id):
     update_data = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'date': datetime.strptime(data['date'], '%Y-%m-%d'),
+        'date': parse_date(data, 'date'),
         'category': data['category'],
         'notes': data.get('notes', ''),
         'upcoming': data.get('upcoming', False)
     }
-    one_time_expense_collection.update_one({'_id': ObjectId(id)}, {'$set': update_data})
+    if 'currency' in data:
+        update_data['currency'] = parse_currency(data['currency'])
+    previous = one_time_expense_collection.find_one_and_update({'_id': ObjectId(id)}, {'$set': update_data})
+    if previous:
+        record_expense_change(before=previous, after=dict(previous, **update_data))
+        record_entry_change('expense', before=previous, after=dict(previous, **update_data))
     return jsonify({'success': True})
 
 @api_expenses_bp.route('/one-time-expense/<id>', methods=['DELETE'])
 def delete_one_time_expense(id):
-    one_time_expense_collection.delete_one({'_id': ObjectId(id)})
+    deleted = one_time_expense_collection.find_one_and_delete({'_id': ObjectId(id)})
+    if deleted:
+        record_expense_change(before=deleted)
+        record_entry_change('expense', before=deleted)
     return jsonify({'success': True})
 
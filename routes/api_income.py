@@ -3,8 +3,15 @@ from flask import Blueprint, request, jsonify
 from bson.objectid import ObjectId
 from datetime import datetime
 from database import recurring_income_collection, one_time_income_collection
+from cache import invalidate_on_write
+from utils import parse_date
+from fx import parse_currency
+from ledger import parse_frequency
+from pagination import PAGE_SIZE, fetch_page, listing_filters
+from recurrence import record_entries_inserted, record_entry_change
 
 api_income_bp = Blueprint('api_income', __name__, url_prefix='/api')
+invalidate_on_write(api_income_bp, 'recurring_income', 'one_time_income')
 
 @api_income_bp.route('/recurring-income/<id>', methods=['GET'])
 def get_recurring_income(id):
@@ -16,9 +23,10 @@ def get_recurring_income(id):
         'id': str(income['_id']),
         'name': income['name'],
         'amount': income['amount'],
+        'currency': income.get('currency'),
         'frequency': income['frequency'],
-        'start_date': income['start_date'].isoformat() if isinstance(income['start_date'], datetime) else income['start_date'],
-        'end_date': income['end_date'].isoformat() if income.get('end_date') and isinstance(income['end_date'], datetime) else income.get('end_date'),
+        'start_date': income['start_date'].isoformat(),
+        'end_date': income['end_date'].isoformat() if income.get('end_date') else None,
         'payday': income.get('payday'),
         'active': income['active'],
         'upcoming': income.get('upcoming', False)
@@ -30,9 +38,10 @@ def add_recurring_income():
     income = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'frequency': data['frequency'],
-        'start_date': datetime.strptime(data['start_date'], '%Y-%m-%d'),
-        'end_date': datetime.strptime(data['end_date'], '%Y-%m-%d') if data.get('end_date') else None,
+        'currency': parse_currency(data.get('currency')),
+        'frequency': parse_frequency(data.get('frequency')),
+        'start_date': parse_date(data, 'start_date'),
+        'end_date': parse_date(data, 'end_date', required=False),
         'payday': int(data['payday']) if data.get('payday') else None,
         'active': True,
         'upcoming': data.get('upcoming', False),
@@ -47,13 +56,15 @@ def update_recurring_income(id):
     update_data = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'frequency': data['frequency'],
-        'start_date': datetime.strptime(data['start_date'], '%Y-%m-%d'),
-        'end_date': datetime.strptime(data['end_date'], '%Y-%m-%d') if data.get('end_date') else None,
+        'frequency': parse_frequency(data.get('frequency')),
+        'start_date': parse_date(data, 'start_date'),
+        'end_date': parse_date(data, 'end_date', required=False),
         'payday': int(data['payday']) if data.get('payday') else None,
         'active': data.get('active', True),
         'upcoming': data.get('upcoming', False)
     }
+    if 'currency' in data:
+        update_data['currency'] = parse_currency(data['currency'])
     recurring_income_collection.update_one({'_id': ObjectId(id)}, {'$set': update_data})
     return jsonify({'success': True})
 
@@ -62,35 +73,75 @@ def delete_recurring_income(id):
     recurring_income_collection.delete_one({'_id': ObjectId(id)})
     return jsonify({'success': True})
 
-@api_income_bp.route('/one-time-income/<id>', methods=['GET'])
-def get_one_time_income(id):
-    income = one_time_income_collection.find_one({'_id': ObjectId(id)})
-    if not income:
-        return jsonify({'error': 'Not found'}), 404
-    
-    return jsonify({
+def serialize_one_time_income(income):
+    return {
         'id': str(income['_id']),
         'name': income['name'],
         'amount': income['amount'],
-        'date': income['date'].isoformat() if isinstance(income['date'], datetime) else income['date'],
+        'currency': income.get('currency'),
+        'date': income['date'].isoformat(),
         'category': income['category'],
         'notes': income.get('notes', ''),
         'upcoming': income.get('upcoming', False)
+    }
+
+@api_income_bp.route('/one-time-income', methods=['GET'])
+def list_one_time_income():
+    """One-time income, newest first (from, to, category, q filters; cursor/limit paging)"""
+    incomes, next_cursor = fetch_page(
+        one_time_income_collection, listing_filters(request.args),
+        cursor=request.args.get('cursor'), limit=request.args.get('limit', PAGE_SIZE, type=int)
+    )
+    return jsonify({
+        'items': [serialize_one_time_income(income) for income in incomes],
+        'next_cursor': next_cursor
     })
 
+@api_income_bp.route('/one-time-income/import', methods=['POST'])
+def import_one_time_income():
+    """Import one-time income from a CSV or NDJSON upload (body or multipart 'file')"""
+    import bulk
+
+    stream, fmt = bulk.upload()
+    report = bulk.import_rows(one_time_income_collection, stream, fmt)
+    if report['inserted']:
+        record_entries_inserted('income')
+    return jsonify(dict(report, success=True))
+
+@api_income_bp.route('/one-time-income/export', methods=['GET'])
+def export_one_time_income():
+    """Stream one-time income as CSV or NDJSON (format; from, to, category, q filters)"""
+    import bulk
+
+    return bulk.export_response(
+        one_time_income_collection, listing_filters(request.args),
+        request.args.get('format', 'csv'), 'one_time_income'
+    )
+
+@api_income_bp.route('/one-time-income/<id>', methods=['GET'])
+def get_one_time_income(id):
+    income = one_time_income_collection.find_one({'_id': ObjectId(id)})
+    if not income:
+        return jsonify({'error': 'Not found'}), 404
+    
+    return jsonify(serialize_one_time_income(income))
+
 @api_income_bp.route('/one-time-income', methods=['POST'])
 def add_one_time_income():
     data = request.json
     income = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'date': datetime.strptime(data['date'], '%Y-%m-%d'),
+        'currency': parse_currency(data.get('currency')),
+        'date': parse_date(data, 'date'),
         'category': data['category'],
         'notes': data.get('notes', ''),
         'upcoming': data.get('upcoming', False),
         'created_at': datetime.utcnow()
     }
     result = one_time_income_collection.insert_one(income)
+    if not income['upcoming']:
+        record_entries_inserted('income')
     return jsonify({'success': True, 'id': str(result.inserted_id)})
 
 @api_income_bp.route('/one-time-income/<id>', methods=['PUT'])
@@ -99,16 +150,22 @@ def update_one_time_income(id):
     update_data = {
         'name': data['name'],
         'amount': float(data['amount']),
-        'date': datetime.strptime(data['date'], '%Y-%m-%d'),
+        'date': parse_date(data, 'date'),
         'category': data['category'],
         'notes': data.get('notes', ''),
         'upcoming': data.get('upcoming', False)
     }
-    one_time_income_collection.update_one({'_id': ObjectId(id)}, {'$set': update_data})
+    if 'currency' in data:
+        update_data['currency'] = parse_currency(data['currency'])
+    previous = one_time_income_collection.find_one_and_update({'_id': ObjectId(id)}, {'$set': update_data})
+    if previous:
+        record_entry_change('income', before=previous, after=dict(previous, **update_data))
     return jsonify({'success': True})
 
 @api_income_bp.route('/one-time-income/<id>', methods=['DELETE'])
 def delete_one_time_income(id):
-    one_time_income_collection.delete_one({'_id': ObjectId(id)})
+    deleted = one_time_income_collection.find_one_and_delete({'_id': ObjectId(id)})
+    if deleted:
+        record_entry_change('income', before=deleted)
     return jsonify({'success': True})
 
@@ -4,10 +4,16 @@ from datetime import datetime
 from bson import ObjectId
 from database import (
     recurring_income_collection,
-    get_currency_settings,
-    get_date_format,
     is_online_db
 )
+from app_settings import get_currency_settings, get_date_format
+from cache import cache_partial, invalidate_on_write
+from utils import parse_date, project_investments
+from metrics import TRADING212_SYNCS
+import snapshots
+import lots
+import dividends
+from returns import RETURN_MODES, portfolio_returns, store_transactions, with_realized_returns
 
 # Create a separate collection for investments
 from database import db
@@ -15,9 +21,12 @@ investment_portfolio_collection = db['investment_portfolio']
 investment_contributions_collection = db['investment_contributions']
 
 api_investments_bp = Blueprint('api_investments', __name__)
+invalidate_on_write(api_investments_bp, 'investment_portfolio', 'investment_stocks', 'portfolio_snapshots',
+                    'investment_transactions', 'dividend_forecast')
 
 # Main investments page
 @api_investments_bp.route('/investments')
+@cache_partial('investment_portfolio', 'investment_contributions', 'settings')
 def investments():
     """Render the investments page"""
     # Get portfolio summary
@@ -59,27 +68,34 @@ def get_portfolio(id):
 def add_portfolio():
     """Add new investment portfolio (simple mode)"""
     data = request.json
+    if data.get('return_mode', 'manual') not in RETURN_MODES:
+        return jsonify({'error': f'return_mode must be one of: {", ".join(RETURN_MODES)}'}), 400
     portfolio = {
         'name': data['name'],
         'type': data.get('type', 'simple'),  # 'simple' or 'detailed'
         'monthly_contribution': float(data.get('monthly_contribution', 0)),
         'mean_return_percent': float(data.get('mean_return_percent', 7.0)),
+        'return_mode': data.get('return_mode', 'manual'),
         'current_value': float(data.get('current_value', 0)),
         'start_date': datetime.strptime(data['start_date'], '%Y-%m-%d'),
         'active': True,
         'created_at': datetime.utcnow()
     }
     result = investment_portfolio_collection.insert_one(portfolio)
+    snapshots.record([result.inserted_id])
     return jsonify({'success': True, 'id': str(result.inserted_id)})
 
 @api_investments_bp.route('/api/investment-portfolio/<id>', methods=['PUT'])
 def update_portfolio(id):
     """Update portfolio"""
     data = request.json
+    if data.get('return_mode', 'manual') not in RETURN_MODES:
+        return jsonify({'error': f'return_mode must be one of: {", ".join(RETURN_MODES)}'}), 400
     update_data = {
         'name': data['name'],
         'monthly_contribution': float(data.get('monthly_contribution', 0)),
         'mean_return_percent': float(data.get('mean_return_percent', 7.0)),
+        'return_mode': data.get('return_mode', 'manual'),
         'current_value': float(data.get('current_value', 0)),
         'start_date': datetime.strptime(data['start_date'], '%Y-%m-%d'),
         'active': data.get('active', True),
@@ -89,12 +105,17 @@ def update_portfolio(id):
         {'_id': ObjectId(id)},
         {'$set': update_data}
     )
+    snapshots.record([id])
     return jsonify({'success': True})
 
 @api_investments_bp.route('/api/investment-portfolio/<id>', methods=['DELETE'])
 def delete_portfolio(id):
     """Delete portfolio"""
     investment_portfolio_collection.delete_one({'_id': ObjectId(id)})
+    snapshots.delete(id)
+    db['investment_transactions'].delete_many({'portfolio_id': id})
+    lots.delete(id)
+    dividends.delete(id)
     return jsonify({'success': True})
 
 # Detailed Stock Management
@@ -180,7 +201,7 @@ def import_stocks():
 @api_investments_bp.route('/api/investment-import-trading212', methods=['POST'])
 def import_trading212():
     """Import stocks from Trading212 CSV export"""
-    from utils import parse_trading212_csv
+    from trading212 import parse_trading212_csv
     
     try:
         data = request.json
@@ -238,9 +259,19 @@ def import_trading212():
             
             imported += 1
         
+        # Kept for the realized return estimates (re-imported rows are not stored twice)
+        stored, corrected = store_transactions(portfolio_id, result['transactions'])
+        if corrected:
+            # Amounts of earlier imports changed: replay the lots instead of applying new transactions only
+            lots.delete(portfolio_id)
+        lots.update_all(portfolio_id)
+        dividends.refresh(portfolio_id)
+        
         return jsonify({
             'success': True,
             'imported': imported,
+            'transactions_stored': stored,
+            'transactions_updated': corrected,
             'summary': {
                 'total_rows': summary['total_rows'],
                 'market_buys': summary['market_buys'],
@@ -258,9 +289,10 @@ def import_trading212():
 
 # Sync prices from Trading212 API
 @api_investments_bp.route('/api/investment-sync-prices', methods=['POST'])
+@TRADING212_SYNCS.track_in_progress(kind='prices')
 def sync_prices_from_trading212():
     """Sync current prices from Trading212 API"""
-    from utils import get_trading212_client
+    from trading212 import get_trading212_client
     import json
     import os
     
@@ -383,6 +415,9 @@ def sync_prices_from_trading212():
                     'updated_at': datetime.utcnow()
                 }}
             )
+        snapshots.record(list(portfolio_values))
+        for portfolio_id in portfolio_values:
+            dividends.refresh(portfolio_id)
         
         return jsonify({
             'success': True,
@@ -399,9 +434,10 @@ def sync_prices_from_trading212():
         }), 500
 
 @api_investments_bp.route('/api/investment-sync-from-trading212', methods=['POST'])
+@TRADING212_SYNCS.track_in_progress(kind='holdings')
 def sync_holdings_from_trading212():
     """Sync all holdings from Trading212 API to a portfolio (replaces existing data)"""
-    from utils import get_trading212_client
+    from trading212 import get_trading212_client
     import json
     import os
     
@@ -635,6 +671,8 @@ def sync_holdings_from_trading212():
             {'_id': ObjectId(portfolio_id)},
             {'$set': portfolio_update}
         )
+        snapshots.record([portfolio_id])
+        dividends.refresh(portfolio_id)
         
         # Calculate gain/loss
         gain_loss = total_portfolio_value - total_invested
@@ -687,6 +725,8 @@ def recalculate_portfolio_value(id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        snapshots.record([id])
+        dividends.refresh(id)
         
         return jsonify({
             'success': True,
@@ -705,32 +745,58 @@ def recalculate_portfolio_value(id):
 def get_investment_projections():
     """Calculate investment growth projections"""
     months = request.args.get('months', 12, type=int)
-    portfolios = list(investment_portfolio_collection.find({'active': True}))
-    
-    projections = []
-    for i in range(months):
-        month_value = 0
-        month_contributions = 0
-        
-        for portfolio in portfolios:
-            current_value = portfolio.get('current_value', 0)
-            monthly_contrib = portfolio.get('monthly_contribution', 0)
-            annual_return = portfolio.get('mean_return_percent', 7.0) / 100
-            monthly_return = (1 + annual_return) ** (1/12) - 1
-            
-            # Calculate value for this month
-            for month in range(i + 1):
-                current_value = (current_value + monthly_contrib) * (1 + monthly_return)
-            
-            month_value += current_value
-            month_contributions += monthly_contrib
-        
-        projections.append({
-            'month': i,
-            'value': round(month_value, 2),
-            'monthly_contribution': round(month_contributions, 2)
-        })
-    
-    return jsonify(projections)
+    portfolios = with_realized_returns(list(investment_portfolio_collection.find({'active': True})))
+    return jsonify(project_investments(portfolios, months))
+
+@api_investments_bp.route('/api/investment-portfolio/<id>/lots')
+def get_portfolio_lots(id):
+    """Cost basis, realized/unrealized P&L and dividends per ticker of the imported transactions (method: fifo or average)"""
+    method = request.args.get('method', 'fifo')
+    if method not in lots.METHODS:
+        return jsonify({'error': f'method must be one of: {", ".join(lots.METHODS)}'}), 400
+    prices = {
+        stock['ticker']: stock.get('current_price', stock.get('avg_price'))
+        for stock in db['investment_stocks'].find({'portfolio_id': id}, {'ticker': 1, 'current_price': 1, 'avg_price': 1})
+    }
+    return jsonify(lots.update(id, method).report(prices))
+
+@api_investments_bp.route('/api/investment-portfolio/<id>/returns')
+def get_portfolio_returns(id):
+    """Realized TWR, XIRR and volatility of a portfolio, and the return its projections use"""
+    estimates = portfolio_returns(id)
+    if estimates is None:
+        return jsonify({'error': 'Portfolio not found'}), 404
+    portfolio = investment_portfolio_collection.find_one({'_id': ObjectId(id)}, {'mean_return_percent': 1, 'return_mode': 1})
+    projected = with_realized_returns([portfolio])[0]
+    return jsonify(dict(
+        estimates,
+        return_mode=portfolio.get('return_mode', 'manual'),
+        projected_return_percent=projected.get('mean_return_percent', 7.0)
+    ))
+
+@api_investments_bp.route('/api/investment-portfolio/<id>/dividends')
+def get_portfolio_dividends(id):
+    """
+    Trailing-twelve-month dividends and yield per ticker, and the dividends projected per calendar month.
+
+    Read-only: forecasts are stored by imports and syncs, and one that was
+    never stored is computed without saving it.
+    """
+    forecast = db[dividends.FORECAST_COLLECTION].find_one({'_id': id}, {'_id': 0, 'updated_at': 0})
+    if forecast is None:
+        if not investment_portfolio_collection.find_one({'_id': ObjectId(id)}, {'_id': 1}):
+            return jsonify({'error': 'Portfolio not found'}), 404
+        forecast = dividends.forecast(id)
+        forecast.pop('updated_at', None)
+    return jsonify(forecast)
 
 
+@api_investments_bp.route('/api/investment-history')
+def get_investment_history():
+    """Recorded portfolio values (from, to, portfolio_id; holdings=1 adds the per-ticker prices)"""
+    return jsonify(snapshots.history(
+        start=parse_date(request.args, 'from', required=False),
+        end=parse_date(request.args, 'to', required=False),
+        portfolio_id=request.args.get('portfolio_id'),
+        holdings=request.args.get('holdings') in ('1', 'true')
+    ))
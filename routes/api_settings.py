@@ -1,7 +1,8 @@
 """API routes for application settings"""
 from flask import Blueprint, request, jsonify
-from datetime import datetime
-from database import get_currency_settings, get_date_format, settings_collection
+from app_settings import (
+    get_category_rules, get_currency_settings, get_date_format, get_trading212_credentials, update_settings
+)
 
 api_settings_bp = Blueprint('api_settings', __name__, url_prefix='/api/settings')
 
@@ -13,26 +14,21 @@ def get_currency():
 @api_settings_bp.route('/currency', methods=['PUT'])
 def update_currency():
     data = request.json
-    settings_collection.update_one(
-        {},
-        {'$set': {
-            'currency_code': data['code'],
-            'currency_symbol': data['symbol'],
-            'updated_at': datetime.utcnow()
-        }},
-        upsert=True
-    )
+    update_settings({
+        'currency_code': data['code'],
+        'currency_symbol': data['symbol']
+    })
     return jsonify({'success': True, 'currency': {'code': data['code'], 'symbol': data['symbol']}})
 
 @api_settings_bp.route('/trading212', methods=['GET'])
 def get_trading212_settings():
     """Get Trading212 API settings"""
-    settings = settings_collection.find_one({})
-    if settings and 'trading212_api_key' in settings:
+    credentials = get_trading212_credentials()
+    if credentials:
         # Don't return the secret, only indicate if it's configured
         return jsonify({
             'configured': True,
-            'environment': settings.get('trading212_environment', 'live')
+            'environment': credentials['environment']
         })
     return jsonify({'configured': False})
 
@@ -41,8 +37,7 @@ def update_trading212_settings():
     """Update Trading212 API settings"""
     data = request.json
     update_data = {
-        'trading212_environment': data.get('environment', 'live'),
-        'updated_at': datetime.utcnow()
+        'trading212_environment': data.get('environment', 'live')
     }
     
     if data.get('api_key'):
@@ -50,24 +45,13 @@ def update_trading212_settings():
     if data.get('api_secret'):
         update_data['trading212_api_secret'] = data['api_secret']
     
-    settings_collection.update_one(
-        {},
-        {'$set': update_data},
-        upsert=True
-    )
+    update_settings(update_data)
     return jsonify({'success': True})
 
 @api_settings_bp.route('/trading212', methods=['DELETE'])
 def delete_trading212_settings():
     """Remove Trading212 API settings"""
-    settings_collection.update_one(
-        {},
-        {'$unset': {
-            'trading212_api_key': '',
-            'trading212_api_secret': '',
-            'trading212_environment': ''
-        }}
-    )
+    update_settings(unset=['trading212_api_key', 'trading212_api_secret', 'trading212_environment'])
     return jsonify({'success': True})
 
 @api_settings_bp.route('/date-format', methods=['GET'])
@@ -78,14 +62,22 @@ def get_date_format_setting():
 @api_settings_bp.route('/date-format', methods=['PUT'])
 def update_date_format():
     data = request.json
-    settings_collection.update_one(
-        {},
-        {'$set': {
-            'date_format': data['format'],
-            'updated_at': datetime.utcnow()
-        }},
-        upsert=True
-    )
+    update_settings({'date_format': data['format']})
     return jsonify({'success': True, 'format': data['format']})
 
+@api_settings_bp.route('/category-rules', methods=['GET'])
+def get_category_rules_setting():
+    """Get the custom bank import keywords per expense category"""
+    return jsonify({'rules': get_category_rules()})
 
+@api_settings_bp.route('/category-rules', methods=['PUT'])
+def update_category_rules():
+    """Replace the custom bank import keywords ({"rules": {category: [keyword, ...]}})"""
+    rules = (request.json or {}).get('rules')
+    if not isinstance(rules, dict) or not all(
+            isinstance(keywords, list) and all(isinstance(keyword, str) for keyword in keywords)
+            for keywords in rules.values()):
+        return jsonify({'error': 'rules must map categories to lists of keywords'}), 400
+    rules = {category: [keyword.strip() for keyword in keywords if keyword.strip()] for category, keywords in rules.items()}
+    update_settings({'category_rules': rules})
+    return jsonify({'success': True, 'rules': rules})
@@ -0,0 +1,52 @@
+"""API routes for recurring item suggestions"""
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+from database import recurring_expense_collection, recurring_income_collection
+from cache import invalidate_on_write
+from utils import parse_date
+from ledger import parse_frequency
+from recurrence import SOURCES, get_candidate, proposal, set_status, suggestions
+
+api_suggestions_bp = Blueprint('api_suggestions', __name__, url_prefix='/api/recurring-suggestions')
+invalidate_on_write(api_suggestions_bp, 'recurring_income', 'recurring_expense')
+
+@api_suggestions_bp.route('', methods=['GET'])
+def get_suggestions():
+    """Recurring items detected in the one-time history (kind: expense or income)"""
+    kind = request.args.get('kind')
+    if kind and kind not in SOURCES:
+        return jsonify({'error': f'kind must be one of: {", ".join(SOURCES)}'}), 400
+    return jsonify({'suggestions': suggestions(kind)})
+
+@api_suggestions_bp.route('/<id>/accept', methods=['POST'])
+def accept_suggestion(id):
+    """Create the suggested recurring item (fields in the body override the suggestion)"""
+    candidate = get_candidate(id)
+    if not candidate or not candidate.get('frequency'):
+        return jsonify({'error': 'Not found'}), 404
+
+    item = dict(proposal(candidate), **(request.get_json(silent=True) or {}))
+    document = {
+        'name': item['name'],
+        'amount': float(item['amount']),
+        'frequency': parse_frequency(item.get('frequency')),
+        'start_date': parse_date(item, 'start_date'),
+        'end_date': None,
+        'payday': int(item['payday']) if item.get('payday') else None,
+        'active': True,
+        'upcoming': False,
+        'created_at': datetime.utcnow()
+    }
+    if candidate['kind'] == 'expense':
+        document['category'] = item['category']
+        result = recurring_expense_collection.insert_one(document)
+    else:
+        result = recurring_income_collection.insert_one(document)
+    set_status(id, 'accepted')
+    return jsonify({'success': True, 'id': str(result.inserted_id)})
+
+@api_suggestions_bp.route('/<id>/dismiss', methods=['POST'])
+def dismiss_suggestion(id):
+    if not set_status(id, 'dismissed'):
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'success': True})
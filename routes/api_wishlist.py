@@ -3,9 +3,11 @@ from flask import Blueprint, request, jsonify
 from bson.objectid import ObjectId
 from datetime import datetime
 from database import wishlist_collection, wishlist_categories_collection, get_wishlist_categories
-from utils import calculate_monthly_projections
+from utils import calculate_monthly_projections, calculate_projections_until_now, parse_date
+from cache import invalidate_on_write
 
 api_wishlist_bp = Blueprint('api_wishlist', __name__, url_prefix='/api')
+invalidate_on_write(api_wishlist_bp, 'wishlist', 'wishlist_categories')
 
 @api_wishlist_bp.route('/wishlist/<id>', methods=['GET'])
 def get_wishlist_item(id):
@@ -19,11 +21,11 @@ def get_wishlist_item(id):
         'cost': item['cost'],
         'category': item['category'],
         'priority': item.get('priority', 'medium'),
-        'target_date': item['target_date'].isoformat() if item.get('target_date') and isinstance(item['target_date'], datetime) else item.get('target_date'),
+        'target_date': item['target_date'].isoformat() if item.get('target_date') else None,
         'notes': item.get('notes', ''),
         'url': item.get('url', ''),
         'purchased': item.get('purchased', False),
-        'purchased_date': item['purchased_date'].isoformat() if item.get('purchased_date') and isinstance(item['purchased_date'], datetime) else item.get('purchased_date')
+        'purchased_date': item['purchased_date'].isoformat() if item.get('purchased_date') else None
     })
 
 @api_wishlist_bp.route('/wishlist', methods=['POST'])
@@ -34,7 +36,7 @@ def add_wishlist_item():
         'cost': float(data['cost']),
         'category': data['category'],
         'priority': data.get('priority', 'medium'),
-        'target_date': datetime.strptime(data['target_date'], '%Y-%m-%d') if data.get('target_date') else None,
+        'target_date': parse_date(data, 'target_date', required=False),
         'notes': data.get('notes', ''),
         'url': data.get('url', ''),
         'purchased': False,
@@ -52,7 +54,7 @@ def update_wishlist_item(id):
         'cost': float(data['cost']),
         'category': data['category'],
         'priority': data.get('priority', 'medium'),
-        'target_date': datetime.strptime(data['target_date'], '%Y-%m-%d') if data.get('target_date') else None,
+        'target_date': parse_date(data, 'target_date', required=False),
         'notes': data.get('notes', ''),
         'url': data.get('url', ''),
         'purchased': data.get('purchased', False)
@@ -96,16 +98,11 @@ def get_wishlist_analysis():
     - Months until affordable
     - Impact on savings
     """
-    from routes.api_projections import get_projections_until_now
-    from flask import current_app
-    
     # Get all active wishlist items
     items = list(wishlist_collection.find({'purchased': {'$ne': True}}).sort('priority', 1))
     
     # Get projections until now for current balance
-    with current_app.test_request_context():
-        until_now_response = get_projections_until_now()
-        until_now_projections = until_now_response.get_json()
+    until_now_projections = calculate_projections_until_now()
     
     # Get future projections for affordability analysis
     future_projections = calculate_monthly_projections(months=24)
@@ -165,9 +162,6 @@ def get_wishlist_analysis():
         required_monthly_savings = None
         target_date = item.get('target_date')
         if target_date and not can_afford_now:
-            if isinstance(target_date, str):
-                target_date = datetime.fromisoformat(target_date)
-            
             months_until_target = max(1, (target_date.year - datetime.now().year) * 12 + 
                                       (target_date.month - datetime.now().month))
             
@@ -181,7 +175,7 @@ def get_wishlist_analysis():
             'cost': cost,
             'category': item['category'],
             'priority': item.get('priority', 'medium'),
-            'target_date': item['target_date'].isoformat() if item.get('target_date') and isinstance(item['target_date'], datetime) else item.get('target_date'),
+            'target_date': item['target_date'].isoformat() if item.get('target_date') else None,
             'notes': item.get('notes', ''),
             'url': item.get('url', ''),
             'can_afford_now': can_afford_now,
@@ -0,0 +1,14 @@
+"""Debug routes for request profiling (registered only with REQUEST_PROFILING=1)"""
+from flask import Blueprint, jsonify
+from profiling import get_metrics, reset_metrics
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+@debug_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify(get_metrics())
+
+@debug_bp.route('/metrics', methods=['DELETE'])
+def clear_metrics():
+    reset_metrics()
+    return jsonify({'success': True})
@@ -1,7 +1,10 @@
 """Main page routes"""
 from flask import Blueprint, render_template, request
-from database import get_currency_settings, get_date_format, is_online_db
+from database import is_online_db
+from app_settings import get_currency_settings, get_date_format
 from utils import calculate_monthly_projections
+from pagination import fetch_page, filter_args, listing_filters
+from cache import cache_partial
 
 main_bp = Blueprint('main', __name__)
 
@@ -20,28 +23,49 @@ def dashboard():
     return render_template(template, projections=projections, currency=currency, date_format=date_format, is_online_db=is_online_db)
 
 @main_bp.route('/income')
+@cache_partial('recurring_income', 'one_time_income', 'settings')
 def income():
     from database import recurring_income_collection, one_time_income_collection
     
     recurring = list(recurring_income_collection.find().sort('created_at', -1))
-    one_time = list(one_time_income_collection.find().sort('date', -1))
+    # First page only; the rest is loaded by one_time_income_rows as the table is scrolled
+    one_time, next_cursor = fetch_page(one_time_income_collection, listing_filters(request.args))
     currency = get_currency_settings()
     date_format = get_date_format()
     template = 'income/income_partial.html' if is_htmx_request() else 'income/income.html'
-    return render_template(template, recurring=recurring, one_time=one_time, currency=currency, date_format=date_format, is_online_db=is_online_db)
+    return render_template(template, recurring=recurring, one_time=one_time, next_cursor=next_cursor, filters=filter_args(request.args), currency=currency, date_format=date_format, is_online_db=is_online_db)
+
+@main_bp.route('/income/one-time-rows')
+def one_time_income_rows():
+    """Next page of one-time income table rows (HTMX infinite scroll)"""
+    from database import one_time_income_collection
+    
+    one_time, next_cursor = fetch_page(one_time_income_collection, listing_filters(request.args), cursor=request.args.get('cursor'))
+    return render_template('income/one_time_income_rows.html', one_time=one_time, next_cursor=next_cursor, filters=filter_args(request.args), currency=get_currency_settings())
 
 @main_bp.route('/expenses')
+@cache_partial('recurring_expense', 'one_time_expense', 'settings')
 def expenses():
     from database import recurring_expense_collection, one_time_expense_collection
     
     recurring = list(recurring_expense_collection.find().sort('created_at', -1))
-    one_time = list(one_time_expense_collection.find().sort('date', -1))
+    # First page only; the rest is loaded by one_time_expenses_rows as the table is scrolled
+    one_time, next_cursor = fetch_page(one_time_expense_collection, listing_filters(request.args))
     currency = get_currency_settings()
     date_format = get_date_format()
     template = 'expenses/expenses_partial.html' if is_htmx_request() else 'expenses/expenses.html'
-    return render_template(template, recurring=recurring, one_time=one_time, currency=currency, date_format=date_format, is_online_db=is_online_db)
+    return render_template(template, recurring=recurring, one_time=one_time, next_cursor=next_cursor, filters=filter_args(request.args), currency=currency, date_format=date_format, is_online_db=is_online_db)
+
+@main_bp.route('/expenses/one-time-rows')
+def one_time_expenses_rows():
+    """Next page of one-time expenses table rows (HTMX infinite scroll)"""
+    from database import one_time_expense_collection
+    
+    one_time, next_cursor = fetch_page(one_time_expense_collection, listing_filters(request.args), cursor=request.args.get('cursor'))
+    return render_template('expenses/one_time_expenses_rows.html', one_time=one_time, next_cursor=next_cursor, filters=filter_args(request.args), currency=get_currency_settings())
 
 @main_bp.route('/settings')
+@cache_partial('settings')
 def settings():
     currency = get_currency_settings()
     date_format = get_date_format()
@@ -49,6 +73,7 @@ def settings():
     return render_template(template, currency=currency, date_format=date_format, is_online_db=is_online_db)
 
 @main_bp.route('/wishlist')
+@cache_partial('wishlist', 'settings')
 def wishlist():
     from database import wishlist_collection
     
@@ -0,0 +1,9 @@
+"""Prometheus metrics endpoint (registered only with METRICS=1)"""
+from flask import Blueprint, Response
+from metrics import render
+
+monitoring_bp = Blueprint('monitoring', __name__)
+
+@monitoring_bp.route('/metrics')
+def metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
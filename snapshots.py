@@ -0,0 +1,192 @@
+"""
+Daily portfolio valuation history.
+
+Syncs and recalculations overwrite investment_portfolio.current_value, so
+each write also records a snapshot in portfolio_snapshots: one document per
+portfolio per day (later writes that day replace it), with the value, the
+invested amount and the holdings' prices embedded.
+
+downsample() keeps the collection compact: snapshots older than
+DAILY_RETENTION_DAYS are thinned to the last one of each week, and those
+older than WEEKLY_RETENTION_DAYS to the last one of each month. Bucket
+boundaries are aligned so a run never splits a week or month, and reruns
+are idempotent.
+"""
+from datetime import datetime, timedelta
+from cache import cached
+
+SNAPSHOTS_COLLECTION = 'portfolio_snapshots'
+
+DAILY_RETENTION_DAYS = 90
+WEEKLY_RETENTION_DAYS = 730
+
+DELETE_BATCH = 1000
+
+
+def snapshot_id(portfolio_id, day):
+    return f'{portfolio_id}:{day:%Y-%m-%d}'
+
+
+def snapshot_document(portfolio, stocks, day):
+    """Snapshot of a portfolio document and its stock holdings on day (a midnight datetime)"""
+    holdings = [
+        {
+            'ticker': stock['ticker'],
+            'shares': stock.get('shares', 0),
+            'price': stock.get('current_price', stock.get('avg_price', 0))
+        }
+        for stock in stocks
+    ]
+    return {
+        'portfolio_id': str(portfolio['_id']),
+        'date': day,
+        'resolution': 'day',
+        'value': portfolio.get('current_value', 0),
+        'invested': round(sum(stock.get('shares', 0) * stock.get('avg_price', 0) for stock in stocks), 2),
+        'holdings': holdings,
+        'recorded_at': datetime.utcnow()
+    }
+
+
+def record(portfolio_ids):
+    """Snapshot the current value and holdings of the portfolios (ids as strings) for today"""
+    from bson import ObjectId
+    from pymongo import ReplaceOne
+    from database import db
+
+    portfolio_ids = [str(portfolio_id) for portfolio_id in portfolio_ids]
+    if not portfolio_ids:
+        return 0
+    stocks_by_portfolio = {}
+    for stock in db['investment_stocks'].find({'portfolio_id': {'$in': portfolio_ids}},
+                                              {'portfolio_id': 1, 'ticker': 1, 'shares': 1,
+                                               'avg_price': 1, 'current_price': 1}):
+        stocks_by_portfolio.setdefault(stock['portfolio_id'], []).append(stock)
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    requests = []
+    for portfolio in db['investment_portfolio'].find({'_id': {'$in': [ObjectId(id) for id in portfolio_ids]}}):
+        document = snapshot_document(portfolio, stocks_by_portfolio.get(str(portfolio['_id']), []), today)
+        requests.append(ReplaceOne({'_id': snapshot_id(document['portfolio_id'], today)}, document, upsert=True))
+    if requests:
+        db[SNAPSHOTS_COLLECTION].bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+def delete(portfolio_id):
+    """Drop the history of a deleted portfolio"""
+    from database import db
+
+    db[SNAPSHOTS_COLLECTION].delete_many({'portfolio_id': str(portfolio_id)})
+
+
+def _week(day):
+    return day.isocalendar()[:2]
+
+
+def _month(day):
+    return day.year, day.month
+
+
+def _thin(query, resolution, bucket):
+    """Keep the last matched snapshot of each portfolio and bucket, marked with resolution; returns how many were deleted"""
+    from database import db
+
+    collection = db[SNAPSHOTS_COLLECTION]
+    cursor = collection.find(query, {'portfolio_id': 1, 'date': 1, 'resolution': 1})
+    cursor = cursor.sort([('portfolio_id', 1), ('date', 1)])
+
+    deleted = 0
+    doomed, relabel = [], []
+    previous, previous_key = None, None
+    for snapshot in cursor:
+        key = (snapshot['portfolio_id'], bucket(snapshot['date']))
+        if previous is not None:
+            if key == previous_key:
+                doomed.append(previous['_id'])
+            elif previous.get('resolution') != resolution:
+                relabel.append(previous['_id'])
+        previous, previous_key = snapshot, key
+        if len(doomed) >= DELETE_BATCH:
+            deleted += collection.delete_many({'_id': {'$in': doomed}}).deleted_count
+            doomed = []
+    if previous is not None and previous.get('resolution') != resolution:
+        relabel.append(previous['_id'])
+
+    if doomed:
+        deleted += collection.delete_many({'_id': {'$in': doomed}}).deleted_count
+    for start in range(0, len(relabel), DELETE_BATCH):
+        collection.update_many({'_id': {'$in': relabel[start:start + DELETE_BATCH]}},
+                               {'$set': {'resolution': resolution}})
+    return deleted
+
+
+def downsample(today=None):
+    """Thin old snapshots to weekly and monthly ones; returns how many were deleted ({'weekly': n, 'monthly': n})"""
+    today = datetime.combine((today or datetime.now()).date(), datetime.min.time())
+
+    # Cutoffs are moved back to the start of their month / week, so buckets are never split
+    monthly_cutoff = (today - timedelta(days=WEEKLY_RETENTION_DAYS)).replace(day=1)
+    weekly_cutoff = today - timedelta(days=DAILY_RETENTION_DAYS)
+    weekly_cutoff -= timedelta(days=weekly_cutoff.weekday())
+
+    return {
+        'monthly': _thin({'date': {'$lt': monthly_cutoff}}, 'month', _month),
+        'weekly': _thin({'date': {'$gte': monthly_cutoff, '$lt': weekly_cutoff}}, 'week', _week)
+    }
+
+
+@cached(SNAPSHOTS_COLLECTION)
+def history(start=None, end=None, portfolio_id=None, holdings=False):
+    """
+    Snapshots between start and end (datetimes, inclusive), oldest first.
+
+    Returns the series of each portfolio and the total of all portfolios on
+    every snapshot date, where a portfolio without a snapshot that day
+    counts with its latest earlier value (also from before start).
+    """
+    from database import db
+
+    query = {}
+    if portfolio_id:
+        query['portfolio_id'] = portfolio_id
+    if start or end:
+        query['date'] = {}
+        if start:
+            query['date']['$gte'] = start
+        if end:
+            query['date']['$lte'] = end
+    projection = {'portfolio_id': 1, 'date': 1, 'value': 1, 'invested': 1, 'resolution': 1}
+    if holdings:
+        projection['holdings'] = 1
+
+    portfolios = {}
+    total = []
+    latest = {}
+    if start:
+        before = {'date': {'$lt': start}}
+        if portfolio_id:
+            before['portfolio_id'] = portfolio_id
+        latest = {group['_id']: group['value'] for group in db[SNAPSHOTS_COLLECTION].aggregate([
+            {'$match': before},
+            {'$sort': {'portfolio_id': 1, 'date': -1}},
+            {'$group': {'_id': '$portfolio_id', 'value': {'$first': '$value'}}}
+        ])}
+    for snapshot in db[SNAPSHOTS_COLLECTION].find(query, projection).sort([('date', 1), ('portfolio_id', 1)]):
+        point = {
+            'date': snapshot['date'].strftime('%Y-%m-%d'),
+            'value': snapshot['value'],
+            'invested': snapshot.get('invested', 0),
+            'resolution': snapshot.get('resolution', 'day')
+        }
+        if holdings:
+            point['holdings'] = snapshot.get('holdings', [])
+        portfolios.setdefault(snapshot['portfolio_id'], []).append(point)
+
+        latest[snapshot['portfolio_id']] = snapshot['value']
+        value = round(sum(latest.values()), 2)
+        if total and total[-1]['date'] == point['date']:
+            total[-1]['value'] = value
+        else:
+            total.append({'date': point['date'], 'value': value})
+    return {'portfolios': portfolios, 'total': total}
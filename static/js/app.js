@@ -0,0 +1,271 @@
+// Utility functions
+function formatCurrency(amount) {
+    // Use current currency symbol
+    return currentCurrencySymbol + amount.toLocaleString('en-US', {
+        minimumFractionDigits: 2,
+        maximumFractionDigits: 2
+    });
+}
+
+function formatDate(dateString) {
+    // Parse the date string (handles ISO format, Date objects, etc.)
+    let date;
+    if (dateString instanceof Date) {
+        date = dateString;
+    } else if (typeof dateString === 'string') {
+        // Handle various input formats
+        date = new Date(dateString);
+    } else {
+        return dateString; // Return as-is if not a valid date
+    }
+    
+    // Check if date is valid
+    if (isNaN(date.getTime())) {
+        return dateString;
+    }
+    
+    const day = String(date.getDate()).padStart(2, '0');
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const year = date.getFullYear();
+    
+    // Format based on user preference
+    switch (currentDateFormat) {
+        case 'DD/MM/YYYY':
+            return `${day}/${month}/${year}`;
+        case 'YYYY-MM-DD':
+            return `${year}-${month}-${day}`;
+        case 'MM/DD/YYYY':
+        default:
+            return `${month}/${day}/${year}`;
+    }
+}
+
+function formatDateForInput(dateString) {
+    // Always return YYYY-MM-DD format for HTML date inputs
+    let date;
+    if (dateString instanceof Date) {
+        date = dateString;
+    } else if (typeof dateString === 'string') {
+        date = new Date(dateString);
+    } else {
+        return '';
+    }
+    
+    if (isNaN(date.getTime())) {
+        return '';
+    }
+    
+    const day = String(date.getDate()).padStart(2, '0');
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const year = date.getFullYear();
+    
+    return `${year}-${month}-${day}`;
+}
+
+function showAlert(message, type = 'success') {
+    const alert = document.createElement('div');
+    alert.className = `alert alert-${type}`;
+    alert.textContent = message;
+    document.querySelector('.container').insertBefore(alert, document.querySelector('.container').firstChild);
+    
+    setTimeout(() => {
+        alert.remove();
+    }, 3000);
+}
+
+// Modal functions (keeping for currency selector)
+function openModal(modalId) {
+    const modal = document.getElementById(modalId);
+    modal.classList.add('active');
+    // Prevent body scroll when modal is open
+    document.body.style.overflow = 'hidden';
+    // Ensure modal content is scrolled to top
+    const modalBody = modal.querySelector('.modal-body');
+    if (modalBody) {
+        modalBody.scrollTop = 0;
+    }
+}
+
+function closeModal(modalId) {
+    document.getElementById(modalId).classList.remove('active');
+    // Re-enable body scroll when modal is closed
+    document.body.style.overflow = '';
+}
+
+// Close modal when clicking outside
+document.addEventListener('click', (e) => {
+    if (e.target.classList.contains('modal')) {
+        e.target.classList.remove('active');
+        // Re-enable body scroll when modal is closed
+        document.body.style.overflow = '';
+    }
+});
+
+// Slide Panel functions
+function openSlidePanel(panelId) {
+    const panel = document.getElementById(panelId);
+    if (panel) {
+        panel.classList.add('active');
+        // Scroll panel content to top
+        const panelBody = panel.querySelector('.slide-panel-body');
+        if (panelBody) {
+            panelBody.scrollTop = 0;
+        }
+    }
+}
+
+function closeSlidePanel(panelId) {
+    const panel = document.getElementById(panelId);
+    if (panel) {
+        panel.classList.remove('active');
+    }
+}
+
+// Currency functions
+function openCurrencyModal() {
+    openModal('currencyModal');
+}
+
+function selectCurrency(code, symbol) {
+    updateCurrency(code, symbol);
+}
+
+function selectCustomCurrency() {
+    const symbol = document.getElementById('customSymbol').value.trim();
+    const code = document.getElementById('customCode').value.trim().toUpperCase();
+    
+    if (!symbol || !code) {
+        showAlert('Please enter both symbol and code', 'error');
+        return;
+    }
+    
+    if (code.length > 3) {
+        showAlert('Currency code must be 3 characters or less', 'error');
+        return;
+    }
+    
+    updateCurrency(code, symbol);
+}
+
+function updateCurrency(code, symbol) {
+    fetch('/api/settings/currency', {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ code: code, symbol: symbol })
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.success) {
+            currentCurrencySymbol = symbol;
+            currentCurrencyCode = code;
+            document.getElementById('currentCurrency').textContent = symbol + ' ' + code;
+            showAlert('Currency updated to ' + symbol + ' ' + code, 'success');
+            closeModal('currencyModal');
+            
+            // Reload page after a short delay to update all currency displays
+            setTimeout(() => location.reload(), 1000);
+        }
+    })
+    .catch(error => {
+        showAlert('Error updating currency', 'error');
+        console.error(error);
+    });
+}
+
+// Load current currency on page load
+fetch('/api/settings/currency')
+    .then(response => response.json())
+    .then(data => {
+        currentCurrencySymbol = data.symbol;
+        currentCurrencyCode = data.code;
+    })
+    .catch(error => console.error('Error loading currency:', error));
+
+// Load current date format on page load
+fetch('/api/settings/date-format')
+    .then(response => response.json())
+    .then(data => {
+        currentDateFormat = data.format;
+        // Format all dates on the page after loading the format
+        formatAllDatesGlobal();
+    })
+    .catch(error => console.error('Error loading date format:', error));
+
+// Global date formatter function
+function formatAllDatesGlobal() {
+    document.querySelectorAll('.format-date').forEach(function(element) {
+        // Keep the original value so that formatting again (e.g. after an HTMX swap) is a no-op
+        const dateStr = element.dataset.date || element.textContent.trim();
+        if (dateStr && dateStr !== 'Ongoing' && dateStr !== '-' && dateStr !== '') {
+            element.dataset.date = dateStr;
+            element.textContent = formatDate(dateStr);
+        }
+    });
+}
+
+// Format dates on page load
+document.addEventListener('DOMContentLoaded', function() {
+    formatAllDatesGlobal();
+});
+
+// Also format dates after HTMX swaps
+if (typeof htmx !== 'undefined') {
+    htmx.on('htmx:afterSwap', function() {
+        formatAllDatesGlobal();
+    });
+}
+
+// Track HTMX swaps
+document.body.addEventListener('htmx:beforeSwap', function(event) {
+    if (event.detail.target.id === 'main-content-area') {
+        window.htmxSwapping = true;
+    }
+});
+
+// HTMX: Update active nav link and trigger initialization after page swap
+document.body.addEventListener('htmx:afterSwap', function(event) {
+    if (event.detail.target.id === 'main-content-area') {
+        console.log('HTMX content swapped, triggering initialization...');
+        
+        // Get current path from URL
+        const currentPath = window.location.pathname;
+        
+        // Remove active class from all nav links
+        document.querySelectorAll('.nav-links a').forEach(link => {
+            link.classList.remove('active');
+        });
+        
+        // Add active class to matching nav link
+        document.querySelectorAll('.nav-links a').forEach(link => {
+            const linkPath = new URL(link.href).pathname;
+            if (linkPath === currentPath) {
+                link.classList.add('active');
+            }
+        });
+        
+        // Trigger page-specific initialization
+        // The scripts in the swapped content will define these functions
+        setTimeout(() => {
+            // Only call the function if it exists AND its required elements are present
+            if (typeof initializeDashboard === 'function' && document.getElementById('projectionChart')) {
+                console.log('Calling initializeDashboard');
+                initializeDashboard();
+            } else if (typeof initializeIncomePage === 'function' && document.getElementById('recurringStartDate')) {
+                console.log('Calling initializeIncomePage');
+                initializeIncomePage();
+            } else if (typeof initializeExpensesPage === 'function' && document.getElementById('recurringStartDate')) {
+                console.log('Calling initializeExpensesPage');
+                initializeExpensesPage();
+            } else if (typeof initializeInvestmentsPage === 'function' && document.getElementById('investmentChart')) {
+                console.log('Calling initializeInvestmentsPage');
+                initializeInvestmentsPage();
+            } else if (typeof initializeWishlist === 'function' && document.getElementById('wishlistContainer')) {
+                console.log('Calling initializeWishlist');
+                initializeWishlist();
+            }
+            
+            // Reset flag
+            window.htmxSwapping = false;
+        }, 50);
+    }
+});
@@ -0,0 +1,50 @@
+"""Expense category rollup (analytics.py)"""
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import analytics
+import database
+
+
+@pytest.fixture
+def db():
+    database.use_client(mongomock.MongoClient(), 'test_analytics')
+    return database.db
+
+
+def add_expense(db, category, amount, currency=None):
+    expense = {'name': 'x', 'amount': amount, 'currency': currency, 'date': datetime(2025, 3, 10)}
+    if category is not None:
+        expense['category'] = category
+    db['one_time_expense'].insert_one(expense)
+    analytics.record_expense_change(after=expense)
+    return expense
+
+
+def rollups(db):
+    return {rollup['_id']: (rollup['category'], rollup['total']) for rollup in db[analytics.ROLLUP_COLLECTION].find()}
+
+
+def test_rebuild_matches_the_incremental_rollup(db):
+    add_expense(db, '', 10)
+    add_expense(db, None, 5)
+    add_expense(db, 'A|USD', 7)
+    add_expense(db, 'A', 3, currency='USD')
+    incremental = rollups(db)
+
+    analytics.rebuild_rollup()
+    assert rollups(db) == incremental
+    assert incremental['2025-03:Uncategorized'] == ('Uncategorized', 15)
+    assert incremental['2025-03:A\\|USD'] == ('A|USD', 7)
+    assert incremental['2025-03:A|USD'] == ('A', 3)
+
+
+def test_edit_after_rebuild_leaves_no_drift(db):
+    expense = add_expense(db, '', 10)
+    analytics.rebuild_rollup()
+
+    analytics.record_expense_change(before=expense, after=dict(expense, category='Food'))
+    assert rollups(db) == {'2025-03:Uncategorized': ('Uncategorized', 0), '2025-03:Food': ('Food', 10)}
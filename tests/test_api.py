@@ -0,0 +1,91 @@
+"""Income and expense API routes against an in-memory database"""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import database
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('CACHE_WATCH', 'off')
+    database.use_client(mongomock.MongoClient(), 'test_api')
+    from app import app
+    return app.test_client()
+
+
+def test_update_without_currency_keeps_the_stored_currency(client):
+    created = client.post('/api/recurring-expense', json={
+        'name': 'Hosting', 'amount': 20, 'currency': 'usd', 'frequency': 'monthly',
+        'start_date': '2025-01-01', 'category': 'Software'
+    }).get_json()
+    # The edit form sends every field but the currency
+    response = client.put(f"/api/recurring-expense/{created['id']}", json={
+        'name': 'Hosting', 'amount': 25, 'frequency': 'monthly',
+        'start_date': '2025-01-01', 'category': 'Software'
+    })
+    assert response.status_code == 200
+
+    expense = client.get(f"/api/recurring-expense/{created['id']}").get_json()
+    assert expense['amount'] == 25
+    assert expense['currency'] == 'USD'
+
+
+def test_update_with_currency_sets_it(client):
+    created = client.post('/api/one-time-income', json={
+        'name': 'Refund', 'amount': 10, 'currency': 'EUR', 'date': '2025-03-01', 'category': 'Other'
+    }).get_json()
+    client.put(f"/api/one-time-income/{created['id']}", json={
+        'name': 'Refund', 'amount': 10, 'currency': '', 'date': '2025-03-01', 'category': 'Other'
+    })
+
+    assert client.get(f"/api/one-time-income/{created['id']}").get_json()['currency'] is None
+
+
+def test_unknown_frequency_is_rejected(client):
+    response = client.post('/api/recurring-income', json={
+        'name': 'Salary', 'amount': 1000, 'frequency': 'fortnightly', 'start_date': '2025-01-01'
+    })
+    assert response.status_code == 400
+    assert 'frequency' in response.get_json()['error']
+
+
+def test_stored_item_with_unknown_frequency_is_skipped(client):
+    database.db['recurring_expense'].insert_one({
+        'name': 'Legacy', 'amount': 10, 'frequency': 'quarterly', 'start_date': datetime(2025, 1, 1),
+        'category': 'Other', 'active': True
+    })
+    client.post('/api/recurring-expense', json={
+        'name': 'Rent', 'amount': 900, 'frequency': 'monthly', 'start_date': '2025-01-01', 'category': 'Housing'
+    })
+    assert client.get('/api/timeline?months=2').status_code == 200
+    projections = client.get('/api/projections?months=1').get_json()
+    assert projections[0]['recurring_expenses'] == 900
+
+
+def test_infinite_scroll_keeps_the_listing_filters(client):
+    database.db['one_time_expense'].insert_many([
+        {'name': f'Expense {i}', 'amount': 1, 'category': 'Food' if i % 2 else 'Travel',
+         'date': datetime(2025, 1, 1) + timedelta(days=i)}
+        for i in range(120)
+    ])
+    page = client.get('/expenses?category=Food').get_data(as_text=True)
+    next_url = re.search(r'hx-get="([^"]*one-time-rows[^"]*)"', page).group(1).replace('&amp;', '&')
+    assert 'category=Food' in next_url
+
+    rows = client.get(next_url).get_data(as_text=True)
+    assert 'badge badge-warning">Food' in rows
+    assert 'Travel' not in rows
+
+
+def test_missing_rates_are_not_blamed_on_the_request(client):
+    client.post('/api/recurring-income', json={
+        'name': 'Contract', 'amount': 500, 'currency': 'EUR', 'frequency': 'monthly', 'start_date': '2025-01-01'
+    })
+    response = client.get('/api/projections?months=3')
+
+    assert response.status_code == 503
+    assert 'load-fx-rates' in response.get_json()['error']
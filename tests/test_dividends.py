@@ -0,0 +1,89 @@
+"""Dividend forecasts and received dividends in the base currency (dividends.py)"""
+from datetime import date, datetime
+
+import pytest
+
+import dividends
+from fx import RateTable
+from utils import totals_by_month
+
+MONTHS = [date(2025, 3, 1), date(2025, 4, 1)]
+
+# 1 GBP = 1.25 USD and 1 EUR = 1.1 USD in both months, with USD as the base currency
+RATES = RateTable('USD', [(2025, 3), (2025, 4)], {'GBP': [1.25, 1.25], 'EUR': [1.1, 1.1]})
+
+
+def dividend(day, ticker, amount, currency, total=None, total_currency=None, shares=10):
+    return {
+        'portfolio_id': 'p1', 'action': 'dividend', 'ticker': ticker, 'shares': shares, 'amount': amount,
+        'currency': currency, 'total': total, 'total_currency': total_currency, 'date': datetime(2025, *day)
+    }
+
+
+def test_forecast_keeps_the_cash_currency():
+    events = [
+        dividend((3, 3), 'AAPL', 5.0, 'USD', total=4.0, total_currency='GBP'),
+        # An older import without the Total column: paid in the instrument currency
+        dividend((4, 3), 'AAPL', 5.0, 'USD'),
+    ]
+    [ticker] = dividends.ticker_forecasts(events, {'AAPL': (20, 100.0)})
+
+    assert ticker['ttm_per_share'] == 1.0
+    assert ticker['yield_percent'] == 1.0
+    gbp, usd = ticker['cash']
+    assert (gbp['currency'], usd['currency']) == ('GBP', 'USD')
+    assert gbp['monthly'][2] == 8.0
+    assert usd['monthly'][3] == 10.0
+
+
+def test_forecast_totals_convert_each_currency():
+    forecast = {'_id': 'p1', 'cash': [
+        {'currency': 'GBP', 'monthly': [0, 0, 8.0] + [0] * 9},
+        {'currency': None, 'monthly': [0, 0, 0, 10.0] + [0] * 8},
+    ]}
+    totals = dividends.forecast_totals([forecast], [{'_id': 'p1'}], MONTHS, RATES)
+
+    assert totals == {(2025, 3): 10.0, (2025, 4): 10.0}
+    assert dividends.cash_currencies([forecast]) == {'GBP', None}
+
+
+def test_forecasts_saved_before_cash_currencies_count_in_the_base_currency():
+    forecast = {'_id': 'p1', 'monthly': [0, 0, 8.0] + [0] * 9}
+    assert dividends.forecast_totals([forecast], [{'_id': 'p1'}], MONTHS, RATES) == {(2025, 3): 8.0, (2025, 4): 0}
+
+
+def test_received_dividends_are_summed_per_currency():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db['investment_transactions']
+    collection.insert_many([
+        dividend((3, 3), 'AAPL', 5.0, 'USD', total=4.0, total_currency='GBP'),
+        dividend((3, 4), 'AAPL', 5.0, 'USD'),
+        dividend((4, 4), 'SAP', 2.0, 'EUR'),
+    ])
+    groups = list(collection.aggregate(
+        dividends.received_totals_pipeline(date(2025, 1, 1), date(2025, 12, 31), [{'_id': 'p1'}])
+    ))
+
+    assert totals_by_month(groups, RATES) == {(2025, 3): 4.0 * 1.25 + 5.0, (2025, 4): 2.0 * 1.1}
+
+
+def test_dividends_endpoint_does_not_store_a_forecast(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    import database
+    monkeypatch.setenv('CACHE_WATCH', 'off')
+    database.use_client(mongomock.MongoClient(), 'test_dividends')
+    from app import app
+
+    client = app.test_client()
+    portfolio_id = client.post('/api/investment-portfolio', json={
+        'name': 'P', 'current_value': 1000, 'start_date': '2025-01-01'
+    }).get_json()['id']
+    database.db['investment_transactions'].insert_one(dict(
+        dividend((3, 3), 'AAPL', 5.0, 'USD', total=4.0, total_currency='GBP'), portfolio_id=portfolio_id,
+        date=datetime.now()
+    ))
+    response = client.get(f'/api/investment-portfolio/{portfolio_id}/dividends')
+
+    assert response.status_code == 200
+    assert response.get_json()['cash'][0]['ttm_received'] == 4.0
+    assert database.db[dividends.FORECAST_COLLECTION].count_documents({}) == 0
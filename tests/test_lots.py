@@ -0,0 +1,34 @@
+"""Cost basis lots and realized P&L (lots.py)"""
+from datetime import datetime
+
+import pytest
+
+from lots import LotBook
+
+
+def transaction(day, action, shares, amount):
+    return {'ticker': 'AAPL', 'date': datetime(2025, 1, day), 'action': action, 'shares': shares, 'amount': amount}
+
+
+@pytest.mark.parametrize('method', ['fifo', 'average'])
+def test_selling_more_than_held_realizes_only_the_matched_shares(method):
+    book = LotBook(method)
+    book.apply([transaction(1, 'buy', 1, 100.0), transaction(2, 'sell', 10, 1500.0)])
+    position = book.report({'AAPL': 150.0})['positions']['AAPL']
+
+    # One share bought at 100 and sold at 150; the other nine predate the history
+    assert position['realized_pnl'] == 50.0
+    assert position['unmatched_shares'] == 9
+    assert position['shares'] == 0
+
+
+def test_fifo_sell_consumes_the_oldest_lots():
+    book = LotBook('fifo')
+    book.apply([
+        transaction(1, 'buy', 2, 200.0), transaction(2, 'buy', 2, 300.0), transaction(3, 'sell', 3, 600.0)
+    ])
+    position = book.report({'AAPL': 150.0})['positions']['AAPL']
+
+    assert position['realized_pnl'] == 600.0 - 200.0 - 150.0
+    assert position['lots'] == [{'shares': 1, 'unit_cost': 150.0}]
+    assert position['unmatched_shares'] == 0
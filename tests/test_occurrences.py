@@ -0,0 +1,75 @@
+"""Occurrence counting of recurring items against a day-by-day enumeration"""
+import calendar
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from ledger import RecurringItem, month_grid
+from timeline import occurrence_days
+from utils import calculate_occurrences_in_range, get_month_starts
+
+ITEMS = 400
+SEED = 45
+
+
+def reference(frequency, start, end, month_start, month_end):
+    """Occurrences of an item in a month, enumerating every day of the month"""
+    days = [day for day in (month_start + timedelta(days=offset) for offset in range((month_end - month_start).days + 1))
+            if start <= day and (end is None or day <= end)]
+    if frequency in ('weekly', 'biweekly'):
+        step = 7 if frequency == 'weekly' else 14
+        return [day for day in days if (day - start).days % step == 0]
+    if not days:
+        return []
+    if frequency == 'monthly':
+        return [days[0]]
+    # Yearly: the anniversary month (February 28 for a February 29 start in common years)
+    if month_start.month != start.month or month_start.year < start.year:
+        return []
+    return [days[0]]
+
+
+def random_items(rng):
+    for index in range(ITEMS):
+        start = date(2020, 1, 1) + timedelta(days=rng.randrange(6 * 366))
+        if rng.random() < 0.1:
+            start = date(rng.choice((2020, 2024)), 2, 29)
+        end = start + timedelta(days=rng.randrange(30, 1500)) if rng.random() < 0.5 else None
+        frequency = rng.choice(('weekly', 'biweekly', 'monthly', 'yearly'))
+        first_month = date(rng.randrange(2019, 2027), rng.randrange(1, 13), 1)
+        yield frequency, start, end, get_month_starts(first_month, rng.randrange(1, 40)), index
+
+
+@pytest.mark.parametrize('seed', [SEED, SEED + 1])
+def test_occurrences_match_enumeration(seed):
+    for frequency, start, end, month_starts, index in random_items(random.Random(seed)):
+        item = RecurringItem({
+            '_id': index, 'name': 'item', 'amount': 1.0, 'frequency': frequency,
+            'start_date': datetime.combine(start, datetime.min.time()),
+            'end_date': datetime.combine(end, datetime.min.time()) if end else None
+        })
+        grid = month_grid(month_starts)
+        expected = [
+            reference(frequency, start, end, month_start,
+                      date(month_start.year, month_start.month, calendar.monthrange(month_start.year, month_start.month)[1]))
+            for month_start in month_starts
+        ]
+        counts = [len(days) for days in expected]
+        context = (frequency, start, end, month_starts[0], len(month_starts))
+
+        assert item.occurrences_by_month(grid) == counts, context
+        assert [item.occurrences(first, last) for first, last in grid] == counts, context
+        assert [
+            calculate_occurrences_in_range(start, end, frequency, date.fromordinal(first), date.fromordinal(last))
+            for first, last in grid
+        ] == counts, context
+
+        placed = occurrence_days(item, month_starts, {}, 'income')
+        if frequency in ('weekly', 'biweekly'):
+            assert placed == [day.toordinal() for days in expected for day in days], context
+        else:
+            assert len(placed) == sum(counts), context
+            for ordinal in placed:
+                day = date.fromordinal(ordinal)
+                assert counts[month_starts.index(day.replace(day=1))] == 1, context
@@ -0,0 +1,108 @@
+"""Incremental detection of recurring one-time entries (recurrence.py)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import database
+import recurrence
+
+
+@pytest.fixture
+def db():
+    database.use_client(mongomock.MongoClient(), 'test_recurrence')
+    return database.db
+
+
+def add_expense(db, name, amount, date, created_at):
+    return db['one_time_expense'].insert_one({
+        'name': name, 'amount': amount, 'date': date, 'category': 'bills', 'created_at': created_at
+    }).inserted_id
+
+
+def monthly(db, name, amount, months, created_at):
+    return [add_expense(db, name, amount, datetime(2025, 1, 5) + timedelta(days=30 * i), created_at)
+            for i in range(months)]
+
+
+def candidate(db, name, amount):
+    return db[recurrence.CANDIDATES_COLLECTION].find_one({'_id': recurrence.candidate_id('expense', name, amount)})
+
+
+def test_scan_only_reads_new_entries(db):
+    now = datetime.utcnow()
+    monthly(db, 'Gym', 30, 4, now - timedelta(hours=1))
+    assert recurrence.scan('expense') == 4
+    assert recurrence.scan('expense') == 0
+
+    add_expense(db, 'Gym', 30, datetime(2025, 5, 5), now)
+    assert recurrence.scan('expense') == 1
+    group = candidate(db, 'Gym', 30)
+    assert group['count'] == 5
+    assert group['frequency'] == 'monthly'
+
+
+def test_late_commit_within_overlap_is_scanned(db):
+    now = datetime.utcnow()
+    monthly(db, 'Gym', 30, 3, now)
+    recurrence.scan('expense')
+
+    # Stamped before the watermark by another worker, committed after the scan
+    add_expense(db, 'Gym', 30, datetime(2025, 4, 5), now - recurrence.SCAN_OVERLAP / 2)
+    assert recurrence.scan('expense') == 1
+    assert candidate(db, 'Gym', 30)['count'] == 4
+
+
+def test_edit_moves_entry_to_its_new_group(db):
+    now = datetime.utcnow()
+    ids = monthly(db, 'Rent', 900, 3, now)
+    recurrence.scan('expense')
+    assert candidate(db, 'Rent', 900)['frequency'] == 'monthly'
+
+    before = db['one_time_expense'].find_one({'_id': ids[-1]})
+    after = dict(before, name='Plumber', amount=120)
+    db['one_time_expense'].replace_one({'_id': before['_id']}, after)
+    recurrence.record_entry_change('expense', before=before, after=after)
+
+    rent = candidate(db, 'Rent', 900)
+    assert rent['count'] == 2
+    assert rent['frequency'] is None
+    assert [entry['id'] for entry in candidate(db, 'Plumber', 120)['entries']] == [before['_id']]
+    # The next scan does not count the edited entry again
+    assert recurrence.scan('expense') == 0
+
+
+def test_deleted_entries_leave_their_group(db):
+    now = datetime.utcnow()
+    ids = monthly(db, 'Netflix', 12, 3, now)
+    recurrence.scan('expense')
+
+    for entry_id in ids:
+        deleted = db['one_time_expense'].find_one_and_delete({'_id': entry_id})
+        recurrence.record_entry_change('expense', before=deleted)
+
+    assert candidate(db, 'Netflix', 12) is None
+    assert recurrence.suggestions('expense') == []
+
+
+def test_writes_scan_and_listing_only_reads(db, monkeypatch):
+    monkeypatch.setenv('CACHE_WATCH', 'off')
+    from app import app
+
+    client = app.test_client()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for months_ago in (2, 1, 0):
+        client.post('/api/one-time-expense', json={
+            'name': 'Gym', 'amount': 30, 'category': 'health',
+            'date': (today - timedelta(days=30 * months_ago)).strftime('%Y-%m-%d')
+        })
+    assert [s['item']['name'] for s in client.get('/api/recurring-suggestions').get_json()['suggestions']] == ['Gym']
+
+    # Written around the API: only a scan (flask detect-recurring) picks them up, not the listing
+    monthly(db, 'Rent', 900, 3, datetime.utcnow())
+    scanned = db[recurrence.SCAN_COLLECTION].find_one({'_id': 'one_time_expense'})
+    client.get('/api/recurring-suggestions')
+    assert db[recurrence.SCAN_COLLECTION].find_one({'_id': 'one_time_expense'}) == scanned
+    assert candidate(db, 'Rent', 900) is None
+    assert recurrence.scan_all()['expense'] == 3
@@ -0,0 +1,55 @@
+"""Realized return estimates (returns.py)"""
+from datetime import date, datetime, timedelta
+
+from returns import MIN_HISTORY_DAYS, estimate, realized_return_percent
+
+
+def snapshot(day, value):
+    return {'date': datetime.combine(day, datetime.min.time()), 'value': value}
+
+
+def buy(day, amount, total=None):
+    return {'date': datetime.combine(day, datetime.min.time()), 'action': 'buy', 'amount': amount, 'total': total}
+
+
+def test_short_snapshot_window_is_not_annualized_into_projections():
+    today = date(2025, 6, 30)
+    snapshots = [snapshot(today - timedelta(days=3), 1000.0), snapshot(today, 1015.0)]
+    transactions = [buy(today - timedelta(days=365), 1000.0)]
+    estimates = estimate({'current_value': 1015.0}, snapshots, transactions, today=today)
+
+    assert estimates['snapshot_days'] == 3
+    assert estimates['history_days'] >= MIN_HISTORY_DAYS
+    assert estimates['twr_annualized_percent'] > 100
+    # The transactions span a year, so the XIRR is used instead of the 3-day TWR
+    assert realized_return_percent(estimates) == estimates['xirr_percent']
+    assert abs(estimates['xirr_percent'] - 1.5) < 0.1
+
+
+def test_twr_is_used_with_enough_snapshots():
+    today = date(2025, 6, 30)
+    start = today - timedelta(days=365)
+    snapshots = [snapshot(start, 1000.0), snapshot(today, 1100.0)]
+    estimates = estimate({'current_value': 1100.0}, snapshots, [], today=today)
+
+    assert estimates['snapshot_days'] == 365
+    assert realized_return_percent(estimates) == estimates['twr_annualized_percent']
+    assert abs(estimates['twr_annualized_percent'] - 10.0) < 0.1
+
+
+def test_not_enough_history():
+    today = date(2025, 6, 30)
+    snapshots = [snapshot(today - timedelta(days=10), 1000.0), snapshot(today, 1010.0)]
+    estimates = estimate({'current_value': 1010.0}, snapshots, [], today=today)
+
+    assert realized_return_percent(estimates) is None
+    assert realized_return_percent(None) is None
+
+
+def test_flows_use_the_account_currency_total():
+    today = date(2025, 6, 30)
+    # 10 shares at 125 USD, paid 1000 in the GBP account; worth 1100 GBP a year later
+    transactions = [buy(today - timedelta(days=365), 1250.0, total=1000.0)]
+    estimates = estimate({'current_value': 1100.0}, [], transactions, today=today)
+
+    assert abs(estimates['xirr_percent'] - 10.0) < 0.1
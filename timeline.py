@@ -0,0 +1,195 @@
+"""
+Day-by-day cash flow from the current month on.
+
+Monthly projections hide the dips between paydays. The timeline places every
+recurring occurrence on its actual day (the item's payday, or the adjusted
+day of a payday adjustment) and every projected one-time item on its date,
+as amounts in a per-day delta array indexed by day ordinal. The running
+balance is one itertools.accumulate pass over that array, so years of daily
+balances cost a few list operations per item rather than work per day.
+"""
+import calendar
+from bisect import bisect_right
+from datetime import date, datetime
+from itertools import accumulate
+from cache import cached
+from utils import get_month_starts, one_time_query
+
+TIMELINE_COLLECTIONS = (
+    'recurring_income', 'one_time_income', 'recurring_expense', 'one_time_expense',
+    'payday_adjustment', 'settings', 'fx_rates'
+)
+
+# Longest timeline that can be requested
+MAX_MONTHS = 120
+
+
+def daily_totals_pipeline(query):
+    """Aggregation pipeline totalling the amounts of the matched one-time items per day and currency"""
+    return [
+        {'$match': query},
+        {'$group': {
+            '_id': {
+                'year': {'$year': '$date'}, 'month': {'$month': '$date'}, 'day': {'$dayOfMonth': '$date'},
+                'currency': '$currency'
+            },
+            'total': {'$sum': '$amount'}
+        }}
+    ]
+
+
+def daily_totals(groups, rates=None):
+    """Map the results of daily_totals_pipeline() to {day ordinal: total}, converted with an fx.RateTable if given"""
+    totals = {}
+    for group in groups:
+        key = group['_id']
+        ordinal = date(key['year'], key['month'], key['day']).toordinal()
+        total = float(group['total'])
+        if rates is not None:
+            total *= rates.factor(key.get('currency'), (key['year'], key['month']))
+        totals[ordinal] = totals.get(ordinal, 0) + total
+    return totals
+
+
+def _clamped_day(year, month, day):
+    return min(day, calendar.monthrange(year, month)[1])
+
+
+def occurrence_days(item, month_starts, adjusted_days, recurring_type):
+    """
+    Ordinals of the days the item is paid within the months.
+
+    Monthly items are paid once in each month they are active, on their
+    payday (the start date's day without one); yearly items on the
+    anniversary of their start date. Payday adjustments move either to the
+    adjusted day. Weekly and biweekly items are paid every 7 or 14 days from
+    their start date.
+    """
+    first_ordinal = month_starts[0].toordinal()
+    last_month = month_starts[-1]
+    last_ordinal = date(last_month.year, last_month.month,
+                        calendar.monthrange(last_month.year, last_month.month)[1]).toordinal()
+    start_ordinal = max(item.start_ordinal, first_ordinal)
+    end_ordinal = min(item.end_ordinal, last_ordinal)
+    if start_ordinal > end_ordinal:
+        return []
+
+    frequency = item.frequency
+    if frequency in ('weekly', 'biweekly'):
+        step = 7 if frequency == 'weekly' else 14
+        # First occurrence on or after start_ordinal, in phase with the item's start date
+        first = start_ordinal + (item.start_ordinal - start_ordinal) % step
+        return list(range(first, end_ordinal + 1, step))
+
+    start_date = date.fromordinal(item.start_ordinal)
+    days = []
+    for month_start in month_starts:
+        year, month = month_start.year, month_start.month
+        month_end = date(year, month, calendar.monthrange(year, month)[1]).toordinal()
+        if item.start_ordinal > month_end or item.end_ordinal < month_start.toordinal():
+            continue
+        if frequency == 'yearly' and month != start_date.month:
+            continue
+        day = adjusted_days.get((recurring_type, item.item_id, year, month))
+        if day is None:
+            day = item.payday if frequency == 'monthly' and item.payday else start_date.day
+        days.append(date(year, month, _clamped_day(year, month, int(day))).toordinal())
+    return days
+
+
+def build_timeline(month_starts, recurring_incomes, recurring_expenses,
+                   one_time_income_days, one_time_expense_days, adjustments, opening_balance=0, rates=None):
+    """
+    Daily income, expenses and balance over the months, and the lowest balance of each month.
+
+    One-time totals are dicts keyed by day ordinal, see daily_totals().
+    Recurring items in other currencies are converted with the fx.RateTable
+    rates, at the factor of the month they occur in.
+    """
+    first_ordinal = month_starts[0].toordinal()
+    last_month = month_starts[-1]
+    day_count = date(last_month.year, last_month.month,
+                     calendar.monthrange(last_month.year, last_month.month)[1]).toordinal() - first_ordinal + 1
+    adjusted_days = {
+        (adjustment['recurring_type'], adjustment['recurring_id'], adjustment['year'], adjustment['month']):
+            adjustment['adjusted_day']
+        for adjustment in adjustments
+    }
+
+    month_ordinals = [month_start.toordinal() for month_start in month_starts]
+
+    income = [0.0] * day_count
+    expenses = [0.0] * day_count
+    for items, deltas, recurring_type in ((recurring_incomes, income, 'income'),
+                                          (recurring_expenses, expenses, 'expense')):
+        for item in items:
+            factors = rates.month_factors(item.currency) if rates is not None else None
+            for ordinal in occurrence_days(item, month_starts, adjusted_days, recurring_type):
+                if factors is None:
+                    deltas[ordinal - first_ordinal] += item.amount
+                else:
+                    deltas[ordinal - first_ordinal] += item.amount * factors[bisect_right(month_ordinals, ordinal) - 1]
+    for totals, deltas in ((one_time_income_days, income), (one_time_expense_days, expenses)):
+        for ordinal, total in totals.items():
+            if 0 <= ordinal - first_ordinal < day_count:
+                deltas[ordinal - first_ordinal] += total
+
+    balances = list(accumulate((day_income - day_expenses for day_income, day_expenses in zip(income, expenses)),
+                               initial=opening_balance))[1:]
+
+    days = [
+        {
+            'date': date.fromordinal(first_ordinal + index).isoformat(),
+            'income': round(income[index], 2),
+            'expenses': round(expenses[index], 2),
+            'balance': round(balances[index], 2)
+        }
+        for index in range(day_count)
+    ]
+
+    months = []
+    for month_start in month_starts:
+        start = month_start.toordinal() - first_ordinal
+        end = start + calendar.monthrange(month_start.year, month_start.month)[1]
+        month_balances = balances[start:end]
+        lowest = min(range(len(month_balances)), key=month_balances.__getitem__)
+        months.append({
+            'month': month_start.strftime('%Y-%m'),
+            'income': round(sum(income[start:end]), 2),
+            'expenses': round(sum(expenses[start:end]), 2),
+            'min_balance': round(month_balances[lowest], 2),
+            'min_balance_date': date.fromordinal(first_ordinal + start + lowest).isoformat(),
+            'closing_balance': round(month_balances[-1], 2)
+        })
+
+    return {'opening_balance': round(opening_balance, 2), 'days': days, 'months': months}
+
+
+@cached(*TIMELINE_COLLECTIONS)
+def calculate_timeline(months=3):
+    """Daily timeline of the next N months, starting from the current month with the starting balance"""
+    from database import one_time_income_collection, one_time_expense_collection, payday_adjustment_collection
+    from app_settings import get_starting_balance
+    from fx import rate_table
+    from ledger import get_ledger
+
+    month_starts = get_month_starts(datetime.now().date().replace(day=1), months)
+    if not month_starts:
+        return {'opening_balance': 0, 'days': [], 'months': []}
+    last_month = month_starts[-1]
+    last_day = date(last_month.year, last_month.month, calendar.monthrange(last_month.year, last_month.month)[1])
+
+    pipeline = daily_totals_pipeline(one_time_query(month_starts[0], last_day))
+    adjustments = payday_adjustment_collection.find({'year': {'$gte': month_starts[0].year, '$lte': last_day.year}})
+    ledger = get_ledger()
+    rates = rate_table(month_starts, ledger.currencies)
+    return build_timeline(
+        month_starts,
+        ledger.projected_income,
+        ledger.projected_expenses,
+        daily_totals(one_time_income_collection.aggregate(pipeline), rates),
+        daily_totals(one_time_expense_collection.aggregate(pipeline), rates),
+        adjustments,
+        opening_balance=get_starting_balance(),
+        rates=rates
+    )
@@ -0,0 +1,314 @@
+"""Trading212 API client and CSV export importer (imported on first use)"""
+from datetime import datetime
+import csv
+from io import StringIO
+from collections import defaultdict
+import base64
+import requests
+from metrics import TRADING212_SECONDS, TRADING212_ERRORS
+
+
+def _total(row):
+    """
+    The row's Total in the account currency and that currency, or (None, None).
+
+    Newer exports have "Total" and "Currency (Total)" columns, older ones a
+    "Total (EUR)" column named after the currency.
+    """
+    for column, value in row.items():
+        if column and (column == 'Total' or column.startswith('Total (')) and value and value.strip():
+            currency = row.get('Currency (Total)') if column == 'Total' else column[len('Total ('):].rstrip(')')
+            return abs(float(value.strip())), (currency or '').strip().upper() or None
+    return None, None
+
+
+def parse_trading212_csv(csv_data):
+    """
+    Parse Trading212 CSV export and calculate current holdings.
+    
+    Returns a dictionary with:
+    - holdings: dict of {ticker: {shares, avg_price, name, isin, last_transaction_date, dividends}}
+    - transactions: list of all processed transactions
+    - summary: statistics about the import
+    """
+    reader = csv.DictReader(StringIO(csv_data))
+    
+    # Track holdings per ticker
+    holdings = defaultdict(lambda: {
+        'shares': 0.0,
+        'total_cost': 0.0,
+        'avg_price': 0.0,
+        'name': '',
+        'isin': '',
+        'ticker': '',
+        'last_transaction_date': None,
+        'dividends': 0.0,
+        'transactions': []
+    })
+    
+    transactions = []
+    stats = {
+        'total_rows': 0,
+        'market_buys': 0,
+        'market_sells': 0,
+        'dividends': 0,
+        'deposits': 0,
+        'other': 0,
+        'errors': []
+    }
+    
+    for row in reader:
+        stats['total_rows'] += 1
+        action = row.get('Action', '').strip()
+        
+        # Skip non-stock transactions
+        if action in ['Deposit', 'Interest on cash', 'Lending interest', 'Currency conversion fee']:
+            if action == 'Deposit':
+                stats['deposits'] += 1
+            else:
+                stats['other'] += 1
+            continue
+        
+        # Process stock transactions
+        ticker = row.get('Ticker', '').strip()
+        if not ticker:
+            continue
+            
+        try:
+            shares_str = row.get('No. of shares', '0').strip()
+            shares = float(shares_str) if shares_str else 0.0
+            
+            price_str = row.get('Price / share', '0').strip()
+            price = float(price_str) if price_str else 0.0
+            
+            # Parse transaction date
+            time_str = row.get('Time', '').strip()
+            transaction_date = None
+            if time_str:
+                try:
+                    transaction_date = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    try:
+                        transaction_date = datetime.strptime(time_str.split()[0], '%Y-%m-%d')
+                    except ValueError:
+                        transaction_date = datetime.utcnow()
+            else:
+                transaction_date = datetime.utcnow()
+            
+            name = row.get('Name', '').strip()
+            isin = row.get('ISIN', '').strip()
+            total, total_currency = _total(row)
+            # Price / share is in the instrument's currency, Total in the account's
+            currency = (row.get('Currency (Price / share)') or '').strip() or None
+            
+            # Process based on action type
+            if action == 'Market buy':
+                stats['market_buys'] += 1
+                holdings[ticker]['shares'] += shares
+                holdings[ticker]['total_cost'] += shares * price
+                holdings[ticker]['name'] = name
+                holdings[ticker]['isin'] = isin
+                holdings[ticker]['ticker'] = ticker
+                holdings[ticker]['last_transaction_date'] = transaction_date
+                holdings[ticker]['transactions'].append({
+                    'action': 'buy',
+                    'shares': shares,
+                    'price': price,
+                    'date': transaction_date
+                })
+                
+            elif action == 'Market sell':
+                stats['market_sells'] += 1
+                # Sold shares leave at the average cost, so the average of the rest is unchanged
+                held = holdings[ticker]['shares']
+                holdings[ticker]['shares'] -= shares
+                if holdings[ticker]['shares'] > 0 and held > 0:
+                    holdings[ticker]['total_cost'] -= holdings[ticker]['total_cost'] * shares / held
+                else:
+                    holdings[ticker]['total_cost'] = 0
+                holdings[ticker]['name'] = name
+                holdings[ticker]['isin'] = isin
+                holdings[ticker]['ticker'] = ticker
+                holdings[ticker]['last_transaction_date'] = transaction_date
+                holdings[ticker]['transactions'].append({
+                    'action': 'sell',
+                    'shares': shares,
+                    'price': price,
+                    'date': transaction_date
+                })
+                
+            elif 'Dividend' in action:
+                stats['dividends'] += 1
+                # Dividends don't affect share count
+                holdings[ticker]['dividends'] += total if total is not None else shares * price
+                holdings[ticker]['name'] = name
+                holdings[ticker]['isin'] = isin
+                holdings[ticker]['ticker'] = ticker
+                
+            transactions.append({
+                'action': action,
+                'ticker': ticker,
+                'name': name,
+                'shares': shares,
+                'price': price,
+                'currency': currency,
+                'total': total,
+                'total_currency': total_currency,
+                'date': transaction_date
+            })
+            
+        except (ValueError, KeyError) as e:
+            stats['errors'].append(f"Error processing row {stats['total_rows']}: {str(e)}")
+            continue
+    
+    # Calculate average prices and filter out zero holdings
+    final_holdings = {}
+    for ticker, data in holdings.items():
+        if data['shares'] > 0.001:  # Keep only positive holdings (accounting for float precision)
+            if data['total_cost'] > 0:
+                data['avg_price'] = data['total_cost'] / data['shares']
+            else:
+                # If we don't have cost data, use the last transaction price
+                if data['transactions']:
+                    data['avg_price'] = data['transactions'][-1]['price']
+                else:
+                    data['avg_price'] = 0.0
+            
+            final_holdings[ticker] = {
+                'ticker': ticker,
+                'name': data['name'],
+                'isin': data['isin'],
+                'shares': round(data['shares'], 6),
+                'avg_price': round(data['avg_price'], 2),
+                'last_transaction_date': data['last_transaction_date'],
+                'dividends': round(data['dividends'], 2)
+            }
+    
+    return {
+        'holdings': final_holdings,
+        'transactions': transactions,
+        'summary': stats
+    }
+
+
+class Trading212Client:
+    """
+    Client for interacting with Trading212 Public API.
+    Based on: https://docs.trading212.com/api/section/general-information/quickstart
+    """
+    
+    def __init__(self, api_key, api_secret, environment='live'):
+        """
+        Initialize Trading212 API client.
+        
+        Args:
+            api_key: Your Trading212 API key
+            api_secret: Your Trading212 API secret
+            environment: 'live' or 'demo' (paper trading)
+        """
+        self.api_key = api_key
+        self.api_secret = api_secret
+        
+        # Set base URL based on environment
+        if environment == 'demo':
+            self.base_url = 'https://demo.trading212.com/api/v0'
+        else:
+            self.base_url = 'https://live.trading212.com/api/v0'
+        
+        # Create authorization header
+        credentials = f"{api_key}:{api_secret}"
+        encoded = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
+        self.headers = {
+            'Authorization': f'Basic {encoded}',
+            'Content-Type': 'application/json'
+        }
+    
+    def _make_request(self, method, endpoint, **kwargs):
+        """Make HTTP request to Trading212 API"""
+        url = f"{self.base_url}{endpoint}"
+        try:
+            with TRADING212_SECONDS.time(endpoint=endpoint):
+                response = requests.request(method, url, headers=self.headers, **kwargs)
+                response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            TRADING212_ERRORS.inc(endpoint=endpoint)
+            raise Exception(f"Trading212 API error: {str(e)}")
+    
+    def get_account_summary(self):
+        """Get account summary including cash balance"""
+        return self._make_request('GET', '/equity/account/summary')
+    
+    def get_positions(self):
+        """
+        Get all current positions.
+        Returns list of positions with ticker, quantity, average price, current price, etc.
+        """
+        return self._make_request('GET', '/equity/positions')
+    
+    def get_instruments(self):
+        """Get list of all tradable instruments"""
+        return self._make_request('GET', '/equity/metadata/instruments')
+    
+    def get_exchanges(self):
+        """Get list of all exchanges"""
+        return self._make_request('GET', '/equity/metadata/exchanges')
+    
+    def get_historical_orders(self, limit=50, cursor=None):
+        """
+        Get historical orders with pagination.
+        
+        Args:
+            limit: Number of orders to return (max 50)
+            cursor: Pagination cursor from previous response
+        """
+        params = {'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        return self._make_request('GET', '/equity/history/orders', params=params)
+    
+    def place_market_order(self, ticker, quantity):
+        """
+        Place a market order.
+        
+        Args:
+            ticker: Instrument ticker (e.g., 'AAPL_US_EQ')
+            quantity: Number of shares (negative for sell)
+        
+        Note: Only available in live environment
+        """
+        data = {
+            'ticker': ticker,
+            'quantity': quantity
+        }
+        return self._make_request('POST', '/equity/orders/market', json=data)
+    
+    def get_position_by_ticker(self, ticker):
+        """
+        Get current position for a specific ticker.
+        
+        Args:
+            ticker: The instrument ticker
+            
+        Returns:
+            Position data or None if not found
+        """
+        positions = self.get_positions()
+        for position in positions:
+            if position.get('ticker') == ticker:
+                return position
+        return None
+
+
+def get_trading212_client():
+    """
+    Get Trading212 API client from database settings.
+    Returns None if not configured.
+    """
+    from app_settings import get_trading212_credentials
+    
+    credentials = get_trading212_credentials()
+    if not credentials:
+        return None
+    
+    return Trading212Client(**credentials)
@@ -1,11 +1,9 @@
 """Utility functions for calculations"""
+import calendar
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-import csv
-from io import StringIO
-from collections import defaultdict
-import base64
-import requests
+from cache import cached
+from metrics import timed_projection
 
 def get_next_occurrence(start_date, frequency, current_date=None):
     """Calculate next occurrence based on frequency"""
@@ -40,14 +38,13 @@ def calculate_occurrences_in_range(start_date, end_date, frequency, range_start,
         if start_date <= range_end and (not end_date or end_date >= range_start):
             return 1
         return 0
-    elif frequency == 'weekly':
-        # Calculate number of weeks in the range
-        delta = actual_end - actual_start
-        return (delta.days // 7) + 1
-    elif frequency == 'biweekly':
-        # Calculate number of bi-weeks in the range
-        delta = actual_end - actual_start
-        return (delta.days // 14) + 1
+    elif frequency in ('weekly', 'biweekly'):
+        # Occurrences fall every 7 or 14 days from start_date: count those in the range
+        step = 7 if frequency == 'weekly' else 14
+        first = actual_start + timedelta(days=(start_date - actual_start).days % step)
+        if first > actual_end:
+            return 0
+        return (actual_end - first).days // step + 1
     elif frequency == 'yearly':
         # A yearly recurring item occurs once per year
         # Check if it should occur in this date range
@@ -55,7 +52,10 @@ def calculate_occurrences_in_range(start_date, end_date, frequency, range_start,
             # Check if the anniversary falls within the range
             years_diff = range_start.year - start_date.year
             if years_diff >= 0:
-                anniversary = start_date.replace(year=range_start.year)
+                if start_date.month == 2 and start_date.day == 29 and not calendar.isleap(range_start.year):
+                    anniversary = start_date.replace(year=range_start.year, day=28)
+                else:
+                    anniversary = start_date.replace(year=range_start.year)
                 if range_start <= anniversary <= range_end:
                     return 1
             return 0
@@ -63,410 +63,360 @@ def calculate_occurrences_in_range(start_date, end_date, frequency, range_start,
     
     return 0
 
-def calculate_monthly_projections(months=12):
-    """Calculate financial projections for the next N months"""
-    from database import (
-        recurring_income_collection, one_time_income_collection,
-        recurring_expense_collection, one_time_expense_collection, db, settings_collection
-    )
-    
+# Recurring items that count towards projections (upcoming items are excluded)
+PROJECTED_RECURRING_QUERY = {'active': True, 'upcoming': {'$ne': True}}
+
+# Collections the projections are derived from
+PROJECTION_COLLECTIONS = (
+    'recurring_income', 'one_time_income', 'recurring_expense', 'one_time_expense',
+    'investment_portfolio', 'portfolio_snapshots', 'investment_transactions', 'dividend_forecast',
+    'settings', 'fx_rates'
+)
+
+class InvalidDate(ValueError):
+    """A request date that is missing or not in YYYY-MM-DD format (answered with 400)"""
+
+def parse_date(data, field, required=True):
+    """Parse data[field] (YYYY-MM-DD) into a datetime; empty optional fields give None"""
+    value = data.get(field)
+    if not value:
+        if required:
+            raise InvalidDate(f'{field} is required')
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise InvalidDate(f'{field} must be a date in YYYY-MM-DD format')
+
+def to_date(value):
+    """Convert a stored date (a BSON date, see database.DATE_FIELDS) to a date"""
+    return value.date()
+
+def get_month_end(month_start):
+    return month_start + relativedelta(months=1) - timedelta(days=1)
+
+def get_month_starts(first_month, months):
+    return [first_month + relativedelta(months=i) for i in range(months)]
+
+def one_time_query(range_start=None, range_end=None):
+    """MongoDB filter for projected one-time items, optionally dated within [range_start, range_end]"""
+    query = {'upcoming': {'$ne': True}}
+    if range_start and range_end:
+        query['date'] = {
+            '$gte': datetime.combine(range_start, datetime.min.time()),
+            '$lte': datetime.combine(range_end, datetime.max.time())
+        }
+    return query
+
+def monthly_totals_pipeline(query):
+    """
+    Aggregation pipeline totalling the amounts of the matched one-time items per month and currency.
+
+    Groups on $year/$month rather than $dateTrunc, which needs MongoDB 5.0.
+    Items in the base currency have no currency in their group _id.
+    """
+    return [
+        {'$match': query},
+        {'$group': {
+            '_id': {'year': {'$year': '$date'}, 'month': {'$month': '$date'}, 'currency': '$currency'},
+            'total': {'$sum': '$amount'}
+        }}
+    ]
+
+def totals_by_month(groups, rates=None):
+    """
+    Map the results of monthly_totals_pipeline() to {(year, month): total}.
+
+    With an fx.RateTable the totals of each currency are converted to the
+    base currency; without one all amounts are summed as they are.
+    """
+    totals = {}
+    for group in groups:
+        key = (group['_id']['year'], group['_id']['month'])
+        total = float(group['total'])
+        if rates is not None:
+            total *= rates.factor(group['_id'].get('currency'), key)
+        totals[key] = totals.get(key, 0) + total
+    return totals
+
+def totals_by_month_and_currency(groups):
+    """Map the results of monthly_totals_pipeline() to {(year, month): {currency: total}}"""
+    totals = {}
+    for group in groups:
+        key = (group['_id']['year'], group['_id']['month'])
+        month_totals = totals.setdefault(key, {})
+        currency = group['_id'].get('currency')
+        month_totals[currency] = month_totals.get(currency, 0) + float(group['total'])
+    return totals
+
+@timed_projection('cashflow', lambda month_starts, *args, **kwargs: len(month_starts))
+def project_months(month_starts, recurring_incomes, recurring_expenses,
+                   one_time_income_totals, one_time_expense_totals, portfolios,
+                   starting_balance=None, rates=None, dividend_totals=None):
+    """
+    Project income and expenses for consecutive months.
+
+    recurring_incomes and recurring_expenses are ledger.RecurringItem lists.
+    One-time totals are dicts keyed by (year, month), see totals_by_month().
+    rates is the fx.RateTable of the months when items are kept in other
+    currencies (the one-time totals must already be converted). Investment
+    growth is compounded from each portfolio's current value at the first
+    month. dividend_totals are the dividends paid out per (year, month), see
+    dividends.py; they count as income, so the portfolios' returns must
+    exclude them (dividends.price_returns()). If starting_balance is given, each
+    month also gets the running cumulative_balance.
+    """
+    # Portfolio value before the first month: [value, monthly contribution, monthly return]
+    growth = []
+    for portfolio in portfolios:
+        annual_return = portfolio.get('mean_return_percent', 7.0) / 100
+        growth.append([
+            portfolio.get('current_value', 0),
+            portfolio.get('monthly_contribution', 0),
+            (1 + annual_return) ** (1/12) - 1
+        ])
+
+    from ledger import month_grid, recurring_totals
+
+    grid = month_grid(month_starts)
+    recurring_income_totals = recurring_totals(recurring_incomes, grid, rates)
+    recurring_expense_totals = recurring_totals(recurring_expenses, grid, rates)
+
     projections = []
-    today = datetime.now().date()
-    
-    # Get starting balance from settings (if exists)
-    settings = settings_collection.find_one()
-    cumulative_balance = settings.get('starting_balance', 0) if settings else 0
-    
-    # Start from the first day of the current month
-    current_month_start = today.replace(day=1)
-    
-    # Get investment portfolios
-    investment_portfolios = list(db['investment_portfolio'].find({'active': True}))
-    
-    for i in range(months):
-        month_start = current_month_start + relativedelta(months=i)
-        month_end = month_start + relativedelta(months=1) - timedelta(days=1)
-        
-        # Convert to datetime for MongoDB queries
-        month_start_dt = datetime.combine(month_start, datetime.min.time())
-        month_end_dt = datetime.combine(month_end, datetime.max.time())
-        
-        # Calculate recurring income (exclude upcoming items)
-        recurring_incomes = list(recurring_income_collection.find({'active': True, 'upcoming': {'$ne': True}}))
-        total_recurring_income = 0
-        for income in recurring_incomes:
-            start_date = income['start_date'] if isinstance(income['start_date'], datetime) else datetime.fromisoformat(income['start_date'])
-            if isinstance(start_date, datetime):
-                start_date = start_date.date()
-            end_date = income.get('end_date')
-            if end_date:
-                end_date = end_date if isinstance(end_date, datetime) else datetime.fromisoformat(end_date)
-                if isinstance(end_date, datetime):
-                    end_date = end_date.date()
-            
-            occurrences = calculate_occurrences_in_range(
-                start_date, end_date, income['frequency'],
-                month_start, month_end
-            )
-            total_recurring_income += income['amount'] * occurrences
-        
-        # Calculate one-time income (exclude upcoming items)
-        one_time_incomes = list(one_time_income_collection.find({
-            'date': {'$gte': month_start_dt, '$lte': month_end_dt},
-            'upcoming': {'$ne': True}
-        }))
-        total_one_time_income = sum(income['amount'] for income in one_time_incomes)
-        
-        # Calculate investment income (monthly returns)
+    cumulative_balance = starting_balance
+    for i, month_start in enumerate(month_starts):
+        month_key = (month_start.year, month_start.month)
+
+        total_recurring_income = recurring_income_totals[i]
+
+        total_one_time_income = one_time_income_totals.get(month_key, 0)
+
+        total_dividend_income = dividend_totals.get(month_key, 0) if dividend_totals else 0
+
+        # Investment income is the monthly return on each portfolio
         total_investment_income = 0
-        for portfolio in investment_portfolios:
-            current_value = portfolio.get('current_value', 0)
-            monthly_contrib = portfolio.get('monthly_contribution', 0)
-            annual_return = portfolio.get('mean_return_percent', 7.0) / 100
-            monthly_return = (1 + annual_return) ** (1/12) - 1
-            
-            # Calculate value for this month
-            for month in range(i + 1):
-                current_value = (current_value + monthly_contrib) * (1 + monthly_return)
-            
-            # Monthly gain is the return on current value
+        for state in growth:
+            prev_value, monthly_contrib, monthly_return = state
+            current_value = (prev_value + monthly_contrib) * (1 + monthly_return)
             if i > 0:
-                prev_value = portfolio.get('current_value', 0)
-                for month in range(i):
-                    prev_value = (prev_value + monthly_contrib) * (1 + monthly_return)
-                monthly_gain = current_value - prev_value - monthly_contrib
-                total_investment_income += monthly_gain
-        
-        # Calculate recurring expenses (exclude upcoming items)
-        recurring_expenses = list(recurring_expense_collection.find({'active': True, 'upcoming': {'$ne': True}}))
-        total_recurring_expenses = 0
-        for expense in recurring_expenses:
-            start_date = expense['start_date'] if isinstance(expense['start_date'], datetime) else datetime.fromisoformat(expense['start_date'])
-            if isinstance(start_date, datetime):
-                start_date = start_date.date()
-            end_date = expense.get('end_date')
-            if end_date:
-                end_date = end_date if isinstance(end_date, datetime) else datetime.fromisoformat(end_date)
-                if isinstance(end_date, datetime):
-                    end_date = end_date.date()
-            
-            occurrences = calculate_occurrences_in_range(
-                start_date, end_date, expense['frequency'],
-                month_start, month_end
-            )
-            total_recurring_expenses += expense['amount'] * occurrences
-        
-        # Calculate one-time expenses (exclude upcoming items)
-        one_time_expenses = list(one_time_expense_collection.find({
-            'date': {'$gte': month_start_dt, '$lte': month_end_dt},
-            'upcoming': {'$ne': True}
-        }))
-        total_one_time_expenses = sum(expense['amount'] for expense in one_time_expenses)
-        
-        total_income = total_recurring_income + total_one_time_income + total_investment_income
+                total_investment_income += current_value - prev_value - monthly_contrib
+            state[0] = current_value
+
+        total_recurring_expenses = recurring_expense_totals[i]
+
+        total_one_time_expenses = one_time_expense_totals.get(month_key, 0)
+
+        total_income = total_recurring_income + total_one_time_income + total_investment_income + total_dividend_income
         total_expenses = total_recurring_expenses + total_one_time_expenses
         net_amount = total_income - total_expenses
-        
-        # Update cumulative balance
-        cumulative_balance += net_amount
-        
-        projections.append({
+
+        projection = {
             'month': month_start.strftime('%B %Y'),
             'month_date': month_start.isoformat(),
             'total_income': round(total_income, 2),
             'recurring_income': round(total_recurring_income, 2),
             'one_time_income': round(total_one_time_income, 2),
             'investment_income': round(total_investment_income, 2),
+            'dividend_income': round(total_dividend_income, 2),
             'total_expenses': round(total_expenses, 2),
             'recurring_expenses': round(total_recurring_expenses, 2),
             'one_time_expenses': round(total_one_time_expenses, 2),
-            'net_amount': round(net_amount, 2),
-            'cumulative_balance': round(cumulative_balance, 2)
-        })
-    
-    return projections
+            'net_amount': round(net_amount, 2)
+        }
+        if cumulative_balance is not None:
+            cumulative_balance += net_amount
+            projection['cumulative_balance'] = round(cumulative_balance, 2)
+        projections.append(projection)
 
+    return projections
 
-def parse_trading212_csv(csv_data):
-    """
-    Parse Trading212 CSV export and calculate current holdings.
-    
-    Returns a dictionary with:
-    - holdings: dict of {ticker: {shares, avg_price, name, isin, last_transaction_date}}
-    - transactions: list of all processed transactions
-    - summary: statistics about the import
-    """
-    reader = csv.DictReader(StringIO(csv_data))
-    
-    # Track holdings per ticker
-    holdings = defaultdict(lambda: {
-        'shares': 0.0,
-        'total_cost': 0.0,
-        'avg_price': 0.0,
-        'name': '',
-        'isin': '',
-        'ticker': '',
-        'last_transaction_date': None,
-        'transactions': []
-    })
+@timed_projection('investments', lambda portfolios, months: months)
+def project_investments(portfolios, months):
+    """Project the total value of portfolios for the next N months"""
+    growth = []
+    for portfolio in portfolios:
+        annual_return = portfolio.get('mean_return_percent', 7.0) / 100
+        growth.append([
+            portfolio.get('current_value', 0),
+            portfolio.get('monthly_contribution', 0),
+            (1 + annual_return) ** (1/12) - 1
+        ])
     
-    transactions = []
-    stats = {
-        'total_rows': 0,
-        'market_buys': 0,
-        'market_sells': 0,
-        'dividends': 0,
-        'deposits': 0,
-        'other': 0,
-        'errors': []
-    }
-    
-    for row in reader:
-        stats['total_rows'] += 1
-        action = row.get('Action', '').strip()
-        
-        # Skip non-stock transactions
-        if action in ['Deposit', 'Interest on cash', 'Lending interest', 'Currency conversion fee']:
-            if action == 'Deposit':
-                stats['deposits'] += 1
-            else:
-                stats['other'] += 1
-            continue
+    projections = []
+    for i in range(months):
+        month_value = 0
+        month_contributions = 0
+        for state in growth:
+            current_value, monthly_contrib, monthly_return = state
+            current_value = (current_value + monthly_contrib) * (1 + monthly_return)
+            state[0] = current_value
+            month_value += current_value
+            month_contributions += monthly_contrib
         
-        # Process stock transactions
-        ticker = row.get('Ticker', '').strip()
-        if not ticker:
-            continue
-            
-        try:
-            shares_str = row.get('No. of shares', '0').strip()
-            shares = float(shares_str) if shares_str else 0.0
-            
-            price_str = row.get('Price / share', '0').strip()
-            price = float(price_str) if price_str else 0.0
-            
-            # Parse transaction date
-            time_str = row.get('Time', '').strip()
-            transaction_date = None
-            if time_str:
-                try:
-                    transaction_date = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    try:
-                        transaction_date = datetime.strptime(time_str.split()[0], '%Y-%m-%d')
-                    except ValueError:
-                        transaction_date = datetime.utcnow()
-            else:
-                transaction_date = datetime.utcnow()
-            
-            name = row.get('Name', '').strip()
-            isin = row.get('ISIN', '').strip()
-            
-            # Process based on action type
-            if action == 'Market buy':
-                stats['market_buys'] += 1
-                holdings[ticker]['shares'] += shares
-                holdings[ticker]['total_cost'] += shares * price
-                holdings[ticker]['name'] = name
-                holdings[ticker]['isin'] = isin
-                holdings[ticker]['ticker'] = ticker
-                holdings[ticker]['last_transaction_date'] = transaction_date
-                holdings[ticker]['transactions'].append({
-                    'action': 'buy',
-                    'shares': shares,
-                    'price': price,
-                    'date': transaction_date
-                })
-                
-            elif action == 'Market sell':
-                stats['market_sells'] += 1
-                holdings[ticker]['shares'] -= shares
-                # Reduce total cost proportionally
-                if holdings[ticker]['shares'] > 0:
-                    holdings[ticker]['total_cost'] -= shares * price
-                else:
-                    holdings[ticker]['total_cost'] = 0
-                holdings[ticker]['name'] = name
-                holdings[ticker]['isin'] = isin
-                holdings[ticker]['ticker'] = ticker
-                holdings[ticker]['last_transaction_date'] = transaction_date
-                holdings[ticker]['transactions'].append({
-                    'action': 'sell',
-                    'shares': shares,
-                    'price': price,
-                    'date': transaction_date
-                })
-                
-            elif 'Dividend' in action:
-                stats['dividends'] += 1
-                # Dividends don't affect share count
-                holdings[ticker]['name'] = name
-                holdings[ticker]['isin'] = isin
-                holdings[ticker]['ticker'] = ticker
-                
-            transactions.append({
-                'action': action,
-                'ticker': ticker,
-                'name': name,
-                'shares': shares,
-                'price': price,
-                'date': transaction_date
-            })
-            
-        except (ValueError, KeyError) as e:
-            stats['errors'].append(f"Error processing row {stats['total_rows']}: {str(e)}")
-            continue
+        projections.append({
+            'month': i,
+            'value': round(month_value, 2),
+            'monthly_contribution': round(month_contributions, 2)
+        })
+    return projections
+
+def add_cumulative_balance(projections):
+    """Add the running total of net_amount (starting from 0) to each projection"""
+    cumulative = 0
+    for proj in projections:
+        cumulative += proj['net_amount']
+        proj['cumulative_balance'] = round(cumulative, 2)
+    return projections
+
+@cached(*PROJECTION_COLLECTIONS)
+def calculate_monthly_projections(months=12):
+    """Calculate financial projections for the next N months"""
+    from database import db
+    from app_settings import get_starting_balance
+    from dividends import FORECAST_COLLECTION, cash_currencies, forecast_totals, price_returns
+    from fx import rate_table
+    from ledger import get_ledger
+    from returns import with_realized_returns
     
-    # Calculate average prices and filter out zero holdings
-    final_holdings = {}
-    for ticker, data in holdings.items():
-        if data['shares'] > 0.001:  # Keep only positive holdings (accounting for float precision)
-            if data['total_cost'] > 0:
-                data['avg_price'] = data['total_cost'] / data['shares']
-            else:
-                # If we don't have cost data, use the last transaction price
-                if data['transactions']:
-                    data['avg_price'] = data['transactions'][-1]['price']
-                else:
-                    data['avg_price'] = 0.0
-            
-            final_holdings[ticker] = {
-                'ticker': ticker,
-                'name': data['name'],
-                'isin': data['isin'],
-                'shares': round(data['shares'], 6),
-                'avg_price': round(data['avg_price'], 2),
-                'last_transaction_date': data['last_transaction_date']
-            }
+    # Start from the first day of the current month
+    month_starts = get_month_starts(datetime.now().date().replace(day=1), months)
+    if not month_starts:
+        return []
+    ledger = get_ledger()
+    portfolios = list(db['investment_portfolio'].find({'active': True}))
+    forecasts = list(db[FORECAST_COLLECTION].find())
+    rates = rate_table(month_starts, ledger.currencies | cash_currencies(forecasts))
     
-    return {
-        'holdings': final_holdings,
-        'transactions': transactions,
-        'summary': stats
-    }
-
+    return project_months(
+        month_starts,
+        ledger.projected_income,
+        ledger.projected_expenses,
+        ledger.one_time_income.totals_by_month(month_starts, rates),
+        ledger.one_time_expenses.totals_by_month(month_starts, rates),
+        price_returns(with_realized_returns(portfolios), forecasts, rates),
+        starting_balance=get_starting_balance(),
+        rates=rates,
+        dividend_totals=forecast_totals(forecasts, portfolios, month_starts, rates)
+    )
 
-class Trading212Client:
+def get_months_until_now(earliest_items):
     """
-    Client for interacting with Trading212 Public API.
-    Based on: https://docs.trading212.com/api/section/general-information/quickstart
+    Get the months from the earliest transaction up to the current month.
+
+    earliest_items are the earliest recurring income, one-time income,
+    recurring expense and one-time expense documents (or None).
     """
+    recurring_income, one_time_income, recurring_expense, one_time_expense = earliest_items
+    earliest_dates = [to_date(item['start_date']) for item in (recurring_income, recurring_expense) if item]
+    earliest_dates += [to_date(item['date']) for item in (one_time_income, one_time_expense) if item]
+    if not earliest_dates:
+        return []
     
-    def __init__(self, api_key, api_secret, environment='live'):
-        """
-        Initialize Trading212 API client.
-        
-        Args:
-            api_key: Your Trading212 API key
-            api_secret: Your Trading212 API secret
-            environment: 'live' or 'demo' (paper trading)
-        """
-        self.api_key = api_key
-        self.api_secret = api_secret
-        
-        # Set base URL based on environment
-        if environment == 'demo':
-            self.base_url = 'https://demo.trading212.com/api/v0'
-        else:
-            self.base_url = 'https://live.trading212.com/api/v0'
-        
-        # Create authorization header
-        credentials = f"{api_key}:{api_secret}"
-        encoded = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        self.headers = {
-            'Authorization': f'Basic {encoded}',
-            'Content-Type': 'application/json'
-        }
-    
-    def _make_request(self, method, endpoint, **kwargs):
-        """Make HTTP request to Trading212 API"""
-        url = f"{self.base_url}{endpoint}"
-        try:
-            response = requests.request(method, url, headers=self.headers, **kwargs)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Trading212 API error: {str(e)}")
-    
-    def get_account_summary(self):
-        """Get account summary including cash balance"""
-        return self._make_request('GET', '/equity/account/summary')
-    
-    def get_positions(self):
-        """
-        Get all current positions.
-        Returns list of positions with ticker, quantity, average price, current price, etc.
-        """
-        return self._make_request('GET', '/equity/positions')
-    
-    def get_instruments(self):
-        """Get list of all tradable instruments"""
-        return self._make_request('GET', '/equity/metadata/instruments')
-    
-    def get_exchanges(self):
-        """Get list of all exchanges"""
-        return self._make_request('GET', '/equity/metadata/exchanges')
-    
-    def get_historical_orders(self, limit=50, cursor=None):
-        """
-        Get historical orders with pagination.
-        
-        Args:
-            limit: Number of orders to return (max 50)
-            cursor: Pagination cursor from previous response
-        """
-        params = {'limit': limit}
-        if cursor:
-            params['cursor'] = cursor
-        return self._make_request('GET', '/equity/history/orders', params=params)
+    today = datetime.now().date()
+    earliest_date = min(earliest_dates)
+    months_diff = (today.year - earliest_date.year) * 12 + (today.month - earliest_date.month) + 1
+    return get_month_starts(earliest_date.replace(day=1), months_diff)
+
+@cached(*PROJECTION_COLLECTIONS)
+def calculate_projections_until_now():
+    """Calculate projections from earliest transaction until current month"""
+    from database import (
+        recurring_income_collection, one_time_income_collection,
+        recurring_expense_collection, one_time_expense_collection, db
+    )
+    from dividends import FORECAST_COLLECTION, cash_currencies, price_returns, received_totals_pipeline
+    from fx import rate_table
+    from ledger import get_ledger
+    from returns import with_realized_returns
     
-    def place_market_order(self, ticker, quantity):
-        """
-        Place a market order.
-        
-        Args:
-            ticker: Instrument ticker (e.g., 'AAPL_US_EQ')
-            quantity: Number of shares (negative for sell)
-        
-        Note: Only available in live environment
-        """
-        data = {
-            'ticker': ticker,
-            'quantity': quantity
-        }
-        return self._make_request('POST', '/equity/orders/market', json=data)
+    month_starts = get_months_until_now((
+        recurring_income_collection.find_one(sort=[('start_date', 1)]),
+        one_time_income_collection.find_one(sort=[('date', 1)]),
+        recurring_expense_collection.find_one(sort=[('start_date', 1)]),
+        one_time_expense_collection.find_one(sort=[('date', 1)])
+    ))
+    if not month_starts:
+        return []
+    ledger = get_ledger()
+    portfolios = list(db['investment_portfolio'].find({'active': True}))
+    forecasts = list(db[FORECAST_COLLECTION].find())
+    received = list(db['investment_transactions'].aggregate(
+        received_totals_pipeline(month_starts[0], get_month_end(month_starts[-1]), portfolios)
+    ))
+    rates = rate_table(
+        month_starts,
+        ledger.currencies | cash_currencies(forecasts) | {group['_id'].get('currency') for group in received}
+    )
     
-    def get_position_by_ticker(self, ticker):
-        """
-        Get current position for a specific ticker.
-        
-        Args:
-            ticker: The instrument ticker
-            
-        Returns:
-            Position data or None if not found
-        """
-        positions = self.get_positions()
-        for position in positions:
-            if position.get('ticker') == ticker:
-                return position
-        return None
-
+    projections = project_months(
+        month_starts,
+        ledger.projected_income,
+        ledger.projected_expenses,
+        ledger.one_time_income.totals_by_month(month_starts, rates),
+        ledger.one_time_expenses.totals_by_month(month_starts, rates),
+        price_returns(with_realized_returns(portfolios), forecasts, rates),
+        rates=rates,
+        dividend_totals=totals_by_month(received, rates)
+    )
+    return add_cumulative_balance(projections)
 
-def get_trading212_client():
+def build_month_details(year, month, recurring_incomes, one_time_incomes,
+                        recurring_expenses, one_time_expenses, adjustments):
     """
-    Get Trading212 API client from database settings.
-    Returns None if not configured.
+    Build the detailed breakdown of a month.
+
+    recurring_incomes and recurring_expenses are ledger.RecurringItem lists,
+    adjustments are the payday adjustment documents for that month.
     """
-    from database import settings_collection
+    month_start = datetime(year, month, 1).date()
+    range_start = month_start.toordinal()
+    range_end = get_month_end(month_start).toordinal()
+    adjusted_days = {
+        (adjustment['recurring_type'], adjustment['recurring_id']): adjustment['adjusted_day']
+        for adjustment in adjustments
+    }
     
-    settings = settings_collection.find_one({})
-    if not settings or 'trading212_api_key' not in settings:
-        return None
+    def recurring_entry(item, recurring_type):
+        if item.occurrences(range_start, range_end) <= 0:
+            return None
+        key = (recurring_type, item.item_id)
+        entry = {
+            'id': item.item_id,
+            'name': item.name,
+            'amount': item.amount,
+            'frequency': item.frequency,
+            'payday': adjusted_days[key] if key in adjusted_days else item.payday,
+            'has_adjustment': key in adjusted_days
+        }
+        if recurring_type == 'expense':
+            entry['category'] = item.category
+        return entry
     
-    return Trading212Client(
-        api_key=settings['trading212_api_key'],
-        api_secret=settings['trading212_api_secret'],
-        environment=settings.get('trading212_environment', 'live')
-    )
-
+    def one_time_entry(item):
+        item_date = item['date']
+        return {
+            'id': str(item['_id']),
+            'name': item['name'],
+            'amount': item['amount'],
+            'date': item_date.isoformat(),
+            'day': item_date.day,
+            'category': item['category']
+        }
+    
+    details = {
+        'recurring_income': [],
+        'one_time_income': [],
+        'recurring_expenses': [],
+        'one_time_expenses': []
+    }
+    for income in recurring_incomes:
+        entry = recurring_entry(income, 'income')
+        if entry:
+            details['recurring_income'].append(entry)
+    for expense in recurring_expenses:
+        entry = recurring_entry(expense, 'expense')
+        if entry:
+            details['recurring_expenses'].append(entry)
+    details['one_time_income'] = [one_time_entry(income) for income in one_time_incomes]
+    details['one_time_expenses'] = [one_time_entry(expense) for expense in one_time_expenses]
+    return details
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    waitress-serve --port=8000 wsgi:app
+"""
+import os
+from app import app
+
+app.config.update(
+    DEBUG=False,
+    TEMPLATES_AUTO_RELOAD=False,
+    # Cache-Control max-age (seconds) for files under /static
+    SEND_FILE_MAX_AGE_DEFAULT=int(os.getenv('STATIC_MAX_AGE', '43200'))
+)